@@ -6,27 +6,14 @@ import logging
 import os
 import sys
 
-from . import command
-from . import commands
+from . import server
 from .cd import cd
 from .utility import DummyContextManager
 from .log_formatter import LogFormatter
 
 
-def main(args=sys.argv):
-    try:
-        import colorama
-        colorama.init()
-    except ImportError:
-        pass
-
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    log_handler = logging.StreamHandler()
-    log_handler.setFormatter(LogFormatter())
-    logger.addHandler(log_handler)
-
-    available_commands = commands.available_commands()
+def create_parser(available_commands):
+    from . import command
 
     parser = argparse.ArgumentParser(description='Helps with dependencies.')
     parser.add_argument('-C',
@@ -48,6 +35,48 @@ def main(args=sys.argv):
     for name, cmd in available_commands.items():
         cmd.add_parser(subparser_group)
 
+    return parser
+
+
+def requested_command(args):
+    ''' returns the name of the command the arguments invoke or None '''
+    arguments = iter(args[1:])
+    for argument in arguments:
+        if argument == '-C':
+            next(arguments, None)
+        elif argument == '--':
+            return next(arguments, None)
+        elif not argument.startswith('-'):
+            return argument
+    return None
+
+
+def main(args=sys.argv):
+    output = server.query(args)
+    if output is not None:
+        sys.stdout.write(output)
+        return 0
+
+    try:
+        import colorama
+        colorama.init()
+    except ImportError:
+        pass
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(LogFormatter())
+    logger.addHandler(log_handler)
+
+    # the commands pull in most of needy, so they're only imported once the server has declined the request
+    from . import commands
+
+    # only the requested command is imported unless the parser needs all of them for help or completion
+    name = requested_command(args)
+    available_commands = commands.available_commands([name] if name in commands.COMMANDS and '_ARGCOMPLETE' not in os.environ else None)
+    parser = create_parser(available_commands)
+
     try:
         import argcomplete
         argcomplete.autocomplete(parser)
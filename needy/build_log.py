@@ -0,0 +1,98 @@
+import codecs
+import logging
+import os
+import sys
+
+from collections import deque
+
+from .utility import Style
+
+MAX_TAIL_LINES = 100
+
+
+class BuildLog:
+    """ Records the output of a library's build commands.
+
+    Everything goes to a log file so that it's still around after a failed
+    build, and the last lines are kept in a bounded buffer, so chatty builds
+    don't use more memory the longer they run. Output is echoed to stdout as
+    it arrives unless echo is False, as it is when builds run concurrently and
+    their output would interleave.
+    """
+
+    def __init__(self, path, echo=True, max_lines=MAX_TAIL_LINES):
+        self.__path = path
+        self.__echo = echo
+        self.__lines = deque(maxlen=max_lines)
+        self.__partial_line = ''
+        self.__decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.__file = None
+        self.__hid_output = False
+
+    def __enter__(self):
+        if not os.path.exists(os.path.dirname(self.__path)):
+            os.makedirs(os.path.dirname(self.__path))
+        self.__file = open(self.__path, 'wb')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__file.close()
+        self.__file = None
+        return False
+
+    def path(self):
+        return self.__path
+
+    def echoes(self, verbosity=logging.INFO):
+        ''' returns True if output written with the verbosity is echoed to stdout '''
+        return self.__echo and verbosity >= logging.getLogger().getEffectiveLevel()
+
+    def hid_output(self):
+        ''' returns True if any output was written without being echoed '''
+        return self.__hid_output
+
+    def write(self, data, verbosity=logging.INFO):
+        ''' writes the bytes to the log '''
+        if not data:
+            return
+        text = self.__record(data)
+        if self.echoes(verbosity):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        else:
+            self.__hid_output = True
+
+    def write_command(self, cmd, verbosity=logging.INFO):
+        ''' records that the command is being run, logging it if output with the verbosity is echoed '''
+        self.__record('{}\n'.format(cmd).encode('utf-8'))
+        if self.echoes(verbosity):
+            logging.log(verbosity, Style.BRIGHT + '{}'.format(cmd) + Style.RESET_ALL)
+        else:
+            self.__hid_output = True
+
+    def tail(self):
+        ''' returns the last lines that were written '''
+        return list(self.__lines) + ([self.__partial_line] if self.__partial_line else [])
+
+    def __record(self, data):
+        ''' writes the bytes to the file and the buffer, returning them as text '''
+        self.__file.write(data)
+        self.__file.flush()
+        text = self.__decoder.decode(data)
+        lines = (self.__partial_line + text).split('\n')
+        self.__partial_line = lines.pop()
+        self.__lines.extend(line.rstrip('\r') for line in lines)
+        return text
+
+    @staticmethod
+    def last_line(path):
+        ''' returns the last non-empty line of the log file at the path or None '''
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 4096))
+                lines = [line.strip() for line in f.read().decode('utf-8', 'replace').splitlines()]
+        except (IOError, OSError):
+            return None
+        lines = [line for line in lines if line]
+        return lines[-1] if lines else None
@@ -0,0 +1,162 @@
+import logging
+import os
+import time
+
+from contextlib import contextmanager
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+SCHEMA_VERSION = 1
+
+# how long to wait for another process to finish writing to the index
+LOCK_TIMEOUT = 60
+
+
+class CacheIndex:
+    """ Records the size and last access of every object in a directory cache.
+
+    Eviction needs the total size of the cache and its least recently used
+    objects. Listing and stat-ing every object to find them is slow for large
+    caches, and access times aren't updated on filesystems mounted with
+    noatime, so they're kept in a sqlite database alongside the objects. The
+    index can always be rebuilt from the objects, so when it can't be used
+    the cache still works, it just isn't pruned.
+    """
+
+    def __init__(self, path, existing_objects):
+        ''' existing_objects returns (name, size, last access) for each object in the cache when the index is created '''
+        self.__path = path
+        self.__existing_objects = existing_objects
+        self.__connection = None
+        self.__pid = None
+
+    def record(self, name, size, replace):
+        ''' calls replace, which puts the object into place, and records it as the most recently used object '''
+        attempted = []
+        try:
+            with self.__transaction() as cursor:
+                attempted.append(True)
+                replace()
+                if cursor:
+                    cursor.execute('SELECT size FROM objects WHERE name = ?', (name,))
+                    row = cursor.fetchone()
+                    cursor.execute('INSERT OR REPLACE INTO objects (name, size, last_access) VALUES (?, ?, ?)', (name, size, time.time()))
+                    cursor.execute('UPDATE totals SET size = size + ?', (size - (row[0] if row else 0),))
+        except CacheIndex.__errors() as e:
+            logging.debug('unable to update cache index {}: {}'.format(self.__path, e))
+            if not attempted:
+                replace()
+
+    def access(self, name):
+        ''' records that the object was used '''
+        connection = self.__connect()
+        if connection is None:
+            return
+        try:
+            connection.execute('UPDATE objects SET last_access = ? WHERE name = ?', (time.time(), name))
+        except CacheIndex.__errors() as e:
+            logging.debug('unable to update cache index {}: {}'.format(self.__path, e))
+
+    def size(self):
+        ''' returns the total size of the objects in bytes, or None if the index is unavailable '''
+        connection = self.__connect()
+        if connection is None:
+            return None
+        try:
+            return connection.execute('SELECT size FROM totals').fetchone()[0]
+        except CacheIndex.__errors() as e:
+            logging.debug('unable to read cache index {}: {}'.format(self.__path, e))
+            return None
+
+    def evict(self, max_size, last_access, remove, limit):
+        """ removes up to limit of the least recently used objects that were last used before last_access or don't fit
+        in max_size, calling remove with the name of each. returns the number of objects removed
+
+        max_size, last_access, and limit can each be None. Since only a limited
+        number of objects are removed at a time, this can be called whenever
+        the cache grows without waiting for large caches to be pruned at once.
+        """
+        removed = 0
+        try:
+            with self.__transaction() as cursor:
+                if not cursor:
+                    return 0
+                total = cursor.execute('SELECT size FROM totals').fetchone()[0]
+                rows = cursor.execute('SELECT name, size, last_access FROM objects ORDER BY last_access LIMIT ?', (limit if limit is not None else -1,)).fetchall()
+                for name, size, accessed in rows:
+                    expired = last_access is not None and accessed < last_access
+                    if not expired and (max_size is None or total <= max_size):
+                        break
+                    remove(name)
+                    cursor.execute('DELETE FROM objects WHERE name = ?', (name,))
+                    total -= size
+                    removed += 1
+                cursor.execute('UPDATE totals SET size = ?', (total,))
+        except CacheIndex.__errors() as e:
+            logging.debug('unable to prune cache index {}: {}'.format(self.__path, e))
+        return removed
+
+    @contextmanager
+    def __transaction(self):
+        ''' yields a cursor for a transaction that excludes other writers, or None if the index is unavailable '''
+        connection = self.__connect()
+        if connection is None:
+            yield None
+            return
+        cursor = connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            yield cursor
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    def __connect(self):
+        # sqlite connections can't be shared with forked children
+        if self.__pid == os.getpid():
+            return self.__connection
+        self.__pid = os.getpid()
+        self.__connection = None
+        if sqlite3 is None:
+            return None
+        try:
+            if not os.path.isdir(os.path.dirname(self.__path)):
+                os.makedirs(os.path.dirname(self.__path))
+            connection = sqlite3.connect(self.__path, timeout=LOCK_TIMEOUT, isolation_level=None)
+            # without fsyncs after every transaction, recording accesses is cheap. a lost update only affects eviction
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            self.__create(connection)
+        except CacheIndex.__errors() + (IOError, OSError) as e:
+            logging.debug('unable to open cache index {}: {}'.format(self.__path, e))
+            return None
+        self.__connection = connection
+        return connection
+
+    def __create(self, connection):
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                connection.execute('DROP TABLE IF EXISTS objects')
+                connection.execute('DROP TABLE IF EXISTS totals')
+                connection.execute('CREATE TABLE objects (name TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)')
+                connection.execute('CREATE INDEX objects_by_last_access ON objects (last_access)')
+                connection.execute('CREATE TABLE totals (size INTEGER NOT NULL)')
+                total = 0
+                for name, size, last_access in self.__existing_objects():
+                    connection.execute('INSERT OR REPLACE INTO objects (name, size, last_access) VALUES (?, ?, ?)', (name, size, last_access))
+                    total += size
+                connection.execute('INSERT INTO totals (size) VALUES (?)', (total,))
+                connection.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    @staticmethod
+    def __errors():
+        return (sqlite3.Error,) if sqlite3 else ()
@@ -0,0 +1,195 @@
+import gzip
+import logging
+import multiprocessing
+import shutil
+import subprocess
+import tarfile
+import threading
+
+from ..process import find_executable
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_LEVELS = {'gzip': 6, 'xz': 6, 'zstd': 3}
+
+# archives are recognized by their first bytes, so the codec that wrote them never needs to be configured to read them
+MAGIC_NUMBERS = [(b'\x1f\x8b', 'gzip'), (b'\xfd7zXZ\x00', 'xz'), (b'\x28\xb5\x2f\xfd', 'zstd')]
+
+
+class Codec:
+    """ Compresses the archives that caches store directories as.
+
+    When pigz, xz or zstd is installed, it compresses the archive with a
+    thread per core. Otherwise, Python compresses it on a single thread.
+    """
+
+    NAMES = ['gzip', 'xz', 'zstd', 'none']
+
+    def __init__(self, name='gzip', level=None, threads=None):
+        if name not in Codec.NAMES:
+            raise ValueError('unknown compression codec: {}'.format(name))
+        if name == 'zstd' and not find_executable('zstd') and zstandard is None:
+            logging.debug('zstd is unavailable, so cache objects will be compressed with gzip')
+            name, level = 'gzip', None
+        if name == 'xz' and not find_executable('xz') and lzma is None:
+            logging.debug('xz is unavailable, so cache objects will be compressed with gzip')
+            name, level = 'gzip', None
+        self.__name = name
+        self.__level = level if level is not None else DEFAULT_LEVELS.get(name)
+        self.__threads = threads or multiprocessing.cpu_count()
+
+    @staticmethod
+    def from_dict(d):
+        ''' returns the codec for a cache's "compression" setting, which is either a codec name or a dict with codec, level, and threads keys '''
+        compression = d.get('compression') or {}
+        if not isinstance(compression, dict):
+            compression = {'codec': compression}
+        return Codec(compression.get('codec', 'gzip'), compression.get('level'), compression.get('threads'))
+
+    def name(self):
+        return self.__name
+
+    def archive(self, directory, destination):
+        ''' writes an archive of the directory's contents to the destination, a file or pipe opened for writing '''
+        command = self.__compression_command()
+        if command:
+            destination.flush()
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=destination)
+            try:
+                with tarfile.open(fileobj=process.stdin, mode='w|') as tar:
+                    tar.add(directory, arcname='.')
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+            process.stdin.close()
+            if process.wait():
+                raise RuntimeError('{} was unable to compress {}'.format(command[0], directory))
+            return
+
+        if self.__name == 'gzip':
+            compressor = gzip.GzipFile(filename='', mode='wb', fileobj=destination, compresslevel=self.__level)
+        elif self.__name == 'xz':
+            compressor = lzma.LZMAFile(destination, 'wb', preset=self.__level)
+        elif self.__name == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=self.__level, threads=self.__threads).stream_writer(destination)
+        else:
+            compressor = None
+        with tarfile.open(fileobj=compressor or destination, mode='w|') as tar:
+            tar.add(directory, arcname='.')
+        if self.__name == 'zstd':
+            # closing the writer would close the destination too
+            compressor.flush(zstandard.FLUSH_FRAME)
+        elif compressor:
+            compressor.close()
+
+    @staticmethod
+    def extract(source, directory):
+        ''' extracts an archive written by any codec from the source, a file or pipe opened for reading, into the directory '''
+        header = Codec.__read(source, 8)
+        name = Codec.detect(header)
+        command = Codec.__decompression_command(name)
+        if command:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            # the header has already been read, so the rest is fed to the decompressor as it arrives
+            feeder = threading.Thread(target=Codec.__feed, args=(header, source, process.stdin))
+            feeder.start()
+            try:
+                with tarfile.open(fileobj=process.stdout, mode='r|') as tar:
+                    tar.extractall(path=directory)
+            finally:
+                process.stdout.close()
+                feeder.join()
+                returncode = process.wait()
+            if returncode:
+                raise RuntimeError('{} was unable to decompress the archive'.format(command[0]))
+            return
+
+        stream = PrefixedReader(header, source)
+        if name == 'zstd':
+            if zstandard is None:
+                raise RuntimeError('zstd is required to extract zstd compressed archives')
+            stream, mode = zstandard.ZstdDecompressor().stream_reader(stream), 'r|'
+        elif name == 'xz' and lzma is None:
+            raise RuntimeError('xz is required to extract xz compressed archives')
+        else:
+            mode = {'gzip': 'r|gz', 'xz': 'r|xz', 'none': 'r|'}[name]
+        with tarfile.open(fileobj=stream, mode=mode) as tar:
+            tar.extractall(path=directory)
+
+    @staticmethod
+    def detect(header):
+        ''' returns the name of the codec that wrote the archive that begins with the header bytes '''
+        for magic, name in MAGIC_NUMBERS:
+            if header.startswith(magic):
+                return name
+        return 'none'
+
+    @staticmethod
+    def __read(source, size):
+        ''' reads exactly size bytes unless the source ends first. pipes can return less '''
+        data = b''
+        while len(data) < size:
+            chunk = source.read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    @staticmethod
+    def __feed(header, source, pipe):
+        try:
+            pipe.write(header)
+            shutil.copyfileobj(source, pipe)
+        except (IOError, OSError):
+            # the decompressor stopped reading, and its exit status says why
+            pass
+        finally:
+            try:
+                pipe.close()
+            except (IOError, OSError):
+                pass
+
+    def __compression_command(self):
+        if self.__name == 'gzip' and find_executable('pigz'):
+            return ['pigz', '-c', '-{}'.format(self.__level), '-p', str(self.__threads)]
+        if self.__name == 'xz' and find_executable('xz'):
+            return ['xz', '-c', '-{}'.format(self.__level), '-T', str(self.__threads)]
+        if self.__name == 'zstd' and find_executable('zstd'):
+            return ['zstd', '-c', '-q', '-{}'.format(self.__level), '-T{}'.format(self.__threads)]
+        return None
+
+    @staticmethod
+    def __decompression_command(name):
+        if name == 'gzip' and find_executable('pigz'):
+            return ['pigz', '-dc']
+        if name == 'xz' and find_executable('xz'):
+            return ['xz', '-dc']
+        if name == 'zstd' and find_executable('zstd'):
+            return ['zstd', '-dc', '-q']
+        return None
+
+
+class PrefixedReader:
+    """ Reads the bytes that were already read from a file before the rest of it. """
+
+    def __init__(self, prefix, f):
+        self.__prefix = prefix
+        self.__file = f
+
+    def read(self, size=-1):
+        if not self.__prefix:
+            return self.__file.read(size)
+        if size is None or size < 0:
+            data, self.__prefix = self.__prefix + self.__file.read(), b''
+            return data
+        data, self.__prefix = self.__prefix[:size], self.__prefix[size:]
+        return data
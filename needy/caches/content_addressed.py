@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import stat
+import sys
+
+from .directory import DirectoryCache
+from .file_cache import FileCache
+from ..filesystem import fast_copy, user_cache_directory
+from ..memoize import MemoizeMethod
+
+MANIFEST_FORMAT = 1
+
+
+class ContentAddressedCache(FileCache):
+    """ Stores directories in another cache a file at a time, keyed by the files' contents.
+
+    Each directory is stored as a small manifest that lists its files by
+    content hash, and each distinct file is only stored once, however many
+    directories contain it. Restoring a directory only fetches the files that
+    aren't available locally yet, then hardlinks them into place. Hardlinked
+    files share their contents with the cache, so they're made read-only.
+    """
+
+    def __init__(self, cache, local_blobs=None):
+        FileCache.__init__(self)
+        self.__cache = cache
+        self.__local_blobs = local_blobs
+
+    @staticmethod
+    def type():
+        return 'content-addressed'
+
+    def description(self):
+        return '{} (content-addressed)'.format(self.__cache.description())
+
+    def set(self, key, source):
+        return self.__cache.set(key, source)
+
+    def get(self, key, destination):
+        return self.__cache.get(key, destination)
+
+    def exists(self, key):
+        return self.__cache.exists(ContentAddressedCache.__manifest_key(key))
+
+    def store_directory(self, key, directory):
+        manifest = {'format': MANIFEST_FORMAT, 'directories': [], 'files': [], 'symlinks': []}
+        blobs = {}
+        for root, directory_names, file_names in os.walk(directory):
+            for name in directory_names + file_names:
+                path = os.path.join(root, name)
+                relative_path = os.path.relpath(path, directory).replace(os.sep, '/')
+                if os.path.islink(path):
+                    manifest['symlinks'].append({'path': relative_path, 'target': os.readlink(path)})
+                elif os.path.isdir(path):
+                    manifest['directories'].append(relative_path)
+                else:
+                    digest = ContentAddressedCache.__file_hash(path)
+                    manifest['files'].append({'path': relative_path, 'hash': digest, 'mode': stat.S_IMODE(os.stat(path).st_mode)})
+                    blobs.setdefault(digest, path)
+
+        existing = self.__cache.existing([ContentAddressedCache.__blob_key(digest) for digest in blobs])
+        for digest, path in blobs.items():
+            if ContentAddressedCache.__blob_key(digest) not in existing and not self.__cache.set(ContentAddressedCache.__blob_key(digest), path):
+                return False
+
+        # the manifest goes last so that it's never found without its blobs
+        with self.__cache.open_writer(ContentAddressedCache.__manifest_key(key)) as f:
+            f.write(json.dumps(manifest).encode())
+        return True
+
+    def restore_directory(self, key, directory):
+        with self.__cache.open_reader(ContentAddressedCache.__manifest_key(key)) as f:
+            if f is None:
+                return False
+            try:
+                manifest = json.loads(f.read().decode())
+            except ValueError:
+                return False
+        if not isinstance(manifest, dict) or manifest.get('format') != MANIFEST_FORMAT:
+            return False
+
+        for relative_path in [''] + manifest['directories']:
+            path = os.path.join(directory, relative_path)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        for entry in manifest['files']:
+            blob = self.__blob_path(entry['hash'])
+            if blob is None:
+                return False
+            ContentAddressedCache.__materialize(blob, os.path.join(directory, entry['path']), entry['mode'])
+        for entry in manifest['symlinks']:
+            path = os.path.join(directory, entry['path'])
+            if os.path.lexists(path):
+                os.remove(path)
+            os.symlink(entry['target'], path)
+        return True
+
+    def __blob_path(self, digest):
+        ''' returns the path of a local copy of the blob, fetching it if necessary, or None if the cache doesn't have it '''
+        key = ContentAddressedCache.__blob_key(digest)
+        path = self.__cache.local_path(key)
+        if path is not None:
+            return path if os.path.isfile(path) else None
+
+        path = self.__local_blob_cache().local_path(key)
+        if os.path.isfile(path):
+            return path
+        with self.__cache.open_reader(key) as source:
+            if source is None:
+                return None
+            with self.__local_blob_cache().open_writer(key) as destination:
+                hash = hashlib.sha256()
+                for chunk in iter(lambda: source.read(1 << 16), b''):
+                    hash.update(chunk)
+                    destination.write(chunk)
+                if hash.hexdigest() != digest:
+                    raise RuntimeError('cache object {} is corrupt'.format(key))
+        return path
+
+    @MemoizeMethod
+    def __local_blob_cache(self):
+        return self.__local_blobs or DirectoryCache(os.path.join(user_cache_directory(), 'blobs'))
+
+    @staticmethod
+    def __materialize(blob, destination, mode):
+        if os.path.lexists(destination):
+            os.remove(destination)
+        read_only_mode = mode & ~0o222
+        # files with the same contents can have different permissions, and linked files share them
+        if sys.platform != 'win32' and stat.S_IMODE(os.stat(blob).st_mode) | 0o222 == mode | 0o222:
+            try:
+                os.link(blob, destination)
+                os.chmod(destination, read_only_mode)
+                return
+            except OSError:
+                pass
+        fast_copy(blob, destination)
+        os.chmod(destination, mode)
+
+    @staticmethod
+    def __file_hash(path):
+        hash = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                hash.update(chunk)
+        return hash.hexdigest()
+
+    @staticmethod
+    def __blob_key(digest):
+        return 'blobs/{}'.format(digest)
+
+    @staticmethod
+    def __manifest_key(key):
+        return 'manifests/{}'.format(key)
@@ -1,16 +1,42 @@
 import hashlib
 import os
-import shutil
+import re
+import tempfile
 import time
 
+from contextlib import contextmanager
+
+from .cache_index import CacheIndex
+from .codec import Codec
 from .file_cache import FileCache
-from ..filesystem import clean_file, TempDir
+from ..filesystem import fast_copy
+from ..memoize import MemoizeMethod
+
+DEFAULT_OBJECT_LIFETIME = 60 * 60 * 24 * 7
+
+# the most objects that are evicted each time one is stored
+EVICTION_BATCH_SIZE = 64
+
+OBJECT_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+SIZE_UNITS = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40}
 
 
 class DirectoryCache(FileCache):
-    def __init__(self, path):
+    """ Stores objects as files in a directory.
+
+    Objects are named after the hash of their key and sharded into
+    subdirectories by the hash's first two characters. The objects that
+    haven't been used for object_lifetime seconds, and the least recently used
+    ones beyond max_size bytes, are evicted a few at a time as objects are
+    stored, using an index of the objects rather than listing them.
+    """
+
+    def __init__(self, path, codec=None, max_size=None, object_lifetime=DEFAULT_OBJECT_LIFETIME):
+        FileCache.__init__(self, codec)
         self.__path = os.path.expanduser(path)
-        self.prune()
+        self.__max_size = max_size
+        self.__object_lifetime = object_lifetime
 
     @staticmethod
     def type():
@@ -18,43 +44,147 @@ class DirectoryCache(FileCache):
 
     @staticmethod
     def from_dict(d):
-        return DirectoryCache(path=d['path'])
+        return DirectoryCache(path=d['path'], codec=Codec.from_dict(d), max_size=DirectoryCache.__parse_size(d.get('max-size')))
 
     def description(self):
         return self.__path if self.__path else ''
 
     def set(self, key, source):
-        destination_file = self._object_path(key)
-        clean_file(destination_file)
-        with TempDir() as d:
-            staging_path = os.path.join(d, 'tmp')
-            shutil.copyfile(source, staging_path)
-            try:
-                os.rename(staging_path, destination_file)
-            except OSError:
-                if not os.path.exists(destination_file):
-                    raise
+        with self.__staging_path(key) as staging_path:
+            fast_copy(source, staging_path)
         return True
 
     def get(self, key, destination):
         try:
-            shutil.copyfile(self._object_path(key), destination)
-        except IOError:
+            fast_copy(self._object_path(key), destination)
+        except (IOError, OSError):
             return False
+        self.__index().access(DirectoryCache.__name(key))
         return True
 
-    def prune(self, object_lifetime=60*60*24*7):
-        if not os.path.exists(self.__path):
-            return
+    @contextmanager
+    def open_writer(self, key):
+        with self.__staging_path(key) as staging_path:
+            with open(staging_path, 'wb') as f:
+                yield f
+
+    @contextmanager
+    def open_reader(self, key):
+        try:
+            f = open(self._object_path(key), 'rb')
+        except IOError:
+            f = None
+        else:
+            self.__index().access(DirectoryCache.__name(key))
+        try:
+            yield f
+        finally:
+            if f:
+                f.close()
+
+    def exists(self, key):
+        return os.path.isfile(self._object_path(key))
+
+    def local_path(self, key):
+        # whoever asks for the path is about to use the object
+        self.__index().access(DirectoryCache.__name(key))
+        return self._object_path(key)
+
+    def size(self):
+        ''' returns the total size of the objects in bytes, or None if it's unknown '''
+        return self.__index().size()
+
+    def prune(self):
+        ''' evicts every object that's expired or doesn't fit in the cache '''
+        self.__evict(None)
 
+    @contextmanager
+    def __staging_path(self, key):
+        ''' yields a path on the cache's filesystem for the object to be written to. it's renamed into place once written '''
+        destination = self._object_path(key)
+        if not os.path.exists(os.path.dirname(destination)):
+            try:
+                os.makedirs(os.path.dirname(destination))
+            except OSError:
+                if not os.path.isdir(os.path.dirname(destination)):
+                    raise
+        # names that begin with a dot aren't objects, so they aren't indexed while they're written
+        fd, staging_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix='.')
+        os.close(fd)
+        try:
+            yield staging_path
+            os.chmod(staging_path, 0o644)
+            size = os.path.getsize(staging_path)
+            self.__index().record(DirectoryCache.__name(key), size, lambda: DirectoryCache.__replace(staging_path, destination))
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+        self.__evict(EVICTION_BATCH_SIZE)
+
+    @staticmethod
+    def __replace(staging_path, destination):
+        try:
+            os.rename(staging_path, destination)
+        except OSError:
+            # windows won't rename over existing files, but concurrent writers store the same contents anyway
+            if not os.path.exists(destination):
+                raise
+
+    def __evict(self, limit):
+        last_access = time.time() - self.__object_lifetime if self.__object_lifetime is not None else None
+        return self.__index().evict(self.__max_size, last_access, self.__remove, limit)
+
+    def __remove(self, name):
+        try:
+            os.remove(self.__name_path(name))
+        except OSError:
+            pass
+
+    @MemoizeMethod
+    def __index(self):
+        return CacheIndex(os.path.join(self.__path, '.index.sqlite'), self.__existing_objects)
+
+    def __existing_objects(self):
+        ''' yields the name, size, and last access of each object, sharding the ones stored before objects were sharded '''
+        if not os.path.isdir(self.__path):
+            return
         for name in os.listdir(self.__path):
-            path = os.path.join(self.__path, name)
-            s = os.stat(path)
-            if name[0] != '.' and time.time() - s.st_atime >= object_lifetime:
+            if OBJECT_NAME.match(name) and os.path.isfile(os.path.join(self.__path, name)):
                 try:
-                    os.remove(path)
-                except IOError:
+                    if not os.path.isdir(os.path.dirname(self.__name_path(name))):
+                        os.makedirs(os.path.dirname(self.__name_path(name)))
+                    os.rename(os.path.join(self.__path, name), self.__name_path(name))
+                except OSError:
                     pass
+        for shard in os.listdir(self.__path):
+            if len(shard) != 2 or not os.path.isdir(os.path.join(self.__path, shard)):
+                continue
+            for name in os.listdir(os.path.join(self.__path, shard)):
+                if not OBJECT_NAME.match(name):
+                    continue
+                try:
+                    status = os.stat(os.path.join(self.__path, shard, name))
+                except OSError:
+                    continue
+                # access times are only a guess, since they aren't updated on filesystems mounted with noatime
+                yield name, status.st_size, max(status.st_atime, status.st_mtime)
+
+    @staticmethod
+    def __parse_size(size):
+        ''' returns the number of bytes in a size such as 1073741824, "500M", or "10GB", or None if there's no limit '''
+        if size is None or isinstance(size, int):
+            return size
+        match = re.match(r'^\s*(\d+)\s*([kmgt]?)i?b?\s*$', str(size), re.IGNORECASE)
+        if not match:
+            raise ValueError('invalid cache size: {}'.format(size))
+        return int(match.group(1)) * SIZE_UNITS[match.group(2).lower()]
+
+    @staticmethod
+    def __name(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def __name_path(self, name):
+        return os.path.join(self.__path, name[:2], name)
 
     def _object_path(self, key):
-        return os.path.join(self.__path, hashlib.sha256(key.encode()).hexdigest())
+        return self.__name_path(DirectoryCache.__name(key))
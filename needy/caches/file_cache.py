@@ -1,4 +1,19 @@
+import os
+
+from contextlib import contextmanager
+
+from .codec import Codec
+from ..filesystem import TempDir
+
+
 class FileCache:
+    def __init__(self, codec=None):
+        self.__codec = codec or Codec()
+
+    def codec(self):
+        '''the codec that store_directory archives directories with'''
+        return self.__codec
+
     @staticmethod
     def type():
         '''type of cache'''
@@ -20,3 +35,52 @@ class FileCache:
     def get(self, key, destination):
         '''if True is returned, the given key is now available at the given destination path'''
         raise NotImplementedError('get')
+
+    def exists(self, key):
+        '''returns True if get would succeed for the given key'''
+        raise NotImplementedError('exists')
+
+    def existing(self, keys):
+        '''returns the set of the given keys that exist. caches that can look them up at once should override this'''
+        return set(key for key in keys if self.exists(key))
+
+    def local_path(self, key):
+        '''returns the path of the key's file if the cache keeps it on the local filesystem, otherwise None'''
+        return None
+
+    @contextmanager
+    def open_writer(self, key):
+        '''yields a binary file object. what's written to it is retrievable with key once the context exits without an exception.
+        caches that can write objects as they're produced should override this to avoid the temporary file'''
+        with TempDir() as d:
+            path = os.path.join(d, 'object')
+            with open(path, 'wb') as f:
+                yield f
+            if not self.set(key, path):
+                raise RuntimeError('unable to store {} in {}'.format(key, self.description()))
+
+    @contextmanager
+    def open_reader(self, key):
+        '''yields a binary file object to read the object for key from, or None if there isn't one.
+        caches that can read objects as they arrive should override this to avoid the temporary file'''
+        with TempDir() as d:
+            path = os.path.join(d, 'object')
+            if not self.get(key, path):
+                yield None
+                return
+            with open(path, 'rb') as f:
+                yield f
+
+    def store_directory(self, key, directory):
+        '''make the contents of the directory retrievable with key'''
+        with self.open_writer(key) as f:
+            self.codec().archive(directory, f)
+        return True
+
+    def restore_directory(self, key, directory):
+        '''if True is returned, the contents stored with key have been extracted into the directory'''
+        with self.open_reader(key) as f:
+            if f is None:
+                return False
+            Codec.extract(f, directory)
+        return True
@@ -1,19 +1,23 @@
 import hashlib
+import io
 import os
-import distutils.spawn
 import logging
 import subprocess
 import pipes
 
+from contextlib import contextmanager
+
+from .codec import Codec, PrefixedReader
 from .file_cache import FileCache
-from ..process import command
+from ..process import command, find_executable
 
 
 class S3Cache(FileCache):
-    def __init__(self, path):
+    def __init__(self, path, codec=None):
+        FileCache.__init__(self, codec)
         if not path.startswith('s3://'):
             raise RuntimeError('s3 cache paths must begin with s3://')
-        if not distutils.spawn.find_executable('aws'):
+        if not find_executable('aws'):
             raise RuntimeError('The aws cli is required for the s3 cache')
         self.__path = path
 
@@ -23,7 +27,7 @@ class S3Cache(FileCache):
 
     @staticmethod
     def from_dict(d):
-        return S3Cache(path=d['path'])
+        return S3Cache(path=d['path'], codec=Codec.from_dict(d))
 
     def description(self):
         return self.__path if self.__path else ''
@@ -37,11 +41,79 @@ class S3Cache(FileCache):
                                 stdout=subprocess.PIPE,
                                 stderr=subprocess.PIPE)
         _, err = proc.communicate()
+        err = err.decode()
         if proc.returncode:
             if '(404)' in err:
                 return False
             raise RuntimeError('unable to retrieve cache object {}:\n{}'.format(self._object_path(key), err))
         return True
 
+    @contextmanager
+    def open_writer(self, key):
+        ''' streams the object straight to s3 '''
+        with open(os.devnull, 'w') as devnull:
+            proc = subprocess.Popen(['aws', 's3', 'cp', '-', self._object_path(key)],
+                                    stdin=subprocess.PIPE,
+                                    stdout=devnull,
+                                    stderr=subprocess.PIPE)
+            try:
+                yield proc.stdin
+            except BaseException:
+                proc.kill()
+                proc.wait()
+                raise
+            proc.stdin.close()
+            _, err = proc.communicate()
+        if proc.returncode:
+            raise RuntimeError('unable to store cache object {}:\n{}'.format(self._object_path(key), err.decode()))
+
+    @contextmanager
+    def open_reader(self, key):
+        ''' streams the object straight from s3 '''
+        proc = subprocess.Popen(['aws', 's3', 'cp', self._object_path(key), '-'],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        # nothing arrives for missing objects, so the first read tells them apart
+        data = proc.stdout.read(1 << 16)
+        if not data:
+            _, err = proc.communicate()
+            err = err.decode()
+            if not proc.returncode:
+                yield io.BytesIO()
+            elif '(404)' in err:
+                yield None
+            else:
+                raise RuntimeError('unable to retrieve cache object {}:\n{}'.format(self._object_path(key), err))
+            return
+        try:
+            yield PrefixedReader(data, proc.stdout)
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        _, err = proc.communicate()
+        if proc.returncode:
+            raise RuntimeError('unable to retrieve cache object {}:\n{}'.format(self._object_path(key), err.decode()))
+
+    def exists(self, key):
+        proc = subprocess.Popen(['aws', 's3', 'ls', self._object_path(key)],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        if proc.returncode and err.strip():
+            raise RuntimeError('unable to look up cache object {}:\n{}'.format(self._object_path(key), err))
+        return proc.returncode == 0 and bool(out.strip())
+
+    def existing(self, keys):
+        ''' lists the cache's objects once rather than looking each key up '''
+        proc = subprocess.Popen(['aws', 's3', 'ls', self.__path.rstrip('/') + '/'],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        if proc.returncode and err.strip():
+            raise RuntimeError('unable to list cache objects in {}:\n{}'.format(self.__path, err))
+        names = set(line.split()[-1] for line in out.decode().splitlines() if line.strip())
+        return set(key for key in keys if os.path.basename(self._object_path(key)) in names)
+
     def _object_path(self, key):
         return os.path.join(self.__path, hashlib.sha256(key.encode()).hexdigest())
@@ -0,0 +1,143 @@
+from __future__ import print_function
+
+import binascii
+import errno
+import json
+import logging
+import os
+import sys
+import time
+
+from collections import OrderedDict
+
+from .filesystem import lock_file, read_json_file, write_file_atomically
+
+POLL_INTERVAL = 0.1
+
+
+class SatisfyCoalescer:
+    """ Coalesces concurrent satisfies of a project into as few scheduler runs as possible.
+
+    Build systems like b2 launch a satisfy for every library at once. The first
+    instance to take the leader lock becomes the leader, and the others register
+    their library filters as requests and wait. Between runs, the leader claims
+    every request made with the same key and satisfies their union in one run,
+    so shared dependencies are only checked and built once. If a run fails, or
+    the leader dies, the waiting instances satisfy their own requests instead.
+    """
+
+    def __init__(self, directory, key):
+        self.__directory = directory
+        self.__key = key
+
+    def satisfy(self, filters, satisfy):
+        """ satisfies the filters, either by calling satisfy with them or a superset of them or by waiting for the leader to """
+        request = '{}-{}'.format(os.getpid(), binascii.hexlify(os.urandom(4)).decode())
+        write_file_atomically(self.__request_path(request), json.dumps({'key': self.__key, 'filters': filters}))
+        try:
+            while True:
+                result = read_json_file(self.__result_path(request))
+                if result is None:
+                    fd = lock_file(self.__lock_path(), timeout=0)
+                    if fd is not None:
+                        try:
+                            # the previous leader may have finished with the request before letting go
+                            result = read_json_file(self.__result_path(request))
+                            if result is None:
+                                self.__lead(request, filters, satisfy)
+                                return
+                        finally:
+                            os.close(fd)
+                if result is not None:
+                    if result['succeeded']:
+                        print('Satisfied by needy instance {}'.format(result['leader']))
+                        return
+                    # the run may have failed because of libraries that weren't requested here
+                    satisfy(filters)
+                    return
+                time.sleep(POLL_INTERVAL)
+        finally:
+            for path in [self.__request_path(request), self.__result_path(request)]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def __lead(self, request, filters, satisfy):
+        batch = OrderedDict([(request, filters)])
+        while True:
+            batch.update(self.__claim_requests())
+            if not batch:
+                return
+
+            if len(batch) > 1:
+                logging.info('Satisfying the requests of {} needy instances at once'.format(len(batch)))
+
+            try:
+                satisfy(self.__union(batch.values()))
+                succeeded = True
+            except Exception:
+                if request not in batch:
+                    logging.debug('Unable to satisfy the requests of other needy instances', exc_info=True)
+                    succeeded = False
+                elif len(batch) == 1:
+                    raise
+                else:
+                    # only this instance's own request can fail it
+                    self.__write_results([name for name in batch if name != request], False)
+                    satisfy(filters)
+                    batch = OrderedDict()
+                    continue
+
+            self.__write_results([name for name in batch if name != request], succeeded)
+            batch = OrderedDict()
+
+    def __claim_requests(self):
+        ''' returns the filters of the pending requests with this instance's key, removing them so that they're only claimed once '''
+        ret = OrderedDict()
+        directory = os.path.join(self.__directory, 'requests')
+        if not os.path.isdir(directory):
+            return ret
+        for name in sorted(os.listdir(directory)):
+            request, extension = os.path.splitext(name)
+            if extension != '.json':
+                continue
+            path = os.path.join(directory, name)
+            contents = read_json_file(path)
+            if not isinstance(contents, dict) or contents.get('key') != self.__key:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            if self.__requester_is_alive(request):
+                ret[request] = contents.get('filters')
+        return ret
+
+    def __write_results(self, requests, succeeded):
+        for request in requests:
+            write_file_atomically(self.__result_path(request), json.dumps({'succeeded': succeeded, 'leader': os.getpid()}))
+
+    @staticmethod
+    def __union(filters):
+        if not all(filters):
+            return None
+        return list(OrderedDict((f, None) for fs in filters for f in fs).keys())
+
+    @staticmethod
+    def __requester_is_alive(request):
+        # signal 0 only checks for the process on posix systems
+        if sys.platform == 'win32':
+            return True
+        try:
+            os.kill(int(request.split('-')[0]), 0)
+        except OSError as e:
+            return e.errno == errno.EPERM
+        return True
+
+    def __lock_path(self):
+        return os.path.join(self.__directory, 'leader.lock')
+
+    def __request_path(self, request):
+        return os.path.join(self.__directory, 'requests', '{}.json'.format(request))
+
+    def __result_path(self, request):
+        return os.path.join(self.__directory, 'results', '{}.json'.format(request))
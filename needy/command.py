@@ -1,8 +1,10 @@
+from __future__ import print_function
+
 from functools import wraps
 
-from .cd import cd
-from .needy import ConfiguredNeedy
+from .cd import cd, current_directory
 from .platforms import available_platforms
+from .query_index import NameIndex, QueryIndex
 from .utility import DummyContextManager
 
 try:
@@ -22,6 +24,31 @@ class Command:
         raise NotImplementedError('execute')
 
 
+class QueryCommand(Command):
+    """ A command that prints something about the needs without changing anything.
+
+    The query index is tried first so that the needs don't have to be rendered
+    and parsed. Subclasses define query, which answers with a Needy instance,
+    and indexed_query, which answers with the index or returns None if it
+    can't.
+    """
+
+    def execute(self, arguments):
+        output = self.indexed_query(QueryIndex.for_directory(current_directory(), arguments), arguments)
+        if output is None:
+            from .needy import ConfiguredNeedy
+            with ConfiguredNeedy('.', arguments) as needy:
+                output = self.query(needy, arguments)
+        print(output, end='')
+        return 0
+
+    def query(self, needy, arguments):
+        raise NotImplementedError('query')
+
+    def indexed_query(self, index, arguments):
+        raise NotImplementedError('indexed_query')
+
+
 def completer(f):
     @wraps(f)
     def wrapper(parsed_args, **kwds):
@@ -43,9 +70,15 @@ except ImportError:
 
 @completer
 def library_completer(prefix, parsed_args, **kwargs):
-    with ConfiguredNeedy('.', parsed_args) as needy:
-        target_or_universal_binary = parsed_args.universal_binary if getattr(parsed_args, 'universal_binary', None) else needy.target(getattr(parsed_args, 'target', 'host'))
-        return [name for name in needy.libraries(target_or_universal_binary).keys() if name.startswith(prefix)]
+    index = __name_index(parsed_args)
+    names = index and index.library_names(getattr(parsed_args, 'universal_binary', None) or getattr(parsed_args, 'target', 'host'))
+    if names is None:
+        from .needy import ConfiguredNeedy
+        with ConfiguredNeedy('.', parsed_args) as needy:
+            target_or_universal_binary = parsed_args.universal_binary if getattr(parsed_args, 'universal_binary', None) else needy.target(getattr(parsed_args, 'target', 'host'))
+            names = list(needy.libraries(target_or_universal_binary).keys())
+            needy.update_name_index(target_or_universal_binary)
+    return [name for name in names if name.startswith(prefix)]
 
 
 @completer
@@ -64,8 +97,20 @@ def target_completer(prefix, **kwargs):
 
 @completer
 def universal_binary_completer(prefix, parsed_args, **kwargs):
-    with ConfiguredNeedy('.', parsed_args) as needy:
-        return [name for name in needy.universal_binary_names() if name.startswith(prefix)]
+    index = __name_index(parsed_args)
+    names = index and index.universal_binary_names()
+    if names is None:
+        from .needy import ConfiguredNeedy
+        with ConfiguredNeedy('.', parsed_args) as needy:
+            names = list(needy.universal_binary_names())
+    return [name for name in names if name.startswith(prefix)]
+
+
+def __name_index(parsed_args):
+    ''' returns the name index for completion if it can be used with the given arguments '''
+    if getattr(parsed_args, 'define', None):
+        return None
+    return NameIndex.for_directory(current_directory())
 
 
 def add_target_specification_args(parser, action='executes', allow_universal_binary=True):
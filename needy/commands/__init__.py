@@ -1,19 +1,26 @@
 import importlib
 
+from collections import OrderedDict
 
-def available_commands():
-    commands = [getattr(importlib.import_module(cmd[0], package=__name__), cmd[1])() for cmd in [
-        ('.builddir', 'BuildDirCommand'),
-        ('.cflags', 'CFlagsCommand'),
-        ('.dev', 'DevCommand'),
-        ('.clean', 'CleanCommand'),
-        ('.exec', 'ExecCommand'),
-        ('.generate', 'GenerateCommand'),
-        ('.init', 'InitCommand'),
-        ('.ldflags', 'LDFlagsCommand'),
-        ('.pkg_config_path', 'PkgConfigPathCommand'),
-        ('.satisfy', 'SatisfyCommand'),
-        ('.sourcedir', 'SourceDirCommand'),
-        ('.status', 'StatusCommand'),
-    ]]
+# commands are only imported when they're used so that the cheap ones don't pay for the expensive ones
+COMMANDS = OrderedDict([
+    ('builddir', ('.builddir', 'BuildDirCommand')),
+    ('cflags', ('.cflags', 'CFlagsCommand')),
+    ('dev', ('.dev', 'DevCommand')),
+    ('clean', ('.clean', 'CleanCommand')),
+    ('exec', ('.exec', 'ExecCommand')),
+    ('generate', ('.generate', 'GenerateCommand')),
+    ('init', ('.init', 'InitCommand')),
+    ('ldflags', ('.ldflags', 'LDFlagsCommand')),
+    ('pkg-config-path', ('.pkg_config_path', 'PkgConfigPathCommand')),
+    ('satisfy', ('.satisfy', 'SatisfyCommand')),
+    ('serve', ('.serve', 'ServeCommand')),
+    ('sourcedir', ('.sourcedir', 'SourceDirCommand')),
+    ('status', ('.status', 'StatusCommand')),
+])
+
+
+def available_commands(names=None):
+    ''' returns a dict of command names to commands. if names are given, only those commands are imported '''
+    commands = [getattr(importlib.import_module(module, package=__name__), cls)() for name, (module, cls) in COMMANDS.items() if names is None or name in names]
     return {command.name(): command for command in commands}
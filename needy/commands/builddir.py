@@ -1,10 +1,7 @@
-from __future__ import print_function
-
 from .. import command
-from ..needy import ConfiguredNeedy
 
 
-class BuildDirCommand(command.Command):
+class BuildDirCommand(command.QueryCommand):
     def name(self):
         return 'builddir'
 
@@ -14,8 +11,8 @@ class BuildDirCommand(command.Command):
         parser.add_argument('library', help='the library to get the directory for').completer = command.library_completer
         command.add_target_specification_args(parser, 'gets the directory')
 
-    def execute(self, arguments):
-        with ConfiguredNeedy('.', arguments) as needy:
-            print(needy.build_directory(arguments.library,
-                                        arguments.universal_binary if arguments.universal_binary else needy.target(arguments.target)), end='')
-        return 0
+    def query(self, needy, arguments):
+        return needy.build_directory(arguments.library, arguments.universal_binary if arguments.universal_binary else needy.target(arguments.target))
+
+    def indexed_query(self, index, arguments):
+        return index and index.build_directory(arguments.library, arguments.universal_binary or arguments.target)
@@ -1,10 +1,7 @@
-from __future__ import print_function
-
 from .. import command
-from ..needy import ConfiguredNeedy
 
 
-class CFlagsCommand(command.Command):
+class CFlagsCommand(command.QueryCommand):
     def name(self):
         return 'cflags'
 
@@ -14,8 +11,10 @@ class CFlagsCommand(command.Command):
         parser.add_argument('library', default=None, nargs='*', help='the library to get flags for. shell-style wildcards are allowed').completer = command.library_completer
         command.add_target_specification_args(parser, 'gets the flags')
 
-    def execute(self, arguments):
-        with ConfiguredNeedy('.', arguments) as needy:
-            print(' '.join([('-I%s' % path) for path in needy.include_paths(
-                arguments.universal_binary if arguments.universal_binary else needy.target(arguments.target), arguments.library)]), end='')
-        return 0
+    def query(self, needy, arguments):
+        return ' '.join([('-I%s' % path) for path in needy.include_paths(
+            arguments.universal_binary if arguments.universal_binary else needy.target(arguments.target), arguments.library)])
+
+    def indexed_query(self, index, arguments):
+        paths = index and index.include_paths(arguments.universal_binary or arguments.target, arguments.library)
+        return None if paths is None else ' '.join([('-I%s' % path) for path in paths])
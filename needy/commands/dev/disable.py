@@ -20,6 +20,6 @@ class DisableCommand(command.Command):
         parser.add_argument('library', help='the library to disable dev mode for').completer = command.library_completer
 
     def execute(self, arguments):
-        with ConfiguredNeedy('.', arguments) as needy:
+        with ConfiguredNeedy('.', arguments, writable=True) as needy:
             needy.set_development_mode(arguments.library, False)
         return 0
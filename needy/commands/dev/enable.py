@@ -15,6 +15,6 @@ class EnableCommand(command.Command):
         parser.add_argument('library', help='the library to enable dev mode for').completer = command.library_completer
 
     def execute(self, arguments):
-        with ConfiguredNeedy('.', arguments) as needy:
+        with ConfiguredNeedy('.', arguments, writable=True) as needy:
             needy.set_development_mode(arguments.library, True)
         return 0
@@ -1,10 +1,7 @@
-from __future__ import print_function
-
 from .. import command
-from ..needy import ConfiguredNeedy
 
 
-class PkgConfigPathCommand(command.Command):
+class PkgConfigPathCommand(command.QueryCommand):
     def name(self):
         return 'pkg-config-path'
 
@@ -14,7 +11,9 @@ class PkgConfigPathCommand(command.Command):
         parser.add_argument('library', default=None, nargs='*', help='the library to satisfy. shell-style wildcards are allowed').completer = command.library_completer
         command.add_target_specification_args(parser, 'gets the path')
 
-    def execute(self, arguments):
-        with ConfiguredNeedy('.', arguments) as needy:
-            print(needy.pkg_config_path(arguments.universal_binary if arguments.universal_binary else needy.target(arguments.target), arguments.library), end='')
-        return 0
+    def query(self, needy, arguments):
+        return needy.pkg_config_path(arguments.universal_binary if arguments.universal_binary else needy.target(arguments.target), arguments.library)
+
+    def indexed_query(self, index, arguments):
+        paths = index and index.pkg_config_paths(arguments.universal_binary or arguments.target, arguments.library)
+        return None if paths is None else ':'.join(paths)
@@ -1,4 +1,9 @@
+import hashlib
+import json
+import os
+
 from .. import command
+from ..coalescing import SatisfyCoalescer
 from ..needy import ConfiguredNeedy
 from ..platforms import available_platforms
 
@@ -16,12 +21,24 @@ class SatisfyCommand(command.Command):
         parser.add_argument('library', default=None, nargs='*', help='the library to satisfy. shell-style wildcards are allowed').completer = command.library_completer
         parser.add_argument('-j', '--concurrency', default=1, const=0, nargs='?', type=int, help='number of jobs to process concurrently. omit or specify 0 for full concurrency')
         parser.add_argument('-f', '--force-build', action='store_true', help='force a build even when the target is up-to-date')
+        parser.add_argument('--plan', action='store_true', help='print what would be built as json instead of building anything')
         command.add_target_specification_args(parser, 'builds needs')
 
     def execute(self, arguments):
         with ConfiguredNeedy('.', arguments) as needy:
-            if arguments.universal_binary:
-                needy.satisfy_universal_binary(arguments.universal_binary, arguments.library)
-            else:
-                needy.satisfy_target(needy.target(arguments.target), arguments.library)
+            if arguments.plan:
+                plan = needy.plan(arguments.universal_binary or needy.target(arguments.target), arguments.library)
+                print(json.dumps(plan, indent=4, separators=(',', ': ')))
+                return 0
+
+            def satisfy(filters):
+                if arguments.universal_binary:
+                    needy.satisfy_universal_binary(arguments.universal_binary, filters)
+                else:
+                    needy.satisfy_target(needy.target(arguments.target), filters)
+
+            # instances can only share a run if everything but the libraries they want is the same
+            parameters = sorted((key, value) for key, value in vars(arguments).items() if key != 'library')
+            key = hashlib.sha1(json.dumps([needy.path(), parameters, sorted(os.environ.items())], default=str).encode()).hexdigest()
+            SatisfyCoalescer(os.path.join(needy.needs_directory(), 'satisfy'), key).satisfy(arguments.library, satisfy)
         return 0
@@ -0,0 +1,25 @@
+from .. import command
+from ..cd import current_directory
+from ..server import Server
+
+
+class ServeCommand(command.Command):
+    def name(self):
+        return 'serve'
+
+    def add_parser(self, group):
+        parser = group.add_parser(
+            self.name(),
+            description='Runs a server that answers queries such as cflags and ldflags for this project from memory. '
+                        'While it is running, those commands are forwarded to it automatically.',
+            help='serves queries from memory'
+        )
+        parser.add_argument('--idle-timeout', default=None, type=float, help='exit after this many seconds without a request')
+
+    def execute(self, arguments):
+        from ..__main__ import create_parser
+        from . import available_commands
+
+        commands = available_commands()
+        Server(current_directory(), create_parser(commands), commands).serve(arguments.idle_timeout)
+        return 0
@@ -0,0 +1,60 @@
+import heapq
+
+
+def dependency_closure(graph, names):
+    ''' returns the given names and everything they transitively depend on '''
+    ret = set()
+    names = list(names)
+    while len(names):
+        name = names.pop()
+        if name in ret:
+            continue
+        ret.add(name)
+        names.extend([dependency for dependency in graph[name] if dependency not in ret])
+    return ret
+
+
+def build_order(graph, definition_order):
+    """ returns the names in the graph ordered such that every name comes after its dependencies
+
+    Names that are ready at the same time are ordered by their index in
+    definition_order so that the result is stable.
+    """
+    in_degrees = {name: len(dependencies) for name, dependencies in graph.items()}
+    dependents = {name: [] for name in graph}
+    for name, dependencies in graph.items():
+        for dependency in dependencies:
+            dependents[dependency].append(name)
+
+    order = {name: index for index, name in enumerate(definition_order)}
+    ready = [(order[name], name) for name, in_degree in in_degrees.items() if in_degree == 0]
+    heapq.heapify(ready)
+
+    ret = []
+
+    while len(ready):
+        _, name = heapq.heappop(ready)
+        ret.append(name)
+        for dependent in dependents[name]:
+            in_degrees[dependent] -= 1
+            if in_degrees[dependent] == 0:
+                heapq.heappush(ready, (order[dependent], dependent))
+
+    if len(ret) < len(graph):
+        cycle = find_cycle(graph, [name for name, in_degree in in_degrees.items() if in_degree > 0])
+        raise ValueError('circular dependency detected: {}'.format(' -> '.join(cycle)))
+
+    return ret
+
+
+def find_cycle(graph, unresolved):
+    ''' returns a dependency cycle from the graph. every unresolved name depends on at least one other unresolved name '''
+    unresolved = set(unresolved)
+    path = []
+    indices = {}
+    name = min(unresolved)
+    while name not in indices:
+        indices[name] = len(path)
+        path.append(name)
+        name = min([dependency for dependency in graph[name] if dependency in unresolved])
+    return path[indices[name]:] + [name]
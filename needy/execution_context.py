@@ -0,0 +1,48 @@
+import os
+
+from .cd import current_directory
+
+
+class ExecutionContext:
+    """ The directory and environment that commands run in, and the log that their output goes to.
+
+    Unlike cd and OverrideEnvironment, a context doesn't change any process-wide
+    state, so builds on different threads can each have their own. Contexts
+    are never modified; the with_* methods return new ones instead.
+    """
+
+    def __init__(self, directory=None, environment=None, log=None):
+        self.__directory = os.path.join(current_directory(), directory) if directory else current_directory()
+        self.__environment = dict(os.environ if environment is None else environment)
+        self.__log = log
+
+    def directory(self):
+        return self.__directory
+
+    def environment(self):
+        ''' returns the environment, which mustn't be modified '''
+        return self.__environment
+
+    def log(self):
+        ''' returns the BuildLog that output goes to or None if it goes straight to stdout '''
+        return self.__log
+
+    def path(self, *components):
+        ''' returns the path relative to the context's directory '''
+        return os.path.join(self.__directory, *components)
+
+    def with_directory(self, directory):
+        return ExecutionContext(self.path(directory), self.__environment, self.__log)
+
+    def with_log(self, log):
+        return ExecutionContext(self.__directory, self.__environment, log)
+
+    def with_overrides(self, overrides):
+        ''' returns a context with the variables in overrides set, or unset if their values are None '''
+        environment = dict(self.__environment)
+        for key, value in overrides.items():
+            if value is None:
+                environment.pop(key, None)
+            else:
+                environment[key] = value
+        return ExecutionContext(self.__directory, environment, self.__log)
@@ -1,15 +1,22 @@
+import errno
 import os
 import shutil
-import signal
+import sys
 import tempfile
 import time
 import json
 import hashlib
 
+from collections import OrderedDict
 from contextlib import contextmanager
 
 O_BINARY = getattr(os, 'O_BINARY', 0)
 
+# linux's ioctl for sharing a file's blocks copy-on-write, as supported by btrfs and xfs
+FICLONE = 0x40049409
+
+COPY_STRATEGIES = ['reflink', 'copy_file_range', 'sendfile', 'hardlink', 'buffered']
+
 
 class TempDir:
     def __enter__(self):
@@ -20,42 +27,27 @@ class TempDir:
         shutil.rmtree(self.__path)
 
 
-class SignalTimeout:
-    def __init__(self, seconds):
-        self.__seconds = seconds
-
-    @staticmethod
-    def timeout_handler(signum, frame):
-        pass
-
-    def __enter__(self):
-        self.__previous_handler = signal.signal(signal.SIGALRM, SignalTimeout.timeout_handler)
-        signal.alarm(self.__seconds)
-
-    def __exit__(self, etype, value, traceback):
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, self.__previous_handler)
-
-
-def __win32_lock_fd(fd, timeout=None):
+def __win32_lock_fd(fd, timeout=None, shared=False):
     '''returns True if the file descriptor is successfully locked'''
     import pywintypes
     import win32con
     import win32file
     import winerror
 
+    flags = 0 if shared else win32con.LOCKFILE_EXCLUSIVE_LOCK
+
     try:
         handle = win32file._get_osfhandle(fd)
 
         if timeout is None:
-            win32file.LockFileEx(handle, win32con.LOCKFILE_EXCLUSIVE_LOCK, 0, -0x10000, pywintypes.OVERLAPPED())
+            win32file.LockFileEx(handle, flags, 0, -0x10000, pywintypes.OVERLAPPED())
             return True
 
         if timeout > 0:
             start = time.time()
             while True:
                 try:
-                    win32file.LockFileEx(handle, win32con.LOCKFILE_EXCLUSIVE_LOCK | win32con.LOCKFILE_FAIL_IMMEDIATELY, 0, -0x10000, pywintypes.OVERLAPPED())
+                    win32file.LockFileEx(handle, flags | win32con.LOCKFILE_FAIL_IMMEDIATELY, 0, -0x10000, pywintypes.OVERLAPPED())
                     return True
                 except pywintypes.error as e:
                     if e.winerror != winerror.ERROR_LOCK_VIOLATION:
@@ -64,43 +56,54 @@ def __win32_lock_fd(fd, timeout=None):
                     if time.time() > start + timeout:
                         break
         else:
-            win32file.LockFileEx(handle, win32con.LOCKFILE_EXCLUSIVE_LOCK | win32con.LOCKFILE_FAIL_IMMEDIATELY, 0, -0x10000, pywintypes.OVERLAPPED())
+            win32file.LockFileEx(handle, flags | win32con.LOCKFILE_FAIL_IMMEDIATELY, 0, -0x10000, pywintypes.OVERLAPPED())
             return True
     except pywintypes.error:
         pass
     return False
 
 
-def __fcntl_lock_fd(fd, timeout=None):
+def __fcntl_lock_fd(fd, timeout=None, shared=False):
     '''returns True if the file descriptor is successfully locked'''
     import fcntl
+    operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
     try:
         if timeout is None:
-            fcntl.flock(fd, fcntl.LOCK_EX)
-        elif timeout > 0:
-            with SignalTimeout(timeout):
-                fcntl.flock(fd, fcntl.LOCK_EX)
-        else:
-            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(fd, operation)
+            return True
+
+        # this polls rather than interrupting flock with an alarm, which only works on the main thread
+        start = time.time()
+        while True:
+            try:
+                fcntl.flock(fd, operation | fcntl.LOCK_NB)
+                return True
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES) or time.time() > start + timeout:
+                    break
+                time.sleep(0.05)
     except IOError:
-        return False
-    return True
+        pass
+    return False
 
 
-def lock_fd(fd, timeout=None):
-    '''returns True if the file descriptor is successfully locked'''
+def lock_fd(fd, timeout=None, shared=False):
+    '''returns True if the file descriptor is successfully locked
+
+    Any number of shared locks can be held at once, but an exclusive lock excludes all others.
+    '''
     try:
-        return __win32_lock_fd(fd, timeout)
+        return __win32_lock_fd(fd, timeout, shared)
     except ImportError:
-        return __fcntl_lock_fd(fd, timeout)
+        return __fcntl_lock_fd(fd, timeout, shared)
     return False
 
 
-def lock_file(file_path, timeout=None):
+def lock_file(file_path, timeout=None, shared=False):
     '''returns file descriptor to newly locked file or None if file couldn't be locked'''
     fd = os.open(file_path, os.O_RDWR | os.O_CREAT | O_BINARY)
     try:
-        if lock_fd(fd, timeout):
+        if lock_fd(fd, timeout, shared):
             return fd
     except:
         os.close(fd)
@@ -109,6 +112,28 @@ def lock_file(file_path, timeout=None):
     return None
 
 
+@contextmanager
+def file_lock(path, shared=False, waiting_message=None):
+    ''' holds a lock on the file, which is created along with its directory if necessary, printing the message if it has to wait '''
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+    fd = lock_file(path, timeout=0, shared=shared)
+    if fd is None:
+        if waiting_message:
+            sys.stderr.write(waiting_message + '\n')
+        fd = lock_file(path, shared=shared)
+    try:
+        yield
+    finally:
+        os.close(fd)
+
+
 def clean_file(file_path):
     parent_dir = os.path.dirname(file_path)
     if not os.path.exists(parent_dir):
@@ -123,6 +148,84 @@ def clean_directory(directory_path):
     os.makedirs(directory_path)
 
 
+def user_cache_directory():
+    ''' returns the directory for caches that are shared between needy invocations '''
+    return os.environ.get('NEEDY_CACHE_DIRECTORY', os.path.join(os.path.expanduser('~'), '.needy', 'cache'))
+
+
+def write_file_atomically(path, contents):
+    ''' writes the file such that concurrent readers see either the old or the new contents, never a partial file '''
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.{}.'.format(os.path.basename(path)))
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(contents, bytes) else 'w') as f:
+            f.write(contents)
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, path)
+        else:
+            if sys.platform == 'win32' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_json_file(path, default=None, object_pairs_hook=None):
+    ''' returns the parsed contents of the file or the default if it doesn't exist or isn't valid json '''
+    try:
+        with open(path, 'r') as f:
+            return json.loads(f.read(), object_pairs_hook=object_pairs_hook)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+def add_to_json_cache(path, key, value, max_entries):
+    """ adds the entry to the json object in the file, evicting the oldest entries beyond max_entries
+
+    Failures to write the cache are ignored since it can always be rebuilt.
+    """
+    cache = read_json_file(path, object_pairs_hook=OrderedDict)
+    if not isinstance(cache, OrderedDict):
+        cache = OrderedDict()
+    cache.pop(key, None)
+    cache[key] = value
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+    try:
+        write_file_atomically(path, json.dumps(cache))
+    except (IOError, OSError):
+        pass
+
+
+def touch(path):
+    ''' updates the file's modification time if it exists '''
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def prune_least_recently_used(directory, max_entries, extension='.json'):
+    ''' removes the least recently modified files with the extension in the directory beyond the limit '''
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(extension)]
+    if len(paths) <= max_entries:
+        return
+    paths.sort(key=lambda path: os.path.getmtime(path))
+    for path in paths[:len(paths) - max_entries]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
 def os_file(path, flags, mode):
     fd = os.open(path, flags)
     return os.fdopen(fd, mode)
@@ -142,6 +245,102 @@ def copy_if_changed(src, dst):
     shutil.copy2(src, dst)
 
 
+def fast_copy(source, destination, hardlink=False, strategies=COPY_STRATEGIES):
+    """ copies the file at source to destination as cheaply as the filesystem allows and returns the strategy that did it
+
+    The strategies are tried in order: a reflink that shares the source's
+    blocks until either file changes, a copy within the kernel, a hardlink,
+    and finally a copy through a buffer. Hardlinked files share their contents,
+    so they're only used if hardlink is True, which is only safe if neither
+    file is ever modified in place. As with shutil.copy2, the source's
+    permissions and times are copied as well, so that tools like make and
+    automake don't see copied files as newer than the ones generated from them.
+
+    The destination is removed first rather than overwritten, since it may be
+    a link to a file that mustn't change.
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+
+    for strategy in ['reflink', 'copy_file_range', 'sendfile']:
+        if strategy not in strategies:
+            continue
+        try:
+            # opening the destination again truncates whatever a failed strategy left behind
+            with open(source, 'rb', 0) as s:
+                with open(destination, 'wb', 0) as d:
+                    __kernel_copy(strategy, s.fileno(), d.fileno())
+                    if os.fstat(d.fileno()).st_size != os.fstat(s.fileno()).st_size:
+                        raise OSError(errno.EIO, 'incomplete copy')
+        except (AttributeError, IOError, OSError):
+            # the platform or filesystem doesn't support it
+            continue
+        shutil.copystat(source, destination)
+        return strategy
+
+    if os.path.lexists(destination):
+        os.remove(destination)
+
+    if hardlink and 'hardlink' in strategies and hasattr(os, 'link'):
+        try:
+            os.link(source, destination)
+            return 'hardlink'
+        except OSError:
+            pass
+
+    with open(source, 'rb') as s:
+        with open(destination, 'wb') as d:
+            shutil.copyfileobj(s, d, 1 << 20)
+    shutil.copystat(source, destination)
+    return 'buffered'
+
+
+def __kernel_copy(strategy, source_fd, destination_fd):
+    if strategy == 'reflink':
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOTSUP, 'reflinks are only supported on linux')
+        import fcntl
+        fcntl.ioctl(destination_fd, FICLONE, source_fd)
+        return
+
+    size = os.fstat(source_fd).st_size
+    copied = 0
+    while copied < size:
+        if strategy == 'copy_file_range':
+            count = os.copy_file_range(source_fd, destination_fd, size - copied)
+        else:
+            count = os.sendfile(destination_fd, source_fd, copied, size - copied)
+        if count == 0:
+            raise OSError(errno.EIO, 'unexpected end of file')
+        copied += count
+
+
+def fast_copy_tree(source, destination, symlinks=False, ignore=None, hardlink=False):
+    ''' like shutil.copytree, but copies files with fast_copy. files in an existing destination are replaced '''
+    names = os.listdir(source)
+    ignored = ignore(source, names) if ignore else set()
+    if not os.path.isdir(destination):
+        os.makedirs(destination)
+    for name in names:
+        if name in ignored:
+            continue
+        source_path = os.path.join(source, name)
+        destination_path = os.path.join(destination, name)
+        if symlinks and os.path.islink(source_path):
+            if os.path.lexists(destination_path):
+                os.remove(destination_path)
+            os.symlink(os.readlink(source_path), destination_path)
+        elif os.path.isdir(source_path):
+            fast_copy_tree(source_path, destination_path, symlinks, ignore, hardlink)
+        else:
+            fast_copy(source_path, destination_path, hardlink)
+    try:
+        shutil.copystat(source, destination)
+    except OSError:
+        # windows doesn't let directories' times be set
+        pass
+
+
 # from http://stackoverflow.com/questions/3431825
 def file_hash(afile, hasher, blocksize=65536):
     buf = afile.read(blocksize)
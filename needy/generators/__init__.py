@@ -1,7 +1,11 @@
-from .jamfile import JamfileGenerator
-from .pkgconfig_jam import PkgConfigJamGenerator
-from .xcconfig import XCConfigGenerator
-
-
-def available_generators():
-    return [JamfileGenerator, PkgConfigJamGenerator, XCConfigGenerator]
+import importlib
+
+GENERATORS = [
+    ('.jamfile', 'JamfileGenerator'),
+    ('.pkgconfig_jam', 'PkgConfigJamGenerator'),
+    ('.xcconfig', 'XCConfigGenerator'),
+]
+
+
+def available_generators():
+    return [getattr(importlib.import_module(module, package=__name__), name) for module, name in GENERATORS]
@@ -0,0 +1,114 @@
+import errno
+import os
+import select
+import shutil
+import tempfile
+
+from contextlib import contextmanager
+
+_active_jobserver = None
+
+
+def active_jobserver():
+    """ returns the jobserver that commands should share or None """
+    return _active_jobserver
+
+
+class JobServer:
+    """ A GNU make compatible jobserver.
+
+    The jobserver is a pipe holding one token for every job beyond the first.
+    Make, and anything else that understands MAKEFLAGS, reads a token before
+    starting an additional job and writes it back when that job is finished,
+    so concurrent builds draw from one pool. While entered, it is exported to
+    every command run through needy.process.
+
+    The pipe is a named one so that it can be opened a second time for
+    non-blocking reads. Setting O_NONBLOCK on the descriptors that commands
+    inherit would change them for make too.
+    """
+
+    def __init__(self, jobs):
+        self.__jobs = jobs
+        self.__directory = tempfile.mkdtemp()
+        path = os.path.join(self.__directory, 'jobserver')
+        os.mkfifo(path, 0o600)
+        # opening the read end first without blocking lets the others open without waiting for a peer
+        self.__nonblocking_read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        self.__write_fd = os.open(path, os.O_WRONLY)
+        self.__read_fd = os.open(path, os.O_RDONLY)
+        if jobs > 1:
+            os.write(self.__write_fd, b'+' * (jobs - 1))
+
+    def jobs(self):
+        return self.__jobs
+
+    def fds(self):
+        return (self.__read_fd, self.__write_fd)
+
+    def makeflags(self):
+        # --jobserver-fds is understood by make 3.81 through 4.1, --jobserver-auth by 4.2 and later
+        return '-j{jobs} --jobserver-fds={fds} --jobserver-auth={fds}'.format(jobs=self.__jobs, fds='{},{}'.format(*self.fds()))
+
+    def environment_overrides(self, environment=None):
+        environment = os.environ if environment is None else environment
+        makeflags = self.makeflags()
+        if environment.get('MAKEFLAGS'):
+            makeflags = '{} {}'.format(environment['MAKEFLAGS'], makeflags)
+        return {'MAKEFLAGS': makeflags}
+
+    def token_available(self):
+        readable, _, _ = select.select([self.__read_fd], [], [], 0)
+        return bool(readable)
+
+    def acquire(self, blocking=True):
+        """ returns True if a token was taken from the pool """
+        if blocking:
+            return len(os.read(self.__read_fd, 1)) == 1
+        if not self.token_available():
+            return False
+        try:
+            return len(os.read(self.__nonblocking_read_fd, 1)) == 1
+        except OSError as e:
+            # commands read from the pipe too, and one may have taken the token since it was available
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return False
+            raise
+
+    def release(self):
+        os.write(self.__write_fd, b'+')
+
+    def close(self):
+        os.close(self.__read_fd)
+        os.close(self.__nonblocking_read_fd)
+        os.close(self.__write_fd)
+        shutil.rmtree(self.__directory, ignore_errors=True)
+
+    def __enter__(self):
+        global _active_jobserver
+        self.__previous_jobserver = _active_jobserver
+        _active_jobserver = self
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        global _active_jobserver
+        _active_jobserver = self.__previous_jobserver
+        self.close()
+
+
+@contextmanager
+def reserved_jobs(jobs):
+    """ for tools that can't participate in the jobserver, reserves up to the given number of jobs from it and yields the number reserved """
+    jobserver = active_jobserver()
+    if jobserver is None:
+        yield jobs
+        return
+
+    tokens = 0
+    while tokens + 1 < jobs and jobserver.acquire(blocking=False):
+        tokens += 1
+    try:
+        yield tokens + 1
+    finally:
+        for _ in range(tokens):
+            jobserver.release()
@@ -4,24 +4,22 @@ import json
 import os
 import shutil
 import logging
-import tarfile
 import textwrap
+import time
 
+from contextlib import contextmanager
 from operator import itemgetter
 
-from .filesystem import TempDir
+from .filesystem import read_json_file, write_file_atomically
 
 from .project import evaluate_conditionals
 from .project import ProjectDefinition
 
-from .sources.download import Download
-from .sources.directory import Directory
-from .sources.git import GitRepository
-
-from .cd import cd
-from .override_environment import OverrideEnvironment
+from .build_log import BuildLog
+from .execution_context import ExecutionContext
 from .target import Target
-from .filesystem import clean_directory
+from .filesystem import clean_directory, file_lock, force_rmtree
+from .memoize import MemoizeMethod
 
 from .process import command
 from .projects import project_types
@@ -29,7 +27,7 @@ from .projects import project_types
 from .utility import Fore
 
 class Library:
-    def __init__(self, needy, name, target=None, configuration=None, development_mode=False, build_caches=[]):
+    def __init__(self, needy, name, target=None, configuration=None, development_mode=False, build_caches=[], source_directory=None):
         self.needy = needy
         self.__name = name
         self.__target = target
@@ -37,6 +35,8 @@ class Library:
         self.__directory = os.path.join(needy.needs_directory(), name)
         self.__development_mode = development_mode
         self.__build_caches = build_caches
+        self.__source_directory = source_directory
+        self.__build_concurrency = None
 
     def configuration(self):
         return self.__configuration
@@ -51,7 +51,11 @@ class Library:
         return evaluate_conditionals(self.__configuration['project'] if 'project' in self.__configuration else dict(), self.target())
 
     def dependencies(self):
-        str_or_list = self.configuration().get('dependencies', [])
+        return Library.configured_dependencies(self.configuration())
+
+    @staticmethod
+    def configured_dependencies(configuration):
+        str_or_list = configuration.get('dependencies', []) if configuration else []
         return str_or_list if isinstance(str_or_list, list) else [str_or_list]
 
     def string_format_variables(self):
@@ -60,7 +64,7 @@ class Library:
             'platform': self.target().platform.identifier(),
             'architecture': self.target().architecture,
             'needs_file_directory': self.needy.path(),
-            'build_concurrency': self.needy.build_concurrency(),
+            'build_concurrency': self.build_concurrency(),
         }
 
     @staticmethod
@@ -77,20 +81,26 @@ class Library:
     def clean_source(self):
         source = self.source()
         source.clean()
+        if self.__source_directory is None and os.path.exists(self.working_copies_directory()):
+            force_rmtree(self.working_copies_directory())
 
     def clean_build(self):
         clean_directory(self.build_directory())
 
     def initialize_source(self):
         self.clean_source()
-        with OverrideEnvironment(self.__environment_overrides()):
-            self.__post_clean()
+        self.__post_clean(self.__execution_context())
 
     def synchronize_source(self):
         source = self.source()
         source.synchronize()
 
     def source(self):
+        # the sources pull in networking modules, so they're only imported when they're needed
+        from .sources.download import Download
+        from .sources.directory import Directory
+        from .sources.git import GitRepository
+
         cfg = self.__configuration
         if 'download' in cfg:
             return Download(cfg['download'], cfg['checksum'], self.source_directory(), os.path.join(self.directory(), 'download'))
@@ -100,13 +110,20 @@ class Library:
             return Directory(cfg['directory'] if os.path.isabs(cfg['directory']) else os.path.join(self.needy.path(), cfg['directory']), self.source_directory())
         raise ValueError('no source specified in configuration')
 
-    def build(self):
+    def build_concurrency(self):
+        return self.__build_concurrency or self.needy.build_concurrency()
+
+    def build(self, build_concurrency=None, echo_output=True):
+        ''' builds the library. the output of the build commands always goes to its log, and is also echoed if echo_output is True '''
+        self.__build_concurrency = build_concurrency
+
         if not self.needy.parameters().force_build and not self.is_in_development_mode():
             if self.__load_cached_artifacts():
                 logging.info('Build restored from cache')
                 return True
 
         logging.info('Building for %s %s' % (self.target().platform.identifier(), self.target().architecture))
+        start_time = time.time()
 
         if ' ' in self.__directory:
             print(Fore.YELLOW + '[WARNING]' + Fore.RESET + ' The build path contains spaces. Some build systems don\'t '
@@ -115,58 +132,76 @@ class Library:
         if not self.is_in_development_mode():
             self.clean_source()
 
-        with OverrideEnvironment(self.__environment_overrides()):
-            if not self.is_in_development_mode():
-                self.__post_clean()
+        with BuildLog(self.log_path(), echo=echo_output) as log:
+            try:
+                self.__build(self.__execution_context().with_log(log))
+            except Exception:
+                if log.hid_output():
+                    Library.__print_log_tail(log)
+                raise
+
+        self.__record_build_duration(time.time() - start_time)
+        return True
+
+    def __build(self, context):
+        if not self.is_in_development_mode():
+            self.__post_clean(context)
 
-            configuration = self.project_configuration()
+        configuration = self.project_configuration()
+
+        project = self.project(ProjectDefinition(self.target(), self.project_root(), configuration, self.build_concurrency(), context))
+        if not project:
+            raise RuntimeError('unknown project type')
 
-            project = self.project(ProjectDefinition(self.target(), self.project_root(), configuration))
-            if not project:
-                raise RuntimeError('unknown project type')
+        unrecognized_configuration_keys = set(configuration.keys()) - project.configuration_keys() - self.additional_project_configuration_keys()
+        if len(unrecognized_configuration_keys):
+            raise RuntimeError('unrecognized project configuration keys: {}'.format(', '.join(unrecognized_configuration_keys)))
 
-            unrecognized_configuration_keys = set(configuration.keys()) - project.configuration_keys() - self.additional_project_configuration_keys()
-            if len(unrecognized_configuration_keys):
-                raise RuntimeError('unrecognized project configuration keys: {}'.format(', '.join(unrecognized_configuration_keys)))
+        project.set_string_format_variables(**self.string_format_variables())
 
-            project.set_string_format_variables(**self.string_format_variables())
+        if not self.is_in_development_mode():
+            self.clean_build()
 
-            if not self.is_in_development_mode():
-                self.clean_build()
+        self.__actualize(project)
+        self.__write_build_status()
+        if not self.is_in_development_mode():
+            self.__cache_artifacts()
 
-            self.__actualize(project)
-            self.__write_build_status()
-            if not self.is_in_development_mode():
-                self.__cache_artifacts()
+    @staticmethod
+    def __print_log_tail(log):
+        print(Fore.RED + 'The build failed. Its last lines of output were:' + Fore.RESET)
+        for line in log.tail():
+            print('    {}'.format(line))
+        print('The full output is in {}'.format(log.path()))
 
-        return True
+    def __execution_context(self):
+        ''' the context that the library's commands run in, which doesn't touch the process's directory or environment '''
+        return ExecutionContext(self.project_root()).with_overrides(self.__environment_overrides())
 
-    def __post_clean(self):
+    def __post_clean(self, context):
         configuration = self.project_configuration()
         post_clean_commands = configuration['post-clean'] if 'post-clean' in configuration else []
-        with cd(self.project_root()):
-            for cmd in self.evaluate(post_clean_commands):
-                command(cmd)
+        for cmd in self.evaluate(post_clean_commands):
+            command(cmd, context=context)
 
     def __actualize(self, project):
         build_directory = self.build_directory()
         configuration = self.project_configuration()
-        with cd(self.project_root()):
-            try:
-                project.setup()
-                if 'configure-steps' in configuration:
-                    project.run_commands(configuration['configure-steps'])
-                else:
-                    project.configure(build_directory)
-                project.pre_build(build_directory)
-                project.build(build_directory)
-                project.post_build(build_directory)
-                Library.make_pkgconfigs_relocatable(build_directory)
-                if self.__should_generate_pkgconfig():
-                    self.generate_pkgconfig(build_directory, self.name())
-            except:
-                shutil.rmtree(build_directory)
-                raise
+        try:
+            project.setup()
+            if 'configure-steps' in configuration:
+                project.run_commands(configuration['configure-steps'])
+            else:
+                project.configure(build_directory)
+            project.pre_build(build_directory)
+            project.build(build_directory)
+            project.post_build(build_directory)
+            Library.make_pkgconfigs_relocatable(build_directory)
+            if self.__should_generate_pkgconfig():
+                self.generate_pkgconfig(build_directory, self.name())
+        except:
+            shutil.rmtree(build_directory)
+            raise
 
     def __should_generate_pkgconfig(self):
         def is_empty(path):
@@ -177,38 +212,42 @@ class Library:
                 (not is_empty(include_dir) or not is_empty(lib_dir)))
 
     def __write_build_status(self):
-        with open(self.build_status_path(), 'w') as status_file:
-            status = {} if self.is_in_development_mode() else self.configuration_dict()
-            json.dump(status, status_file, sort_keys=True, indent=4, separators=(',', ': '))
+        # the status is replaced rather than rewritten since a restored one may be linked to a cache's read-only copy
+        status = {} if self.is_in_development_mode() else self.configuration_dict()
+        write_file_atomically(self.build_status_path(), json.dumps(status, sort_keys=True, indent=4, separators=(',', ': ')))
 
     def __cache_artifacts(self):
-        if not self.__build_caches:
-            return False
-        with TempDir() as temp_dir:
-            temp_tar = os.path.join(temp_dir, 'temp')
-            tar = tarfile.open(temp_tar, 'w:gz')
-            tar.add(self.build_directory(), arcname='.')
-            tar.close()
-            for cache in self.__build_caches:
-                if cache.set(self.__cache_key(), temp_tar):
-                    d = self.configuration_dict()
-                    logging.debug('cache object hash {} formed from...\n{}'.format(
-                        binascii.hexlify(self.configuration_hash(d)),
-                        json.dumps(d, sort_keys=True, indent=4, separators=(',', ': ')))
-                    )
-                    return True
+        for cache in self.__build_caches:
+            if cache.store_directory(self.__cache_key(), self.build_directory()):
+                d = self.configuration_dict()
+                logging.debug('cache object hash {} formed from...\n{}'.format(
+                    binascii.hexlify(self.configuration_hash(d)),
+                    json.dumps(d, sort_keys=True, indent=4, separators=(',', ': ')))
+                )
+                return True
         return False
 
     def __load_cached_artifacts(self):
-        with TempDir() as temp_dir:
-            temp_tar = os.path.join(temp_dir, 'artifacts.tgz')
-            for cache in self.__build_caches:
-                if cache.get(self.__cache_key(), temp_tar):
-                    tar = tarfile.open(temp_tar, 'r:gz')
-                    tar.extractall(path=self.build_directory())
-                    tar.close()
-                    return True
-        return False
+        return any(cache.restore_directory(self.__cache_key(), self.build_directory()) for cache in self.__build_caches)
+
+    def is_restorable_from_cache(self):
+        if self.is_in_development_mode():
+            return False
+        return any(cache.exists(self.__cache_key()) for cache in self.__build_caches)
+
+    def build_duration(self):
+        ''' returns the number of seconds the last build into this library's build directory took or None '''
+        return read_json_file(self.build_duration_path(), {}).get('seconds')
+
+    def build_duration_path(self):
+        # each build directory has its own so that concurrent builds of the library never share the file
+        return os.path.join(self.build_directory(), 'needy.duration')
+
+    def __record_build_duration(self, seconds):
+        try:
+            write_file_atomically(self.build_duration_path(), json.dumps({'seconds': round(seconds, 3)}))
+        except (IOError, OSError):
+            pass
 
     def __cache_key(self):
         configuration_hash = binascii.hexlify(self.configuration_hash()).decode()
@@ -287,7 +326,40 @@ class Library:
         return os.path.join(self.build_directory(), 'needy.status')
 
     def source_directory(self):
-        return os.path.join(self.__directory, 'source')
+        return self.__source_directory or os.path.join(self.__directory, 'source')
+
+    def with_target_working_copy(self):
+        """ returns a copy of this library that builds from a working copy of its own so that it can build alongside other targets """
+        return Library(self.needy, self.__name,
+                       target=self.__target,
+                       configuration=self.__configuration,
+                       development_mode=self.__development_mode,
+                       build_caches=self.__build_caches,
+                       source_directory=os.path.join(self.working_copies_directory(), self.target().platform.identifier(), self.target().architecture))
+
+    def working_copies_directory(self):
+        ''' the directory that the per-target working copies are kept in. they're removed along with the source '''
+        return os.path.join(self.__directory, 'sources')
+
+    @contextmanager
+    def locked(self):
+        ''' excludes other needy instances from writing the library's source and its build directory for the target '''
+        with self.directory_lock(self.source_directory()):
+            with self.directory_lock(self.build_directory()):
+                yield
+
+    def log_path(self):
+        ''' the log of the last build into the build directory. it's kept apart from the directory so that it outlives failed builds '''
+        name = os.path.relpath(self.build_directory(), self.__directory).replace(os.sep, '.')
+        return os.path.join(self.__directory, 'logs', name + '.log')
+
+    def directory_lock(self, directory):
+        """ returns a context manager that excludes other needy instances from writing the directory, which must be within the library's
+
+        The lock files are kept apart from the directories so that cleaning doesn't remove them while they're held.
+        """
+        name = os.path.relpath(directory, self.__directory).replace(os.sep, '.')
+        return file_lock(os.path.join(self.__directory, 'locks', name + '.lock'), waiting_message='Waiting for other needy instances to finish with {}...'.format(directory))
 
     def project_root(self):
         configuration = self.project_configuration()
@@ -300,7 +372,7 @@ class Library:
         return os.path.join(self.build_directory(), 'lib')
 
     def project(self, definition):
-        candidates = project_types
+        candidates = project_types()
 
         if 'type' in definition.configuration:
             for candidate in candidates:
@@ -316,45 +388,65 @@ class Library:
 
         logging.debug('project candidates ordered by number of valid configuration keys: {}'.format(', '.join([c.identifier() for c in candidates])))
         logging.debug('evaluating candidates in {}'.format(definition.directory))
-        with cd(definition.directory):
-            for candidate in candidates:
-                valid, reasons = candidate.is_valid_project(definition, self.needy)
-                missing_prerequisites = candidate.missing_prerequisites(definition, self.needy)
-                logging.debug('project type determined {} be {}'.format('to' if valid else 'not to', candidate.identifier()))
-                if isinstance(reasons, list):
-                    for r in reasons:
-                        logging.debug('  - {}'.format(r))
-                else:
-                    logging.debug('  - {}'.format(reasons))
-                if valid:
-                    if len(missing_prerequisites) > 0:
-                        print(Fore.YELLOW + '[WARNING]' + Fore.RESET + ' Detected {} project, but the following prerequisites are missing: {}'.format(
-                            candidate.identifier(), ', '.join(missing_prerequisites)
-                        ))
-                        continue
-                    return candidate(definition, self.needy)
+        for candidate in candidates:
+            valid, reasons = candidate.is_valid_project(definition, self.needy)
+            missing_prerequisites = candidate.missing_prerequisites(definition, self.needy)
+            logging.debug('project type determined {} be {}'.format('to' if valid else 'not to', candidate.identifier()))
+            if isinstance(reasons, list):
+                for r in reasons:
+                    logging.debug('  - {}'.format(r))
+            else:
+                logging.debug('  - {}'.format(reasons))
+            if valid:
+                if len(missing_prerequisites) > 0:
+                    print(Fore.YELLOW + '[WARNING]' + Fore.RESET + ' Detected {} project, but the following prerequisites are missing: {}'.format(
+                        candidate.identifier(), ', '.join(missing_prerequisites)
+                    ))
+                    continue
+                return candidate(definition, self.needy)
 
         raise RuntimeError('unknown project type')
 
     @classmethod
     def build_compatibility(cls):
-        return 6
+        return 7
 
     def configuration_hash(self, config_dict=None):
+        if config_dict:
+            return Library.__hash(config_dict)
+        return self.__configuration_hash()
+
+    @MemoizeMethod
+    def __configuration_hash(self):
+        return Library.__hash(self.configuration_dict())
+
+    @staticmethod
+    def __hash(config_dict):
         hash = hashlib.sha256()
-        hash.update(json.dumps(config_dict or self.configuration_dict(), sort_keys=True).encode())
+        hash.update(json.dumps(config_dict, sort_keys=True).encode())
         return hash.digest()
 
+    @MemoizeMethod
     def configuration_dict(self):
+        """ returns everything the library's build depends on
+
+        Dependencies are represented by their own configuration hashes, so a
+        change anywhere below a library changes its hash too, and each hash in
+        the graph is only computed once per run.
+        """
         configuration = self.__configuration.copy()
         configuration['project'] = self.project_configuration()
         return {
             'build-compatibility': self.build_compatibility(),
             'platform-configuration': (self.target().platform.configuration(self.target().architecture) or {}),
             'library-configuration': configuration,
-            'dependencies': [self.needy.library_configuration(self.target(), d) for d in self.dependencies()],
+            'dependencies': [self.__dependency_hash(d) for d in self.dependencies()],
         }
 
+    def __dependency_hash(self, name):
+        hash = self.needy.library_configuration_hash(self.target(), name)
+        return None if hash is None else binascii.hexlify(hash).decode()
+
     @staticmethod
     def generate_pkgconfig(prefix, library_name):
         libs = []
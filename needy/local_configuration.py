@@ -8,12 +8,17 @@ from .filesystem import lock_fd, os_file
 
 
 class LocalConfiguration:
-    """ This is a context manager that obtains exclusive read and write access to the given file."""
+    """ This is a context manager that obtains exclusive read and write access to the given file.
 
-    def __init__(self, path, blocking=True):
+    If it isn't writable, it obtains shared read access instead, so any number
+    of needy instances that only read the configuration can run at once.
+    """
+
+    def __init__(self, path, blocking=True, writable=True):
         self.__path = path
         self.__configuration = {}
         self.__blocking = blocking
+        self.__writable = writable
 
     def __enter__(self):
         directory = os.path.dirname(self.__path)
@@ -26,13 +31,14 @@ class LocalConfiguration:
 
         self.__file = os_file(self.__path, os.O_RDWR | os.O_CREAT, 'r+')
 
-        if not lock_fd(self.__file.fileno(), timeout=0):
+        shared = not self.__writable
+        if not lock_fd(self.__file.fileno(), timeout=0, shared=shared):
             if not self.__blocking:
                 self.__file.close()
                 self.__file = None
                 return None
             print('Waiting for other needy instances to terminate...', file=sys.stderr)
-            lock_fd(self.__file.fileno())
+            lock_fd(self.__file.fileno(), shared=shared)
 
         contents = self.__file.read()
         if contents:
@@ -41,7 +47,9 @@ class LocalConfiguration:
         return self
 
     def __exit__(self, etype, value, traceback):
-        if self.__file:
+        if self.__file and not self.__writable:
+            self.__file.close()
+        elif self.__file:
             self.__file.seek(0)
             self.__file.write(json.dumps(self.__configuration))
             self.__file.truncate()
@@ -62,6 +70,8 @@ class LocalConfiguration:
         return self.__configuration['libraries'][library_name][key]
 
     def __set_library_configuration(self, library_name, key, value):
+        if not self.__writable:
+            raise RuntimeError('The local configuration was opened read-only.')
         if 'libraries' not in self.__configuration:
             self.__configuration['libraries'] = {}
         if library_name not in self.__configuration['libraries']:
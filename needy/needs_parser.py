@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+
+from collections import OrderedDict
+
+from .filesystem import prune_least_recently_used, read_json_file, touch, write_file_atomically
+
+FORMAT_VERSION = 1
+MAX_CACHED_NEEDS = 32
+
+# the names a project's needs file can have, whose extensions determine how it's parsed
+NEEDS_FILE_NAMES = ['needs.json', 'needs.yaml']
+
+_yaml_loader = None
+
+
+def parse(rendered, extension, cache_directory=None):
+    """ returns the parsed needs with the order of their mappings preserved
+
+    YAML is much slower to parse than JSON, so parsed YAML is cached as JSON
+    in the cache directory, keyed by a hash of the rendered text. Needs that
+    JSON can't represent exactly, such as ones with dates or non-string keys,
+    aren't cached.
+    """
+    if extension == '.json':
+        return json.loads(rendered, object_pairs_hook=OrderedDict)
+
+    if extension == '.yaml':
+        path = None
+        if cache_directory:
+            digest = hashlib.sha1('{}\n{}'.format(FORMAT_VERSION, rendered).encode('utf-8')).hexdigest()
+            path = os.path.join(cache_directory, '{}.json'.format(digest))
+            ret = read_json_file(path, object_pairs_hook=OrderedDict)
+            if ret is not None:
+                touch(path)
+                return ret
+
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError('The needs are defined in a YAML file. Please install the pyyaml Python package.')
+        ret = yaml.load(rendered, yaml_loader())
+
+        if path:
+            __cache(path, ret)
+        return ret
+
+    raise RuntimeError('No needs file found.')
+
+
+def yaml_loader():
+    ''' returns a safe yaml loader that uses libyaml if it's available and loads mappings as OrderedDicts '''
+    global _yaml_loader
+    if _yaml_loader is None:
+        import yaml
+
+        class OrderedLoader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):
+            pass
+
+        def construct_mapping(loader, node):
+            loader.flatten_mapping(node)
+            return OrderedDict(loader.construct_pairs(node))
+
+        OrderedLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, construct_mapping)
+        _yaml_loader = OrderedLoader
+    return _yaml_loader
+
+
+def __cache(path, needs):
+    try:
+        serialized = json.dumps(needs)
+    except (TypeError, ValueError):
+        return
+    if json.loads(serialized, object_pairs_hook=OrderedDict) != needs:
+        return
+
+    try:
+        write_file_atomically(path, serialized)
+        prune_least_recently_used(os.path.dirname(path), MAX_CACHED_NEEDS)
+    except (IOError, OSError):
+        pass
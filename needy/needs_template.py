@@ -0,0 +1,174 @@
+import json
+import os
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from .filesystem import prune_least_recently_used, read_json_file, touch, user_cache_directory, write_file_atomically
+
+MAX_CACHED_TEMPLATES = 16
+MAX_CACHED_RENDERS = 32
+MAX_RENDER_VARIANTS = 8
+
+_environment = None
+_templates = {}
+_variables = {}
+
+
+class RecordingEnvironment(Mapping):
+    """ The environment as templates see it, recording every variable they read.
+
+    Variables that are read but aren't set are recorded as None. Iterating
+    over the environment records all of it.
+    """
+
+    def __init__(self, environment=None):
+        self.__environment = os.environ if environment is None else environment
+        self.__variables = {}
+
+    def __getitem__(self, key):
+        value = self.__environment.get(key)
+        self.__variables[key] = value
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        self.__variables.update(self.__environment)
+        return iter(list(self.__environment))
+
+    def __len__(self):
+        self.__variables.update(self.__environment)
+        return len(self.__environment)
+
+    def variables(self):
+        ''' returns the variables that have been read and their values '''
+        return dict(self.__variables)
+
+
+def parse_defines(define_arguments):
+    ''' returns a dict of the defines given by the -D arguments '''
+    ret = {}
+    for defines in define_arguments or []:
+        for define in defines:
+            parts = define.split('=', 1)
+            ret[parts[0]] = parts[1] if len(parts) >= 2 else 1
+    return ret
+
+
+def dependencies_are_unchanged(dependencies, defines, environment=None):
+    ''' returns True if the recorded defines and environment variables still have the same values '''
+    environment = os.environ if environment is None else environment
+    return (all(defines.get(name) == value for name, value in dependencies.get('defines', {}).items()) and
+            all(environment.get(name) == value for name, value in dependencies.get('environment', {}).items()))
+
+
+def render(name, source, variables, defines):
+    """ returns the rendered template and the defines and environment variables it read
+
+    The template is given the defines and variables, with the variables taking
+    precedence, and the environment as env. Raises ImportError if jinja2
+    isn't installed.
+    """
+    template = compiled_template(name, source)
+    environment = RecordingEnvironment()
+    context = dict(defines)
+    context.update(variables)
+    context['env'] = environment
+    rendered = template.render(**context)
+    return rendered, {
+        'defines': dict((variable, defines.get(variable)) for variable in template_variables(name, source) if variable not in variables and variable != 'env'),
+        'environment': environment.variables(),
+    }
+
+
+def cached_render(cache_directory, key, defines):
+    ''' returns the output and dependencies of a render cached under the key whose dependencies are unchanged, or None '''
+    path = os.path.join(cache_directory, '{}.json'.format(key))
+    variants = read_json_file(path, [])
+    for variant in variants if isinstance(variants, list) else []:
+        if dependencies_are_unchanged(variant['dependencies'], defines):
+            touch(path)
+            return variant['rendered'], variant['dependencies']
+    return None
+
+
+def cache_render(cache_directory, key, rendered, dependencies):
+    ''' caches a render under the key, which must identify everything it depends on besides the given dependencies '''
+    path = os.path.join(cache_directory, '{}.json'.format(key))
+    variants = read_json_file(path, [])
+    variants = [variant for variant in variants if variant['dependencies'] != dependencies] if isinstance(variants, list) else []
+    variants.insert(0, {'rendered': rendered, 'dependencies': dependencies})
+    try:
+        write_file_atomically(path, json.dumps(variants[:MAX_RENDER_VARIANTS]))
+        prune_least_recently_used(cache_directory, MAX_CACHED_RENDERS)
+    except (IOError, OSError):
+        pass
+
+
+def bytecode_cache_directory():
+    return os.path.join(user_cache_directory(), 'templates')
+
+
+def compiled_template(name, source):
+    """ returns the compiled Jinja template for the needs file with the given name and source
+
+    Templates are compiled once per process, and their bytecode is cached on
+    disk so that later invocations don't have to compile them at all. Raises
+    ImportError if jinja2 isn't installed.
+    """
+    key = (name, source)
+    if key not in _templates:
+        from jinja2 import FunctionLoader
+        if len(_templates) >= MAX_CACHED_TEMPLATES:
+            _templates.clear()
+        _templates[key] = FunctionLoader(lambda _: source).load(environment(), name)
+    return _templates[key]
+
+
+def template_variables(name, source):
+    ''' returns the names of the variables the template refers to without defining them '''
+    key = (name, source)
+    if key not in _variables:
+        from jinja2 import meta
+        if len(_variables) >= MAX_CACHED_TEMPLATES:
+            _variables.clear()
+        _variables[key] = frozenset(meta.find_undeclared_variables(environment().parse(source)))
+    return _variables[key]
+
+
+def environment():
+    global _environment
+    if _environment is None:
+        from jinja2 import Environment, FileSystemBytecodeCache
+
+        class BytecodeCache(FileSystemBytecodeCache):
+            """ stores bytecode in the user's cache directory, ignoring failures since it's only an optimization """
+            def __init__(self):
+                FileSystemBytecodeCache.__init__(self, bytecode_cache_directory())
+
+            def load_bytecode(self, bucket):
+                self.directory = bytecode_cache_directory()
+                try:
+                    FileSystemBytecodeCache.load_bytecode(self, bucket)
+                except (IOError, OSError):
+                    pass
+
+            def dump_bytecode(self, bucket):
+                self.directory = bytecode_cache_directory()
+                try:
+                    if not os.path.isdir(self.directory):
+                        os.makedirs(self.directory)
+                    FileSystemBytecodeCache.dump_bytecode(self, bucket)
+                except (IOError, OSError):
+                    pass
+
+        _environment = Environment(bytecode_cache=BytecodeCache())
+        _environment.filters['dirname'] = os.path.dirname
+        _environment.filters['json_escape'] = lambda s: json.dumps(s)[1:][:-1]
+    return _environment
@@ -1,36 +1,53 @@
 import datetime
-import distutils.spawn
 import fnmatch
+import hashlib
 import json
 import logging
 import multiprocessing
 import os
 import re
-import subprocess
 import sys
 
 from collections import OrderedDict
 from contextlib import contextmanager
+from functools import partial
+from multiprocessing.pool import ThreadPool
 
+from . import needs_parser, needs_template, pkgconfig
 from .process import command_output
 from .library import Library
 from .universal_binary import UniversalBinary
-from .platforms import available_platforms, host_platform
+from .platforms import available_platform_identifiers, host_platform, platform_class
 from .generators import available_generators
 from .target import Target
 from .cd import current_directory
+from .dependency_graph import build_order
 from .local_configuration import LocalConfiguration
 from .needy_configuration import NeedyConfiguration
+from .query_index import NameIndex, QueryIndex
 from .memoize import MemoizeMethod
-from .utility import log_section, Fore, Style
+from .jobserver import JobServer
+from .progress import BuildProgress
+from .scheduler import Scheduler, can_isolate_tasks
+from .utility import log_section, DummyContextManager, Fore, Style
+
+
+PLAN_PROBE_CONCURRENCY = 16
+RENDER_FORMAT_VERSION = 1
 
 
 @contextmanager
-def ConfiguredNeedy(scope, parameters=None):
+def ConfiguredNeedy(scope, parameters=None, writable=False):
+    """ yields a Needy instance for the scope with its local configuration held
+
+    Only commands that change the local configuration should make it writable,
+    which excludes all other needy instances for the project. Otherwise it's
+    shared, and builds only exclude each other from the directories they write.
+    """
     needs_directory = Needy.resolve_needs_directory(scope)
     if needs_directory is None:
         raise RuntimeError('No needs file found!')
-    with LocalConfiguration(os.path.join(needs_directory, 'config.json')) as local_configuration:
+    with LocalConfiguration(os.path.join(needs_directory, 'config.json'), writable=writable) as local_configuration:
         yield Needy(scope, parameters, local_configuration=local_configuration, needy_configuration=NeedyConfiguration(scope))
 
 
@@ -48,6 +65,8 @@ class Needy:
             raise RuntimeError('No needs file found in {}'.format(self.__path))
 
         self.__needy_configuration = needy_configuration
+        self.__configuration_hashes = {}
+        self.__render_dependencies = {'defines': {}, 'environment': {}}
 
         logging.debug('Using needs file {}'.format(self.__needs_file))
         logging.debug('Using needs directory {}'.format(self.__needs_directory))
@@ -105,7 +124,7 @@ class Needy:
     def find_needs_file(directory):
         directory = Needy.__normalize_path(directory)
         ret = None
-        for name in ['needs.json', 'needs.yaml']:
+        for name in needs_parser.NEEDS_FILE_NAMES:
             path = os.path.join(directory, name)
             if os.path.isfile(path):
                 if ret:
@@ -134,32 +153,12 @@ class Needy:
 
     @MemoizeMethod
     def needs_configuration(self, target=None):
-        rendered = self.render(target=target)
-
-        name, extension = os.path.splitext(self.needs_file())
-
-        if extension == '.json':
-            return json.loads(rendered, object_pairs_hook=OrderedDict)
-
-        if extension == '.yaml':
-            try:
-                import yaml
-
-                class OrderedLoader(yaml.SafeLoader):
-                    pass
-
-                def construct_mapping(loader, node):
-                    loader.flatten_mapping(node)
-                    return OrderedDict(loader.construct_pairs(node))
-
-                OrderedLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, construct_mapping)
-                return yaml.load(rendered, OrderedLoader)
-            except ImportError:
-                raise RuntimeError('The needs are defined in a YAML file. Please install the pyyaml Python package.')
-
-            return None
+        return self.__parse(self.render(target=target))
 
-        raise RuntimeError('No needs file found.')
+    def __parse(self, rendered):
+        # the parsed needs are only cached once there's a needs directory to keep them in
+        cache_directory = os.path.join(self.needs_directory(), 'parsed-needs') if os.path.isdir(self.needs_directory()) else None
+        return needs_parser.parse(rendered, os.path.splitext(self.needs_file())[1], cache_directory)
 
     def render(self, target=None):
         ''' return rendered needs from needs file '''
@@ -167,44 +166,78 @@ class Needy:
         with open(self.needs_file(), 'r') as needs_file:
             source = needs_file.read()
 
-        return self.__render(source, target=target)
+        return self.__render(source, target=target)[0]
+
+    def render_dependencies(self):
+        ''' returns the defines and environment variables that the renders so far have read, and their values '''
+        return {
+            'defines': dict(self.__render_dependencies['defines']),
+            'environment': dict(self.__render_dependencies['environment']),
+        }
 
     @MemoizeMethod
-    def __render(self, source, target=None):
+    def __render(self, source, target=None, resolve_build_directories=True):
+        """ returns the rendered needs and the defines and environment variables that rendering them read
+
+        Renders are cached in the needs directory along with those
+        dependencies, so they can be reused as long as the values of the few
+        variables the needs actually read are unchanged.
+        """
+        defines = needs_template.parse_defines(getattr(self.__parameters, 'define', None))
+
+        cache_directory = os.path.join(self.needs_directory(), 'rendered-needs') if os.path.isdir(self.needs_directory()) else None
+        key = hashlib.sha1(json.dumps([
+            RENDER_FORMAT_VERSION,
+            source,
+            str(target) if target else None,
+            host_platform().identifier(),
+            self.needs_file(),
+            self.needs_directory(),
+            resolve_build_directories,
+        ]).encode()).hexdigest()
+
+        ret = needs_template.cached_render(cache_directory, key, defines) if cache_directory else None
+        if ret is None:
+            ret = self.__render_template(source, target, resolve_build_directories, defines)
+            if cache_directory:
+                needs_template.cache_render(cache_directory, key, *ret)
+
+        for kind in ['defines', 'environment']:
+            self.__render_dependencies[kind].update(ret[1][kind])
+        return ret
+
+    def __render_template(self, source, target, resolve_build_directories, defines):
+        build_directory_dependencies = []
+
+        def build_directory(library, target_override=None):
+            # the needs can't depend on themselves, so build directories are resolved using the libraries' configurations
+            # as they're rendered without build directories. that render is only done for targets that are referenced
+            if not target or not resolve_build_directories:
+                return None
+            library_target = self.target(target_override) if target_override else target
+            rendered, dependencies = self.__render(source, target=library_target, resolve_build_directories=False)
+            build_directory_dependencies.append(dependencies)
+            configuration = self.__parse(rendered).get('libraries', {}).get(library)
+            return self.__library(library_target, library, configuration).build_directory()
+
         try:
-            from jinja2 import Environment, PackageLoader
-            env = Environment()
-            env.filters['dirname'] = os.path.dirname
-            env.filters['json_escape'] = lambda s: json.dumps(s)[1:][:-1]
-            if hasattr(self.__parameters, 'define') and self.__parameters.define:
-                for defines in self.__parameters.define:
-                    for define in defines:
-                        parts = define.split('=', 1)
-                        value = parts[1] if len(parts) >= 2 else 1
-                        env.globals[parts[0]] = value
-            template = env.from_string(source)
-            if getattr(self, '_needs_configuration_first_pass', None):
-                source = self._needs_configuration_first_pass
-            else:
-                variables = {
-                    'env': os.environ,
-                    'platform': target.platform.identifier() if target else None,
-                    'architecture': target.architecture if target else None,
-                    'host_platform': host_platform().identifier(),
-                    'needs_file': self.needs_file(),
-                    'needs_directory': self.needs_directory(),
-                    'build_directory': lambda library, target_override=None: None
-                }
-                self._needs_configuration_first_pass = template.render(**variables)
-                try:
-                    variables['build_directory'] = lambda library, target_override=None: self.build_directory(library, self.target(target_override) if target_override else target) if target else None
-                    source = template.render(**variables)
-                finally:
-                    self._needs_configuration_first_pass = None
+            rendered, dependencies = needs_template.render(self.needs_file(), source, {
+                'platform': target.platform.identifier() if target else None,
+                'architecture': target.architecture if target else None,
+                'host_platform': host_platform().identifier(),
+                'needs_file': self.needs_file(),
+                'needs_directory': self.needs_directory(),
+                'build_directory': build_directory,
+            }, defines)
         except ImportError:
             if re.compile('{%.*%}').search(source) or re.compile('{{.*}}').search(source) or re.compile('{#.*#}').search(source):
                 raise RuntimeError('The needs file appears to contain Jinja templating. Please install the jinja2 Python package.')
-        return source
+            return source, {'defines': {}, 'environment': {}}
+
+        for nested in build_directory_dependencies:
+            for kind in ['defines', 'environment']:
+                dependencies[kind].update(nested[kind])
+        return rendered, dependencies
 
     def needs_directory(self):
         return self.__needs_directory
@@ -220,10 +253,13 @@ class Needy:
             return self.parameters().concurrency
         return multiprocessing.cpu_count()
 
+    @MemoizeMethod
     def platform(self, identifier):
-        platform = host_platform() if identifier == 'host' else available_platforms().get(identifier, None)
-        if platform is not None:
-            return platform(self.__parameters)
+        # only the requested platform is imported
+        if identifier == 'host':
+            return host_platform()(self.__parameters)
+        if identifier in available_platform_identifiers():
+            return platform_class(identifier)(self.__parameters)
 
         raise ValueError('unknown platform (%s)' % identifier)
 
@@ -240,23 +276,51 @@ class Needy:
         return False
 
     def library(self, target, name):
+        return self.__library(target, name, self.library_configuration(target, name))
+
+    def __library(self, target, name, configuration):
         development_mode = self.__local_configuration and self.__local_configuration.development_mode(name)
         return Library(self, name,
                        target=target,
-                       configuration=self.library_configuration(target, name),
+                       configuration=configuration,
                        development_mode=development_mode,
                        build_caches=self.needy_configuration().build_caches() if self.needy_configuration() else [])
 
     def library_configuration(self, target, name):
         return self.needs_configuration(target)['libraries'][name] if name in self.needs_configuration(target)['libraries'] else None
 
+    def library_configuration_hash(self, target, name):
+        """ returns the configuration hash of the library, or None if it isn't defined
+
+        Hashes are only computed once per target, and dependencies are hashed
+        before their dependents so that deep graphs don't recurse deeply.
+        """
+        hashes = self.__configuration_hashes.setdefault(target, {})
+        expanded = set()
+        stack = [name]
+        while len(stack):
+            current = stack[-1]
+            if current in hashes:
+                stack.pop()
+                continue
+            configuration = self.library_configuration(target, current)
+            if configuration is None:
+                hashes[current] = None
+                continue
+            dependencies = Library.configured_dependencies(configuration)
+            if current not in expanded:
+                expanded.add(current)
+                stack.extend([dependency for dependency in reversed(dependencies) if dependency not in hashes])
+                continue
+            if any(dependency not in hashes for dependency in dependencies):
+                raise ValueError('circular dependency detected involving {}'.format(current))
+            stack.pop()
+            hashes[current] = self.__library(target, current, configuration).configuration_hash()
+        return hashes[name]
+
     @classmethod
     def pkgconfig_package_is_present(cls, name):
-        if not distutils.spawn.find_executable('pkg-config'):
-            return False
-        env = os.environ.copy()
-        env['PKG_CONFIG_LIBDIR'] = ''
-        return subprocess.call(['pkg-config', name, '--exists'], env=env) == 0
+        return pkgconfig.package_is_present(name)
 
     @classmethod
     def library_is_overridden(cls, name):
@@ -264,58 +328,45 @@ class Needy:
 
     def libraries_to_build(self, target, filters=None, include_dependencies=True):
         """ returns a list of (name, library) tuples for libraries that should be built by needy, in the order that they should be built in """
+        configurations = self.needs_configuration(target).get('libraries', {})
+        graph = self.dependency_graph(target, filters, include_dependencies)
+        return [(name, self.__library(target, name, configurations[name])) for name in build_order(graph, configurations)]
+
+    def dependency_graph(self, target, filters=None, include_dependencies=True):
+        """ returns a dict mapping the libraries matching the filters and their dependencies to the dependencies needy has to build for them """
         needs_configuration = self.needs_configuration(target)
 
         if 'libraries' not in needs_configuration:
-            return []
-
-        names = []
-
-        for name, library_configuration in needs_configuration['libraries'].items():
-            if filters and not self.test_filters(name, filters):
-                continue
-            names.append(name)
+            return {}
+
+        configurations = needs_configuration['libraries']
+        overridden = {}
+
+        def dependencies_to_build(name):
+            if not include_dependencies:
+                return []
+            ret = []
+            for dependency in Library.configured_dependencies(configurations[name]):
+                if dependency not in overridden:
+                    overridden[dependency] = self.library_is_overridden(dependency)
+                if overridden[dependency] or dependency in ret:
+                    continue
+                if dependency not in configurations:
+                    raise ValueError('{} depends on {}, which is not defined'.format(name, dependency))
+                ret.append(dependency)
+            return ret
 
         graph = {}
-        libraries = {}
+        names = [name for name in configurations if not filters or self.test_filters(name, filters)]
 
         while len(names):
             name = names.pop()
-            library = self.library(target, name)
-            libraries[name] = library
-            if 'dependencies' not in library.configuration() or not include_dependencies:
-                graph[name] = set()
+            if name in graph:
                 continue
-            dependencies = library.dependencies()
-            dependencies_to_build = [dependency for dependency in dependencies if not self.library_is_overridden(dependency)]
-            graph[name] = set(dependencies_to_build)
-            for dependency in dependencies_to_build:
-                if dependency not in graph:
-                    names.append(dependency)
-
-        s = []
-
-        for name, dependencies in graph.items():
-            if len(dependencies) == 0:
-                s.append(name)
-
-        ret = []
+            graph[name] = dependencies_to_build(name)
+            names.extend([dependency for dependency in graph[name] if dependency not in graph])
 
-        while len(s):
-            name = s.pop()
-            ret.append((name, libraries[name]))
-            for n, deps in graph.items():
-                if name not in deps:
-                    continue
-                deps.remove(name)
-                if len(deps) == 0:
-                    s.append(n)
-
-        for name, deps in graph.items():
-            if len(deps):
-                raise ValueError('circular dependency detected')
-
-        return ret
+        return graph
 
     def universal_binary_configuration(self, universal_binary):
         needs_configuration = self.needs_configuration()
@@ -398,53 +449,235 @@ class Needy:
 
         print('Satisfying {} in {}'.format(target, self.path()))
 
+        scheduler = None
         try:
-            for name, library in self.libraries_to_build(target, filters):
-                if not self.parameters().force_build and library.is_up_to_date():
-                    self.__print_status(Fore.GREEN, 'UP-TO-DATE', name)
-                else:
-                    with log_section('needy.satisfy.{}'.format(name)):
-                        self.__print_status(Fore.CYAN, 'OUT-OF-DATE', name)
-                        start_time = datetime.datetime.now()
-                        library.build()
-                    self.__print_status(Fore.GREEN, 'SUCCESS', '{} in {}'.format(name, datetime.datetime.now() - start_time))
+            with self.__jobserver() as jobserver:
+                scheduler = self.__scheduler(jobserver)
+                self.__schedule_libraries(scheduler, self.libraries_to_build(target, filters))
+                scheduler.run()
+            self.__update_indexes(target)
         except Exception as e:
-            self.__print_status(Fore.RED, 'ERROR')
+            self.__print_status(Fore.RED, 'ERROR', scheduler.failed_task() if scheduler else None)
             print(e)
             raise
 
     def satisfy_universal_binary(self, universal_binary, filters=None):
+        scheduler = None
         try:
             print('Satisfying universal binary {} in {}'.format(universal_binary, self.path()))
-            configuration = self.universal_binary_configuration(universal_binary)
-
-            libraries = dict()
-
-            for platform, architectures in configuration.items():
-                for architecture in architectures:
-                    target = Target(self.platform(platform), architecture)
-                    self.satisfy_target(target, filters)
-                    for name, library in self.libraries_to_build(target, filters):
+            targets = self.__universal_binary_targets(universal_binary)
+
+            # the targets build concurrently, so each needs its own working copy unless it's in development mode
+            separate_working_copies = self.__builds_in_parallel() and len(targets) > 1
+
+            libraries = OrderedDict()
+
+            with self.__jobserver() as jobserver:
+                scheduler = self.__scheduler(jobserver)
+
+                for target in targets:
+                    if 'libraries' in self.needs_configuration(target):
+                        print('Satisfying {} in {}'.format(target, self.path()))
+                    slices = self.libraries_to_build(target, filters)
+                    if separate_working_copies:
+                        slices = [(name, library if library.is_in_development_mode() else library.with_target_working_copy()) for name, library in slices]
+                    # development mode working copies are shared, so those targets have to take turns
+                    previous_slices = {name: [self.__task_name(libraries[name][-1].target(), name)] for name, library in slices if library.is_in_development_mode() and name in libraries}
+                    self.__schedule_libraries(scheduler, slices, target, previous_slices)
+                    for name, library in slices:
                         if name not in libraries:
                             libraries[name] = list()
                         libraries[name].append(library)
 
+                for name, libs in libraries.items():
+                    if filters and not self.test_filters(name, filters):
+                        continue
+                    binary = UniversalBinary(universal_binary, libs, self)
+                    task_name = self.__task_name(universal_binary, name)
+                    scheduler.add(task_name, partial(self.__satisfy, task_name, binary), [self.__task_name(library.target(), name) for library in libs])
+
+                scheduler.run()
+            self.__update_indexes(universal_binary)
+        except Exception as e:
+            self.__print_status(Fore.RED, 'ERROR', scheduler.failed_task() if scheduler else None)
+            print(e)
+            raise
+
+    def __update_indexes(self, target_or_universal_binary):
+        self.update_query_index(target_or_universal_binary)
+        self.update_name_index(target_or_universal_binary)
+
+    def update_name_index(self, target_or_universal_binary):
+        ''' records the names of the libraries for the target or universal binary for shell completion '''
+        if getattr(self.parameters(), 'define', None):
+            # the index is used for completion without defines
+            return
+        index = NameIndex.open(self.needs_file(), self.needs_directory())
+        index.set_universal_binary_names(self.universal_binary_names())
+        names = list(self.libraries(target_or_universal_binary).keys())
+        if isinstance(target_or_universal_binary, Target):
+            index.set_library_names(str(target_or_universal_binary), names)
+            alias = getattr(self.parameters(), 'target', None)
+            if alias and alias != str(target_or_universal_binary) and self.target(alias) == target_or_universal_binary:
+                index.set_library_names(alias, names)
+        else:
+            index.set_library_names(target_or_universal_binary, names)
+        index.save()
+
+    def update_query_index(self, target_or_universal_binary):
+        ''' records the libraries' paths for the target or universal binary so that they can be queried without rendering the needs file '''
+        index = QueryIndex.open(self.needs_file(), self.needs_directory(), getattr(self.parameters(), 'define', None))
+        if isinstance(target_or_universal_binary, Target):
+            self.__add_target_to_query_index(index, target_or_universal_binary)
+        else:
+            targets = self.__universal_binary_targets(target_or_universal_binary)
+            for target in targets:
+                self.__add_target_to_query_index(index, target)
+            build_directories = OrderedDict((name, self.build_directory(name, target_or_universal_binary)) for name in self.libraries(target_or_universal_binary).keys())
+            index.add_universal_binary(target_or_universal_binary, [str(target) for target in targets], build_directories)
+        # everything the index's contents were rendered from has been rendered by now
+        index.add_dependencies(self.render_dependencies())
+        index.save()
+
+    def __add_target_to_query_index(self, index, target):
+        configurations = self.needs_configuration(target).get('libraries', {})
+        graph = self.dependency_graph(target)
+        alias = getattr(self.parameters(), 'target', None)
+        index.add_target(str(target),
+                         [(name, graph[name], self.__library(target, name, configuration).build_directory()) for name, configuration in configurations.items()],
+                         alias if alias and self.target(alias) == target else None)
+
+    def plan(self, target_or_universal_binary, filters=None):
+        ''' returns a json-serializable description of what satisfying the target or universal binary would do without changing anything
+
+        Each library is either up-to-date, restorable from a build cache, or needs building. The critical path is the chain
+        of dependent builds that's estimated to take the longest, based on how long each library's previous build took.
+        '''
+        nodes = OrderedDict()
+
+        if isinstance(target_or_universal_binary, Target):
+            targets, universal_binary = [target_or_universal_binary], None
+        else:
+            targets, universal_binary = self.__universal_binary_targets(target_or_universal_binary), target_or_universal_binary
+
+        libraries = OrderedDict()
+        for target in targets:
+            slices = self.libraries_to_build(target, filters)
+            names = set([name for name, library in slices])
+            for name, library in slices:
+                task_name = self.__task_name(target if universal_binary else None, name)
+                dependencies = [self.__task_name(target if universal_binary else None, dependency) for dependency in library.dependencies() if dependency in names]
+                nodes[task_name] = (name, library, dependencies)
+                libraries.setdefault(name, []).append(library)
+
+        if universal_binary:
             for name, libs in libraries.items():
                 if filters and not self.test_filters(name, filters):
                     continue
-                binary = UniversalBinary(universal_binary, libs, self)
-                if not self.parameters().force_build and binary.is_up_to_date():
-                    self.__print_status(Fore.GREEN, 'UP-TO-DATE', name)
+                nodes[self.__task_name(universal_binary, name)] = (name, UniversalBinary(universal_binary, libs, self), [self.__task_name(library.target(), name) for library in libs])
+
+        # the probes are mostly file system and network round trips, so they're worth overlapping even with -j1
+        pool = ThreadPool(max(1, min(len(nodes), PLAN_PROBE_CONCURRENCY)))
+        try:
+            statuses = pool.map(self.__plan_status, [library_or_binary for _, library_or_binary, _ in nodes.values()])
+        finally:
+            pool.close()
+            pool.join()
+
+        known_durations = [library.build_duration() for _, library, _ in nodes.values() if isinstance(library, Library)]
+        known_durations = [duration for duration in known_durations if duration is not None]
+        default_duration = sum(known_durations) / len(known_durations) if known_durations else 1.0
+
+        ret = OrderedDict()
+        ret['target' if universal_binary is None else 'universal-binary'] = str(target_or_universal_binary)
+        ret['libraries'] = OrderedDict()
+        path_durations = {}
+        path_predecessors = {}
+        for (task_name, (name, library_or_binary, dependencies)), status in zip(nodes.items(), statuses):
+            entry = OrderedDict()
+            entry['name'] = name
+            if isinstance(library_or_binary, Library):
+                entry['target'] = str(library_or_binary.target())
+                duration = library_or_binary.build_duration()
+            else:
+                entry['universal-binary'] = universal_binary
+                duration = 0.0
+            entry['status'] = status
+            entry['dependencies'] = dependencies
+            entry['estimated-duration'] = (default_duration if duration is None else duration) if status == 'needs-building' else 0.0
+            ret['libraries'][task_name] = entry
+
+            # nodes are in dependency order, so the longest path to each dependency is already known
+            predecessor = max(dependencies, key=lambda dependency: path_durations[dependency]) if dependencies else None
+            path_durations[task_name] = entry['estimated-duration'] + (path_durations[predecessor] if predecessor else 0.0)
+            path_predecessors[task_name] = predecessor
+
+        critical_path = []
+        if path_durations:
+            task_name = max(path_durations, key=lambda name: path_durations[name])
+            ret['estimated-duration'] = path_durations[task_name]
+            while task_name:
+                if ret['libraries'][task_name]['status'] != 'up-to-date':
+                    critical_path.insert(0, task_name)
+                task_name = path_predecessors[task_name]
+        else:
+            ret['estimated-duration'] = 0.0
+        ret['critical-path'] = critical_path
+
+        return ret
+
+    def __plan_status(self, library_or_binary):
+        if not self.parameters().force_build:
+            if library_or_binary.is_up_to_date():
+                return 'up-to-date'
+            if isinstance(library_or_binary, Library) and library_or_binary.is_restorable_from_cache():
+                return 'restorable'
+        return 'needs-building'
+
+    def __universal_binary_targets(self, universal_binary):
+        configuration = self.universal_binary_configuration(universal_binary)
+        return [Target(self.platform(platform), architecture) for platform, architectures in configuration.items() for architecture in architectures]
+
+    def __builds_in_parallel(self):
+        return self.build_concurrency() > 1 and can_isolate_tasks()
+
+    def __jobserver(self):
+        return JobServer(self.build_concurrency()) if self.__builds_in_parallel() else DummyContextManager()
+
+    def __scheduler(self, jobserver=None):
+        progress = BuildProgress() if BuildProgress.is_supported() else None
+        return Scheduler(self.build_concurrency(), parallel=self.__builds_in_parallel(), jobserver=jobserver, progress=progress)
+
+    @staticmethod
+    def __task_name(target_or_universal_binary, name):
+        return '{}/{}'.format(target_or_universal_binary, name) if target_or_universal_binary else name
+
+    def __schedule_libraries(self, scheduler, libraries, target=None, additional_dependencies={}):
+        ''' adds a task for each (name, library) tuple. the tasks are qualified with the target if one is given '''
+        names = set([name for name, library in libraries])
+        for name, library in libraries:
+            task_name = self.__task_name(target, name)
+            dependencies = [self.__task_name(target, dependency) for dependency in library.dependencies() if dependency in names]
+            scheduler.add(task_name, partial(self.__satisfy, task_name, library), dependencies + additional_dependencies.get(name, []), log_path=library.log_path())
+
+    def __satisfy(self, name, library_or_binary, build_concurrency):
+        if not self.parameters().force_build and library_or_binary.is_up_to_date():
+            self.__print_status(Fore.GREEN, 'UP-TO-DATE', name)
+            return
+        with library_or_binary.locked():
+            # another needy instance may have built it while this one waited
+            if not self.parameters().force_build and library_or_binary.is_up_to_date():
+                self.__print_status(Fore.GREEN, 'UP-TO-DATE', name)
+                return
+            with log_section('needy.satisfy.{}'.format(name)):
+                self.__print_status(Fore.CYAN, 'OUT-OF-DATE', name)
+                start_time = datetime.datetime.now()
+                if isinstance(library_or_binary, UniversalBinary):
+                    library_or_binary.build()
                 else:
-                    with log_section('needy.satisfy.{}'.format(name)):
-                        self.__print_status(Fore.CYAN, 'OUT-OF-DATE', name)
-                        start_time = datetime.datetime.now()
-                        binary.build()
-                    self.__print_status(Fore.GREEN, 'SUCCESS', '{} in {}'.format(name, datetime.datetime.now() - start_time))
-        except Exception as e:
-            self.__print_status(Fore.RED, 'ERROR')
-            print(e)
-            raise
+                    # concurrent builds' output would interleave, so it's only kept in their logs
+                    library_or_binary.build(build_concurrency, echo_output=not self.__builds_in_parallel())
+        self.__print_status(Fore.GREEN, 'SUCCESS', '{} in {}'.format(name, datetime.datetime.now() - start_time))
 
     def initialize(self, target, filters=None):
         needs_configuration = self.needs_configuration(target)
@@ -455,7 +688,10 @@ class Needy:
         for name, libraries in self.libraries(target, filters, include_dependencies=False).items():
             assert len(libraries) == 1
             logging.info('Initializing {}...'.format(name))
-            libraries[0].initialize_source()
+            with libraries[0].locked():
+                libraries[0].initialize_source()
+
+        self.update_name_index(target)
 
     def clean(self, target, filters=None, only_build_directory=False, force=False):
         libs = list(self.libraries(target, filters, include_dependencies=False).items())
@@ -468,10 +704,10 @@ class Needy:
                     logging.info('{} is in development mode; cannot clean without force'.format(name))
                     continue
             logging.info('Cleaning {}...'.format(name))
-            libraries[0].clean_build()
-            if only_build_directory:
-                continue
-            libraries[0].clean_source()
+            with libraries[0].locked():
+                libraries[0].clean_build()
+                if not only_build_directory:
+                    libraries[0].clean_source()
 
     def synchronize(self, target, filters=None):
         if 'libraries' not in self.needs_configuration(target):
@@ -493,7 +729,8 @@ class Needy:
         for name, libraries in libraries_to_sync:
             assert len(libraries) == 1
             logging.info('Synchronizing {}...'.format(name))
-            libraries[0].synchronize_source()
+            with libraries[0].locked():
+                libraries[0].synchronize_source()
 
     @staticmethod
     def __normalize_path(path):
@@ -1,41 +1,26 @@
+import copy
 import os
 import json
-import logging
-import time
 
+from .caches.content_addressed import ContentAddressedCache
 from .caches.directory import DirectoryCache
 from .caches.s3 import S3Cache
-from .filesystem import os_file, lock_fd
+from .filesystem import lock_fd
 from .memoize import MemoizeMethod
 
-from contextlib import contextmanager
+LOCK_TIMEOUT = 10
+
+# the parsed .needyconfig files, along with the signatures of the files they were parsed from
+_parsed_needyconfigs = {}
 
 
 class NeedyConfiguration:
     def __init__(self, base_path):
         self.__base_path = os.path.abspath(base_path) if base_path else None
-
-        with self.__locked_needyconfig(self.__base_path) as fds:
-            self.__configuration = self._evaluate_needyconfigs(fds)
-
-    @staticmethod
-    @contextmanager
-    def __locked_needyconfig(base_path):
-        candidates = NeedyConfiguration.__get_candidate_paths(base_path)
-
-        if not candidates:
-            yield []
-            return
-
-        lock_path, fd = NeedyConfiguration.__lock_config()
-
-        yield [c for c in candidates if os.path.exists(c)]
-
-        os.close(fd)
-        os.remove(lock_path)
+        self.__configuration = self._evaluate_needyconfigs([c for c in self.candidate_paths(self.__base_path) if os.path.exists(c)])
 
     @staticmethod
-    def __get_candidate_paths(base_path):
+    def candidate_paths(base_path):
         ''' return possible needyconfig paths from base_path to root '''
         candidates = []
         path = base_path
@@ -47,25 +32,6 @@ class NeedyConfiguration:
             path = os.path.dirname(path)
         return candidates
 
-    @staticmethod
-    def __lock_config():
-        lock_path = os.path.join(os.path.expanduser('~'), '.needyconfig.lock')
-        fd = None
-        start = time.time()
-        while time.time() < start + 10:
-            try:
-                fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
-                break
-            except OSError:
-                try:
-                    time.sleep(0.1)
-                    continue
-                except:
-                    break
-        if not fd:
-            raise RuntimeError('Unable to lock {}, if there are no other needy instances running, delete this manually and try again'.format(lock_path))
-        return lock_path, fd
-
     @staticmethod
     def _recursive_merge(a, b):
         ''' lists in b appending to lists in a and keys in b adding to keys in a '''
@@ -87,17 +53,45 @@ class NeedyConfiguration:
     def _evaluate_needyconfigs(paths):
         config = dict()
         for p in paths:
-            with open(p, 'r') as f:
-                content = f.read()
-                parent_config = json.loads(content) if content else dict()
-                for k in parent_config:
-                    if k in config:
-                        NeedyConfiguration._recursive_merge(config[k], parent_config[k])
-                    else:
-                        config[k] = parent_config[k]
+            parent_config = NeedyConfiguration._read_needyconfig(p)
+            for k in parent_config:
+                if k in config:
+                    NeedyConfiguration._recursive_merge(config[k], parent_config[k])
+                else:
+                    config[k] = parent_config[k]
 
         return config
 
+    @staticmethod
+    def _read_needyconfig(path):
+        """ returns the parsed contents of the .needyconfig, or an empty dict if it doesn't exist
+
+        The file is read under a shared lock, so any number of needy instances
+        can read it at once while a writer holding an exclusive lock is never
+        observed half way through. The parsed contents are reused for as long
+        as the file is unchanged, and a copy is returned since merging modifies it.
+        """
+        try:
+            signature = NeedyConfiguration.__signature(os.stat(path))
+        except OSError:
+            return dict()
+
+        cached = _parsed_needyconfigs.get(path)
+        if cached is None or cached[0] != signature:
+            with open(path, 'r') as f:
+                if not lock_fd(f.fileno(), timeout=LOCK_TIMEOUT, shared=True):
+                    raise RuntimeError('Unable to lock {} for reading.'.format(path))
+                content = f.read()
+                signature = NeedyConfiguration.__signature(os.fstat(f.fileno()))
+            cached = (signature, json.loads(content) if content else dict())
+            _parsed_needyconfigs[path] = cached
+
+        return copy.deepcopy(cached[1])
+
+    @staticmethod
+    def __signature(status):
+        return (status.st_mtime, status.st_size, status.st_ino)
+
     @MemoizeMethod
     def build_caches(self):
         build_caches = []
@@ -110,7 +104,9 @@ class NeedyConfiguration:
         for c in build_caches:
             config = c if isinstance(c, dict) else {'path': c}
             if config['path'].lower().startswith('s3://'):
-                ret.append(S3Cache.from_dict(config))
+                cache = S3Cache.from_dict(config)
             else:
-                ret.append(DirectoryCache.from_dict(config))
+                cache = DirectoryCache.from_dict(config)
+            # content-addressed caches store files individually so that identical files are only stored once
+            ret.append(ContentAddressedCache(cache) if config.get('content-addressed') else cache)
         return ret
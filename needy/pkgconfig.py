@@ -0,0 +1,76 @@
+import os
+
+from .filesystem import add_to_json_cache, read_json_file, user_cache_directory
+
+_packages = {}
+
+MAX_CACHED_PATHS = 32
+
+
+def packages(pkg_config_path=None):
+    """ returns the names of the packages pkg-config finds in PKG_CONFIG_PATH, ignoring its default search path
+
+    Results are memoized for the process and cached on disk. The disk cache is
+    keyed by the modification times of the PKG_CONFIG_PATH directories, which
+    change whenever a package is added or removed, so repeated invocations
+    don't need to run pkg-config at all.
+    """
+    if pkg_config_path is None:
+        pkg_config_path = os.environ.get('PKG_CONFIG_PATH', '')
+    if pkg_config_path not in _packages:
+        _packages[pkg_config_path] = frozenset(__cached_packages(pkg_config_path))
+    return _packages[pkg_config_path]
+
+
+def package_is_present(name):
+    return name in packages()
+
+
+def path_fingerprint(pkg_config_path):
+    """ returns a value that changes whenever a package is added to or removed from the PKG_CONFIG_PATH directories
+
+    This is cheap enough for clients that want to avoid rendering the needs.
+    """
+    ret = []
+    for directory in pkg_config_path.split(os.pathsep):
+        if not directory:
+            continue
+        try:
+            ret.append([directory, os.stat(directory).st_mtime])
+        except OSError:
+            ret.append([directory, None])
+    return ret
+
+
+def cache_path():
+    return os.path.join(user_cache_directory(), 'pkg-config.json')
+
+
+def __cached_packages(pkg_config_path):
+    # these are imported here so that clients that only need the fingerprint don't pay for them
+    import subprocess
+    from .process import find_executable
+
+    executable = find_executable('pkg-config')
+    directory_fingerprint = path_fingerprint(pkg_config_path)
+    if not executable or not directory_fingerprint:
+        return []
+
+    fingerprint = [executable] + directory_fingerprint
+
+    entry = read_json_file(cache_path(), {}).get(pkg_config_path)
+    if entry and entry.get('fingerprint') == fingerprint:
+        return entry['packages']
+
+    env = os.environ.copy()
+    env['PKG_CONFIG_LIBDIR'] = ''
+    env['PKG_CONFIG_PATH'] = pkg_config_path
+    try:
+        with open(os.devnull, 'w') as devnull:
+            output = subprocess.check_output([executable, '--list-all'], env=env, stderr=devnull).decode()
+    except (subprocess.CalledProcessError, OSError):
+        return []
+    ret = sorted(set([line.split()[0] for line in output.splitlines() if line.strip()]))
+
+    add_to_json_cache(cache_path(), pkg_config_path, {'fingerprint': fingerprint, 'packages': ret}, MAX_CACHED_PATHS)
+    return ret
@@ -1,37 +1,46 @@
+import importlib
 import sys
 
-from .generic import GenericPlatform
-from .android import AndroidPlatform
-from .osx import OSXPlatform
-from .ios import iOSPlatform, iOSSimulatorPlatform
-from .tvos import tvOSPlatform, tvOSSimulatorPlatform
-from .windows import WindowsPlatform
+# platforms are only imported when they're used since most of them are unavailable on any given host
+PLATFORMS = {
+    'generic': ('.generic', 'GenericPlatform'),
+    'android': ('.android', 'AndroidPlatform'),
+    'osx': ('.osx', 'OSXPlatform'),
+    'ios': ('.ios', 'iOSPlatform'),
+    'iossimulator': ('.ios', 'iOSSimulatorPlatform'),
+    'tvos': ('.tvos', 'tvOSPlatform'),
+    'tvossimulator': ('.tvos', 'tvOSSimulatorPlatform'),
+    'windows': ('.windows', 'WindowsPlatform'),
+}
 
 
-def available_platforms():
-    platforms = [GenericPlatform, AndroidPlatform]
+def platform_class(identifier):
+    module, name = PLATFORMS[identifier]
+    return getattr(importlib.import_module(module, package=__name__), name)
+
+
+def available_platform_identifiers():
+    identifiers = ['generic', 'android']
 
     if sys.platform == 'darwin':
-        platforms.extend([
-            OSXPlatform,
-            iOSPlatform,
-            iOSSimulatorPlatform,
-            tvOSPlatform,
-            tvOSSimulatorPlatform,
-        ])
+        identifiers.extend(['osx', 'ios', 'iossimulator', 'tvos', 'tvossimulator'])
     elif sys.platform == 'win32':
-        platforms.append(WindowsPlatform)
+        identifiers.append('windows')
 
+    return identifiers
+
+
+def available_platforms():
     ret = {}
-    for platform in platforms:
-        ret[platform.identifier()] = platform
+    for identifier in available_platform_identifiers():
+        ret[identifier] = platform_class(identifier)
     return ret
 
 
 def host_platform():
     if sys.platform == 'darwin':
-        return OSXPlatform
+        return platform_class('osx')
     elif sys.platform == 'win32':
-        return WindowsPlatform
+        return platform_class('windows')
 
-    return GenericPlatform
+    return platform_class('generic')
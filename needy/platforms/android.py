@@ -5,6 +5,8 @@ import logging
 
 from ..platform import Platform
 from ..memoize import MemoizeMethod
+from ..probe_cache import cached_probe, file_signature
+from ..process import find_executable
 
 
 class AndroidPlatform(Platform):
@@ -38,11 +40,9 @@ class AndroidPlatform(Platform):
         if 'ANDROID_TOOLCHAIN' in os.environ:
             return os.environ['ANDROID_TOOLCHAIN']
 
-        try:
-            which = subprocess.check_output(['which', '{}-c++'.format(self.binary_prefix(architecture))])
+        which = find_executable('{}-c++'.format(self.binary_prefix(architecture)))
+        if which:
             return os.path.dirname(os.path.dirname(which))
-        except subprocess.CalledProcessError:
-            pass
 
         toolchain = None
         if 'arm' in architecture:
@@ -101,10 +101,10 @@ class AndroidPlatform(Platform):
 
         return ret
 
-    def c_compiler(self, architecture):
+    def c_compiler(self, architecture, environment=None):
         return self.__compiler(architecture, ['clang'])
 
-    def cxx_compiler(self, architecture):
+    def cxx_compiler(self, architecture, environment=None):
         return self.__compiler(architecture, ['clang++'])
 
     def __compiler(self, architecture, choices):
@@ -185,10 +185,18 @@ class AndroidPlatform(Platform):
         # be sure to use a full path because otherwise the shell script fails
         # AND it appears that invocations from Popen in the portable manner seem
         # to hang as if waiting on stdin despite closing the fd via communicate.
-        try:
-            env = os.environ.copy()
-            env['PATH'] = '{}:{}'.format(':'.join(binary_paths), env['PATH'])
-            cmd = 'printf \'{}\' | {} -x c++ -P -E -'.format(program, ' '.join([pipes.quote(c) for c in compiler]))
-            return subprocess.check_output(cmd, env=env, shell=True).decode().strip().split('\n')
-        except subprocess.CalledProcessError:
-            pass
+        env = os.environ.copy()
+        env['PATH'] = '{}:{}'.format(':'.join(binary_paths), env['PATH'])
+
+        def probe():
+            try:
+                cmd = 'printf \'{}\' | {} -x c++ -P -E -'.format(program, ' '.join([pipes.quote(c) for c in compiler]))
+                return subprocess.check_output(cmd, env=env, shell=True).decode().strip().split('\n')
+            except subprocess.CalledProcessError:
+                pass
+
+        # the output is cached across invocations for as long as the compiler is unchanged
+        executable = find_executable(compiler[0], path=env['PATH'])
+        if executable is None:
+            return probe()
+        return cached_probe(['android-preprocessing-output', program, compiler, file_signature(executable)], probe)
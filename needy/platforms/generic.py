@@ -1,6 +1,6 @@
 from ..platform import Platform
+from ..process import find_executable
 
-from distutils import spawn
 import platform
 import os
 
@@ -17,21 +17,23 @@ class GenericPlatform(Platform):
     def default_architecture(self):
         return platform.machine().lower()
 
-    def c_compiler(self, architecture):
+    def c_compiler(self, architecture, environment=None):
         command = 'gcc'
-        if 'CC' in os.environ:
-            command = os.environ['CC']
-        elif spawn.find_executable('clang'):
+        environment = os.environ if environment is None else environment
+        if 'CC' in environment:
+            command = environment['CC']
+        elif find_executable('clang'):
             command = 'clang'
         if platform.system() == 'Darwin':
             return [command, '-arch', architecture]
         return [command, '-m{}'.format('32' if architecture == 'i386' else '64')]
 
-    def cxx_compiler(self, architecture):
+    def cxx_compiler(self, architecture, environment=None):
         command = 'g++'
-        if 'CXX' in os.environ:
-            command = os.environ['CXX']
-        elif spawn.find_executable('clang++'):
+        environment = os.environ if environment is None else environment
+        if 'CXX' in environment:
+            command = environment['CXX']
+        elif find_executable('clang++'):
             command = 'clang++'
         if platform.system() == 'Darwin':
             return [command, '-arch', architecture]
@@ -0,0 +1,41 @@
+import json
+import os
+
+from .filesystem import add_to_json_cache, read_json_file, user_cache_directory
+
+MAX_CACHED_PROBES = 256
+
+
+def cache_path():
+    return os.path.join(user_cache_directory(), 'probes.json')
+
+
+def file_signature(path):
+    ''' returns a value that changes whenever the file is modified or replaced, or None if it doesn't exist '''
+    try:
+        status = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.realpath(path), status.st_size, status.st_mtime, status.st_ino]
+
+
+def cached_probe(key, probe):
+    """ returns the result of probe(), which is cached on disk under the given key
+
+    The key must be serializable as JSON and identify everything the result
+    depends on, such as the signature of the executable the probe runs. The
+    result must be serializable as JSON too. Probes that return None aren't
+    cached so that they're retried by the next invocation.
+    """
+    key = json.dumps(key, sort_keys=True)
+
+    ret = read_json_file(cache_path(), {}).get(key)
+    if ret is not None:
+        return ret
+
+    ret = probe()
+    if ret is None:
+        return ret
+
+    add_to_json_cache(cache_path(), key, ret, MAX_CACHED_PROBES)
+    return ret
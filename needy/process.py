@@ -5,55 +5,107 @@ import sys
 
 from .cd import current_directory
 from .filesystem import TempDir
+from .jobserver import active_jobserver
 from .utility import Style
 
+try:
+    from shutil import which as find_executable
+except ImportError:
+    # distutils is slow to import, so it's only used where shutil.which isn't available
+    from distutils.spawn import find_executable
 
-def __log_check_output(cmd, verbosity, **kwargs):
+
+def __log_check_output(cmd, verbosity, log=None, **kwargs):
     shell = not isinstance(cmd, list)
     with open(os.devnull, 'w') as devnull:
-        logging.log(verbosity, __format_command(cmd))
-        return subprocess.check_output(cmd, stderr=devnull, shell=shell, **kwargs).decode()
+        __log_command(cmd, verbosity, log)
+        return subprocess.check_output(cmd, stderr=devnull, shell=shell, **__jobserver_arguments(kwargs)).decode()
 
 
-def __log_check_call(cmd, verbosity, **kwargs):
-    shell = not isinstance(cmd, list)
+def __log_check_call(cmd, verbosity, log=None, **kwargs):
+    __log_command(cmd, verbosity, log)
+    __check_call(cmd, verbosity, log, shell=not isinstance(cmd, list), **kwargs)
+
+
+def __check_call(cmd, verbosity, log=None, **kwargs):
+    ''' runs the command, sending its output to the log if one is given '''
+    if log is not None:
+        __stream_check_call(cmd, verbosity, log, **kwargs)
+        return
     with open(os.devnull, 'w') as devnull:
-        logging.log(verbosity, __format_command(cmd))
         if verbosity < logging.getLogger().getEffectiveLevel():
-            subprocess.check_call(cmd, stderr=devnull, shell=shell, stdout=devnull, **kwargs)
+            subprocess.check_call(cmd, stderr=devnull, stdout=devnull, **__jobserver_arguments(kwargs))
         else:
-            subprocess.check_call(cmd, stderr=subprocess.STDOUT, shell=shell, **kwargs)
+            subprocess.check_call(cmd, stderr=subprocess.STDOUT, **__jobserver_arguments(kwargs))
 
 
-def command(cmd, verbosity=logging.INFO, environment_overrides={}):
-    __log_check_call(cmd, verbosity, env=__environment(environment_overrides))
+def __stream_check_call(cmd, verbosity, log, **kwargs):
+    ''' runs the command, writing its output to the log as it arrives '''
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **__jobserver_arguments(kwargs))
+    try:
+        while True:
+            data = os.read(process.stdout.fileno(), 65536)
+            if not data:
+                break
+            log.write(data, verbosity)
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
 
 
-def command_output(cmd, verbosity=logging.INFO, environment_overrides={}):
-    logging.log(verbosity, __format_command(cmd))
-    return __log_check_output(cmd, verbosity, env=__environment(environment_overrides))
+def command(cmd, verbosity=logging.INFO, environment_overrides={}, context=None):
+    ''' runs the command in the context's directory and environment, or the process's if no context is given '''
+    __log_check_call(cmd, verbosity, __log(context), env=__environment(environment_overrides, context), cwd=__directory(context))
 
 
-def command_sequence(cmds, verbosity=logging.INFO, environment_overrides={}):
-    with open(os.devnull, 'w') as devnull:
-        stderr = devnull if verbosity < logging.getLogger().getEffectiveLevel() else subprocess.STDOUT
-        stdout = devnull if verbosity < logging.getLogger().getEffectiveLevel() else None
-        if sys.platform == 'win32':
-            with TempDir() as d:
-                path = os.path.join(d, 'script.cmd')
-                with open(path, 'wb') as f:
-                    f.write('\r\n'.join(cmds).encode())
-                subprocess.check_call(['cmd', '/c', 'call', path], stderr=stderr, stdout=stdout, env=__environment(environment_overrides))
-        else:
-            subprocess.check_call(['sh', '-c', '\n'.join(['set -ex'] + cmds)], stderr=stderr, stdout=stdout, env=__environment(environment_overrides))
+def command_output(cmd, verbosity=logging.INFO, environment_overrides={}, context=None):
+    return __log_check_output(cmd, verbosity, __log(context), env=__environment(environment_overrides, context), cwd=__directory(context))
+
+
+def command_sequence(cmds, verbosity=logging.INFO, environment_overrides={}, context=None):
+    kwargs = {'env': __environment(environment_overrides, context), 'cwd': __directory(context)}
+    if sys.platform == 'win32':
+        with TempDir() as d:
+            path = os.path.join(d, 'script.cmd')
+            with open(path, 'wb') as f:
+                f.write('\r\n'.join(cmds).encode())
+            __check_call(['cmd', '/c', 'call', path], verbosity, __log(context), **kwargs)
+    else:
+        __check_call(['sh', '-c', '\n'.join(['set -ex'] + cmds)], verbosity, __log(context), **kwargs)
 
 
-def __environment(environment_overrides):
-    environment_overrides['PWD'] = current_directory()
-    env = os.environ.copy()
+def __environment(environment_overrides, context=None):
+    env = dict(context.environment() if context else os.environ)
+    if active_jobserver():
+        env.update(active_jobserver().environment_overrides(env))
     env.update(environment_overrides)
+    env['PWD'] = __directory(context) or current_directory()
     return {key: str(value) for key, value in env.items()}
 
 
+def __directory(context):
+    return context.directory() if context else None
+
+
+def __log(context):
+    return context.log() if context else None
+
+
+def __log_command(cmd, verbosity, log=None):
+    if log is not None:
+        log.write_command(cmd, verbosity)
+    else:
+        logging.log(verbosity, __format_command(cmd))
+
+
+def __jobserver_arguments(kwargs):
+    ''' makes sure the jobserver's pipe is inherited by the child process '''
+    if active_jobserver() and sys.version_info >= (3, 2):
+        kwargs = dict(kwargs, pass_fds=active_jobserver().fds())
+    return kwargs
+
+
 def __format_command(cmd):
     return Style.BRIGHT + '{}'.format(cmd) + Style.RESET_ALL
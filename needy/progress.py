@@ -0,0 +1,74 @@
+import shutil
+import sys
+
+from collections import OrderedDict
+
+from .build_log import BuildLog
+
+REFRESH_INTERVAL = 0.25
+
+
+class BuildProgress:
+    """ Shows the last line of each running build's log beneath everything else written to the terminal.
+
+    The progress lines are erased and redrawn whenever something else is
+    written, so everything written while builds run has to go through write.
+    """
+
+    def __init__(self, stream=None):
+        self.__stream = stream or sys.stdout
+        self.__logs = {}
+        self.__running = OrderedDict()
+        self.__drawn_lines = 0
+
+    @staticmethod
+    def is_supported(stream=None):
+        ''' returns True if the stream is a terminal that the progress can be drawn on '''
+        stream = stream or sys.stdout
+        return sys.platform != 'win32' and hasattr(stream, 'isatty') and stream.isatty()
+
+    def watch(self, name, log_path):
+        ''' shows the last line of the log at the path while the named task runs '''
+        self.__logs[name] = log_path
+
+    def start(self, name):
+        self.__running[name] = None
+        self.refresh()
+
+    def finish(self, name):
+        self.__running.pop(name, None)
+        self.refresh()
+
+    def write(self, text):
+        self.__clear()
+        self.__stream.write(text)
+        self.__draw()
+
+    def refresh(self):
+        self.__clear()
+        self.__draw()
+
+    def close(self):
+        self.__clear()
+        self.__stream.flush()
+
+    def __clear(self):
+        if self.__drawn_lines:
+            # moves to the first progress line and clears everything below it
+            self.__stream.write('\x1b[{}A\r\x1b[J'.format(self.__drawn_lines))
+            self.__drawn_lines = 0
+
+    def __draw(self):
+        width = BuildProgress.__terminal_width()
+        for name in self.__running:
+            last_line = BuildLog.last_line(self.__logs[name]) if name in self.__logs else None
+            line = '[{}] {}'.format(name, last_line or '...')
+            self.__stream.write(line[:width - 1] + '\n')
+            self.__drawn_lines += 1
+        self.__stream.flush()
+
+    @staticmethod
+    def __terminal_width():
+        if hasattr(shutil, 'get_terminal_size'):
+            return shutil.get_terminal_size().columns
+        return 80
@@ -7,6 +7,7 @@ try:
 except ImportError:
     from pipes import quote
 
+from .execution_context import ExecutionContext
 from .process import command, command_output, command_sequence
 
 
@@ -44,10 +45,13 @@ def evaluate_conditionals(configuration, target):
 
 
 class ProjectDefinition:
-    def __init__(self, target, directory, configuration={}):
+    def __init__(self, target, directory, configuration={}, build_concurrency=None, context=None):
         self.target = target
         self.directory = directory
         self.configuration = configuration
+        self.build_concurrency = build_concurrency
+        # the context that the project's commands run in, which is the project's directory in the process's environment by default
+        self.context = context or ExecutionContext(directory)
 
 
 class Project:
@@ -78,6 +82,12 @@ class Project:
     def directory(self):
         return self.__definition.directory
 
+    def context(self):
+        return self.__definition.context
+
+    def environment(self):
+        return self.__definition.context.environment()
+
     def configuration(self, key=None):
         if key is None:
             return self.__definition.configuration
@@ -86,7 +96,7 @@ class Project:
         return None
 
     def build_concurrency(self):
-        concurrency = self.needy.build_concurrency()
+        concurrency = self.__definition.build_concurrency or self.needy.build_concurrency()
         if self.configuration('max-concurrency') is not None:
             concurrency = min(concurrency, self.configuration('max-concurrency'))
         return concurrency
@@ -105,34 +115,35 @@ class Project:
     def target_environment_overrides(self):
         ret = {}
 
+        environment = self.environment()
         needy_wrappers = os.path.join(self.directory(), 'needy-wrappers')
 
-        ret['HOST_CC'] = os.environ.get('HOST_CC', os.environ.get('CC', ''))
-        if self.target().platform.c_compiler(self.target().architecture):
+        ret['HOST_CC'] = environment.get('HOST_CC', environment.get('CC', ''))
+        if self.target().platform.c_compiler(self.target().architecture, environment):
             ret['CC'] = os.path.join(needy_wrappers, 'needy-cc')
 
-        ret['HOST_CXX'] = os.environ.get('HOST_CXX', os.environ.get('CXX', ''))
-        if self.target().platform.cxx_compiler(self.target().architecture):
+        ret['HOST_CXX'] = environment.get('HOST_CXX', environment.get('CXX', ''))
+        if self.target().platform.cxx_compiler(self.target().architecture, environment):
             ret['CXX'] = os.path.join(needy_wrappers, 'needy-cxx')
 
-        ret['HOST_LDFLAGS'] = os.environ.get('HOST_LDFLAGS', os.environ.get('LDFLAGS', ''))
+        ret['HOST_LDFLAGS'] = environment.get('HOST_LDFLAGS', environment.get('LDFLAGS', ''))
         libraries = self.target().platform.libraries(self.target().architecture)
         if len(libraries) > 0:
-            ret['LDFLAGS'] = ' '.join(libraries + ([os.environ['LDFLAGS']] if 'LDFLAGS' in os.environ else []))
+            ret['LDFLAGS'] = ' '.join(libraries + ([environment['LDFLAGS']] if 'LDFLAGS' in environment else []))
 
-        ret['HOST_PATH'] = os.environ.get('HOST_PATH', os.environ['PATH'])
+        ret['HOST_PATH'] = environment.get('HOST_PATH', environment['PATH'])
         binary_paths = [needy_wrappers] + self.target().platform.binary_paths(self.target().architecture)
         if len(binary_paths) > 0:
-            ret['PATH'] = ('%s:%s' % (':'.join(binary_paths), os.environ['PATH']))
+            ret['PATH'] = ('%s:%s' % (':'.join(binary_paths), environment['PATH']))
 
         return ret
 
     def setup(self):
         # create wrappers for cc / cxx since some systems (e.g. boost's bootstrap) expect these to be single tokens
-        c_compiler = self.target().platform.c_compiler(self.target().architecture)
+        c_compiler = self.target().platform.c_compiler(self.target().architecture, self.environment())
         if c_compiler:
             self.__create_wrapper('needy-cc', c_compiler)
-        cxx_compiler = self.target().platform.cxx_compiler(self.target().architecture)
+        cxx_compiler = self.target().platform.cxx_compiler(self.target().architecture, self.environment())
         if cxx_compiler:
             self.__create_wrapper('needy-cxx', cxx_compiler)
 
@@ -157,10 +168,11 @@ class Project:
                 os.makedirs(d)
 
     def __create_wrapper(self, name, command):
-        if not os.path.exists('needy-wrappers'):
-            os.makedirs('needy-wrappers')
+        directory = os.path.join(self.directory(), 'needy-wrappers')
+        if not os.path.exists(directory):
+            os.makedirs(directory)
 
-        path = 'needy-wrappers/{}'.format(name)
+        path = os.path.join(directory, name)
         with open(path, 'w') as f:
             f.write("#!/bin/sh\n{} \"$@\"".format(' '.join(quote(arg) for arg in command) if isinstance(command, list) else command))
         os.chmod(path, 0o755)
@@ -170,25 +182,30 @@ class Project:
         if use_target_overrides:
             env.update(self.target_environment_overrides())
         else:
+            environment = self.environment()
             for var in ['PATH', 'CC', 'CXX', 'LDFLAGS']:
-                if 'HOST_'+var in os.environ:
-                    env[var] = os.environ['HOST_'+var]
+                if 'HOST_'+var in environment:
+                    env[var] = environment['HOST_'+var]
         return env
 
-    def command(self, cmd, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True):
+    def command(self, cmd, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True, directory=None):
+        ''' runs the command in the project's context, or in the given directory of it '''
         return command(cmd, verbosity=verbosity, environment_overrides=self.command_environment_overrides(
             environment_overrides=environment_overrides,
             use_target_overrides=use_target_overrides
-        ))
+        ), context=self.__context(directory))
 
-    def command_output(self, cmd, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True):
+    def command_output(self, cmd, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True, directory=None):
         return command_output(cmd, verbosity=verbosity, environment_overrides=self.command_environment_overrides(
             environment_overrides=environment_overrides,
             use_target_overrides=use_target_overrides
-        ))
+        ), context=self.__context(directory))
 
-    def command_sequence(self, cmds, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True):
+    def command_sequence(self, cmds, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True, directory=None):
         return command_sequence(cmds, verbosity=verbosity, environment_overrides=self.command_environment_overrides(
             environment_overrides=environment_overrides,
             use_target_overrides=use_target_overrides
-        ))
+        ), context=self.__context(directory))
+
+    def __context(self, directory):
+        return self.context() if directory is None else self.context().with_directory(directory)
@@ -1,11 +1,18 @@
-from .androidmk import AndroidMkProject
-from .autotools import AutotoolsProject
-from .boostbuild import BoostBuildProject
-from .cmake import CMakeProject
-from .custom import CustomProject
-from .make import MakeProject
-from .msbuild import MSBuildProject
-from .source import SourceProject
-from .xcode import XcodeProject
-
-project_types = [AndroidMkProject, AutotoolsProject, CMakeProject, BoostBuildProject, MakeProject, MSBuildProject, XcodeProject, SourceProject, CustomProject]
+import importlib
+
+PROJECT_TYPES = [
+    ('.androidmk', 'AndroidMkProject'),
+    ('.autotools', 'AutotoolsProject'),
+    ('.cmake', 'CMakeProject'),
+    ('.boostbuild', 'BoostBuildProject'),
+    ('.make', 'MakeProject'),
+    ('.msbuild', 'MSBuildProject'),
+    ('.xcode', 'XcodeProject'),
+    ('.source', 'SourceProject'),
+    ('.custom', 'CustomProject'),
+]
+
+
+def project_types():
+    ''' returns the project types in the order they're evaluated in. they're only imported once a project needs one '''
+    return [getattr(importlib.import_module(module, package=__name__), name) for module, name in PROJECT_TYPES]
@@ -1,11 +1,9 @@
-import distutils.spawn
 import os
 import subprocess
 import logging
 
 from .. import project
-from ..cd import cd
-from ..process import command_output
+from ..process import command_output, find_executable
 
 from .make import get_make_jobs_args
 
@@ -19,28 +17,27 @@ class AutotoolsProject(project.Project):
     @staticmethod
     def is_valid_project(definition, needy):
         failure_messages = []
-        with cd(definition.directory):
-            if os.path.isfile('configure'):
-                try:
-                    configure_version_info = command_output(['./configure', '--version'], logging.DEBUG)
-                    if 'generated by GNU Autoconf' in configure_version_info:
-                        return True, './configure script determined to be generated by GNU Autoconf'
-                except subprocess.CalledProcessError:
-                    pass
-                except OSError:
-                    pass
-                failure_messages.append('./configure script was not determined to be generated by GNU Autoconf')
-            else:
-                failure_messages.append('no ./configure script found')
-            if os.path.isfile('autogen.sh') and os.path.isfile('configure.ac') and os.path.isfile('Makefile.am'):
-                return True, 'autogen.sh, configure.ac, and Makefile.am all exist'
-            else:
-                failure_messages.append('autogen.sh, configure.ac, and Makefile.am were not all found')
+        if os.path.isfile(os.path.join(definition.directory, 'configure')):
+            try:
+                configure_version_info = command_output(['./configure', '--version'], logging.DEBUG, context=definition.context)
+                if 'generated by GNU Autoconf' in configure_version_info:
+                    return True, './configure script determined to be generated by GNU Autoconf'
+            except subprocess.CalledProcessError:
+                pass
+            except OSError:
+                pass
+            failure_messages.append('./configure script was not determined to be generated by GNU Autoconf')
+        else:
+            failure_messages.append('no ./configure script found')
+        if all(os.path.isfile(os.path.join(definition.directory, name)) for name in ['autogen.sh', 'configure.ac', 'Makefile.am']):
+            return True, 'autogen.sh, configure.ac, and Makefile.am all exist'
+        else:
+            failure_messages.append('autogen.sh, configure.ac, and Makefile.am were not all found')
         return False, failure_messages
 
     @staticmethod
     def missing_prerequisites(definition, needy):
-        return ['make'] if distutils.spawn.find_executable('make') is None else []
+        return ['make'] if find_executable('make') is None else []
 
     @staticmethod
     def configuration_keys():
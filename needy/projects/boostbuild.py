@@ -1,10 +1,11 @@
 import os
-import distutils.spawn
 import textwrap
 import sys
 
 from ..platforms.xcode import XcodePlatform
 from .. import project
+from ..jobserver import reserved_jobs
+from ..process import find_executable
 
 
 class BoostBuildProject(project.Project):
@@ -16,7 +17,7 @@ class BoostBuildProject(project.Project):
     @staticmethod
     def is_valid_project(definition, needy):
         for name in BoostBuildProject.__valid_jamroot_filenames():
-            if os.path.isfile(name):
+            if os.path.isfile(os.path.join(definition.directory, name)):
                 return True, 'Jamroot file {} found'.format(name)
         return False, 'no Jamroot file matching {} found'.format(BoostBuildProject.__valid_jamroot_filenames())
 
@@ -26,14 +27,14 @@ class BoostBuildProject(project.Project):
 
     @staticmethod
     def missing_prerequisites(definition, needy):
-        return ['b2'] if not os.path.isfile('bootstrap.sh') and distutils.spawn.find_executable('b2') is None else []
+        return ['b2'] if not os.path.isfile(os.path.join(definition.directory, 'bootstrap.sh')) and find_executable('b2') is None else []
 
     @staticmethod
     def configuration_keys():
         return project.Project.configuration_keys() | {'b2-args', 'bootstrap-args'}
 
-    def get_build_concurrency_args(self):
-        concurrency = self.build_concurrency()
+    def get_build_concurrency_args(self, concurrency=None):
+        concurrency = self.build_concurrency() if concurrency is None else concurrency
 
         if concurrency > 1:
             return ['-j', str(concurrency)]
@@ -43,7 +44,7 @@ class BoostBuildProject(project.Project):
 
     def configure(self, build_directory):
         bootstrap_args = self.evaluate(self.configuration('bootstrap-args'))
-        if not os.path.isfile('bootstrap.sh'):
+        if not os.path.isfile(os.path.join(self.directory(), 'bootstrap.sh')):
             if len(bootstrap_args) > 0:
                 raise RuntimeError('bootstrap-args was given, but no bootstrap script is present')
             return
@@ -51,9 +52,8 @@ class BoostBuildProject(project.Project):
         self.command(['./bootstrap.sh'] + bootstrap_args, use_target_overrides=False)
 
     def build(self, output_directory):
-        b2 = './b2' if os.path.isfile('b2') else 'b2'
+        b2 = './b2' if os.path.isfile(os.path.join(self.directory(), 'b2')) else 'b2'
         b2_args = self.evaluate(self.configuration('b2-args'))
-        b2_args.extend(self.get_build_concurrency_args())
 
         if not any(['variant' in arg for arg in b2_args]):
             b2_args.append('variant=release')
@@ -64,13 +64,14 @@ class BoostBuildProject(project.Project):
         toolset = 'gcc'
         if sys.platform == 'darwin' and isinstance(self.target().platform, XcodePlatform):
             toolset = 'darwin'
-        elif distutils.spawn.find_executable('clang') is not None:
+        elif find_executable('clang') is not None:
             toolset = 'clang'
         b2_args.append('toolset={}-needy'.format(toolset))
 
         project_config = ''
-        if os.path.exists('project-config.jam'):
-            with open('project-config.jam', 'r') as f:
+        project_config_path = os.path.join(self.directory(), 'project-config.jam')
+        if os.path.exists(project_config_path):
+            with open(project_config_path, 'r') as f:
                 project_config = f.read()
 
         new_project_config = textwrap.dedent("""\
@@ -105,14 +106,17 @@ class BoostBuildProject(project.Project):
             if not skip_lines:
                 new_project_config += line
 
-        with open('project-config.jam', 'w') as f:
+        with open(project_config_path, 'w') as f:
             f.write(new_project_config)
 
-        if 'CFLAGS' in os.environ:
-            b2_args.append('cflags={}'.format(os.environ['CFLAGS']))
-        if 'CXXFLAGS' in os.environ:
-            b2_args.append('cxxflags={}'.format(os.environ['CXXFLAGS']))
-        if 'LDFLAGS' in os.environ:
-            b2_args.append('linkflags={}'.format(os.environ['LDFLAGS']))
-
-        self.command([b2, 'install', '--prefix={}'.format(output_directory)] + b2_args)
+        environment = self.environment()
+        if 'CFLAGS' in environment:
+            b2_args.append('cflags={}'.format(environment['CFLAGS']))
+        if 'CXXFLAGS' in environment:
+            b2_args.append('cxxflags={}'.format(environment['CXXFLAGS']))
+        if 'LDFLAGS' in environment:
+            b2_args.append('linkflags={}'.format(environment['LDFLAGS']))
+
+        # b2 doesn't understand make's jobserver, so jobs are reserved from it on b2's behalf
+        with reserved_jobs(self.build_concurrency()) as concurrency:
+            self.command([b2, 'install', '--prefix={}'.format(output_directory)] + b2_args + self.get_build_concurrency_args(concurrency))
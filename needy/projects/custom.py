@@ -1,7 +1,6 @@
 import os
 
 from .. import project
-from ..cd import cd
 
 
 class CustomProject(project.Project):
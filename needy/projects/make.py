@@ -1,15 +1,20 @@
-import distutils.spawn
 import os
 import re
 import logging
 
 from .. import project
+from ..jobserver import active_jobserver
+from ..process import find_executable
 
 
 # TODO: This really should be part of the MakeProject class, but
 #       other build systems still use some of the MakeProject
 #       arguments and parameters such as AutotoolsProject.
 def get_make_jobs_args(project):
+    if active_jobserver() and project.configuration('max-concurrency') is None:
+        # make picks the shared jobserver up from MAKEFLAGS. passing -j would make it start its own
+        return []
+
     concurrency = project.build_concurrency()
 
     if concurrency > 1:
@@ -34,7 +39,7 @@ class MakeProject(project.Project):
 
     @staticmethod
     def missing_prerequisites(definition, needy):
-        return ['make'] if distutils.spawn.find_executable('make') is None else []
+        return ['make'] if find_executable('make') is None else []
 
     @staticmethod
     def __valid_makefile_names():
@@ -58,10 +63,10 @@ class MakeProject(project.Project):
         if not self.target().platform.is_host():
             excluded_targets.extend(['test', 'tests', 'check'])
 
-        makefile_path = MakeProject.get_makefile_path()
+        makefile_path = MakeProject.get_makefile_path(self.directory())
 
         with open(makefile_path, 'r') as makefile:
-            with open('MakefileNeedyGenerated', 'w') as needy_makefile:
+            with open(os.path.join(self.directory(), 'MakefileNeedyGenerated'), 'w') as needy_makefile:
                 for line in makefile.readlines():
                     uname_assignment = re.match('(.+=).*shell .*uname', line, re.MULTILINE)
                     if uname_assignment and self.target().platform.identifier() == 'android':
@@ -1,9 +1,9 @@
-import distutils.spawn
 import os
 import shutil
 
 from .. import project
 from ..platforms.windows import WindowsPlatform
+from ..process import find_executable
 
 from .source import SourceProject
 
@@ -20,7 +20,7 @@ class MSBuildProject(project.Project):
             return False, 'target platform not an MSBuild supported platform'
 
         if 'msbuild-project' not in definition.configuration:
-            extensions = [os.path.splitext(f)[1] for f in os.listdir('.') if os.path.isfile(f)]
+            extensions = [os.path.splitext(f)[1] for f in os.listdir(definition.directory) if os.path.isfile(os.path.join(definition.directory, f))]
             if not set(['.vcproj', '.vcxproj', '.sln']) & set(extensions):
                 return False, 'no projects or solutions present'
 
@@ -28,7 +28,7 @@ class MSBuildProject(project.Project):
 
     @staticmethod
     def missing_prerequisites(definition, needy):
-        return ['msbuild'] if not distutils.spawn.find_executable('msbuild') else []
+        return ['msbuild'] if not find_executable('msbuild') else []
 
     @staticmethod
     def configuration_keys():
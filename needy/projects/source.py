@@ -5,8 +5,8 @@ import shlex
 import shutil
 import logging
 
-from distutils import dir_util
 from .. import project
+from ..filesystem import fast_copy_tree
 
 
 class SourceProject(project.Project):
@@ -49,13 +49,13 @@ class SourceProject(project.Project):
         logging.info('Copying headers from {}'.format(header_directory))
 
         if header_directory != source_directory:
-            dir_util.copy_tree(header_directory, destination)
+            fast_copy_tree(header_directory, destination)
         else:
             def non_headers(directory, files):
                 return [f for f in files if os.path.isfile(os.path.join(directory, f)) and os.path.splitext(f)[1] not in ['.h', '.hh', '.hpp']]
             if os.path.exists(destination):
                 shutil.rmtree(destination)
-            shutil.copytree(header_directory, destination, ignore=non_headers)
+            fast_copy_tree(header_directory, destination, ignore=non_headers)
 
     @staticmethod
     def is_valid_project(definition, needy):
@@ -127,12 +127,12 @@ class SourceProject(project.Project):
             flags = ['-c', input, '-o', output, '-O3'] + ['-I{}'.format(path) for path in include_paths]
 
         if extension == '.c':
-            if 'CFLAGS' in os.environ:
-                flags.extend(shlex.split(os.environ['CFLAGS']))
+            if 'CFLAGS' in self.environment():
+                flags.extend(shlex.split(self.environment()['CFLAGS']))
             self.command((['needy-cc'] if platform.identifier() != 'windows' else platform.c_compiler(architecture)) + flags, verbosity=logging.DEBUG)
         elif extension == '.cpp':
-            if 'CXXFLAGS' in os.environ:
-                flags.extend(shlex.split(os.environ['CXXFLAGS']))
+            if 'CXXFLAGS' in self.environment():
+                flags.extend(shlex.split(self.environment()['CXXFLAGS']))
             self.command((['needy-cxx'] if platform.identifier() != 'windows' else platform.cxx_compiler(architecture)) + flags, verbosity=logging.DEBUG)
         else:
             return False
@@ -4,7 +4,6 @@ import shutil
 import logging
 
 from .. import project
-from ..cd import cd
 from ..filesystem import copy_if_changed
 from ..process import command_output
 from ..platforms.xcode import XcodePlatform
@@ -29,8 +28,7 @@ class XcodeProject(project.Project):
             xcodebuild_args.extend(['-project', definition.configuration['xcode-project']])
 
         try:
-            with cd(definition.directory):
-                command_output(['xcodebuild', '-list'] + xcodebuild_args, logging.DEBUG)
+            command_output(['xcodebuild', '-list'] + xcodebuild_args, logging.DEBUG, context=definition.context)
         except subprocess.CalledProcessError:
             return False, 'non-zero return in xcodebuild -list indicating no xcode project located in project root'
         except OSError:
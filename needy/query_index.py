@@ -0,0 +1,218 @@
+import fnmatch
+import hashlib
+import json
+import os
+
+from collections import OrderedDict
+
+from .dependency_graph import build_order, dependency_closure
+from .filesystem import read_json_file, write_file_atomically
+from .needs_parser import NEEDS_FILE_NAMES
+from .needs_template import dependencies_are_unchanged, parse_defines
+from .pkgconfig import path_fingerprint
+
+FORMAT_VERSION = 3
+
+
+def index_path(needs_directory):
+    return os.path.join(needs_directory, 'query-index.json')
+
+
+def name_index_path(needs_directory):
+    return os.path.join(needs_directory, 'name-index.json')
+
+
+def find_needs_file(path):
+    ''' returns the path of the needs file in the directory or None '''
+    needs_files = [os.path.join(path, name) for name in NEEDS_FILE_NAMES if os.path.isfile(os.path.join(path, name))]
+    return needs_files[0] if len(needs_files) == 1 else None
+
+
+def index_key(needs_file, environment=None):
+    """ returns a hash of what the rendered needs and the libraries needy builds for them depend on, besides the
+    defines and environment variables that rendering the needs reads, which are recorded in the index instead
+    """
+    environment = os.environ if environment is None else environment
+    digest = hashlib.sha1('{}\n'.format(FORMAT_VERSION).encode())
+    with open(needs_file, 'rb') as f:
+        digest.update(f.read())
+    # libraries overridden by pkg-config packages aren't built
+    digest.update(json.dumps(path_fingerprint(environment.get('PKG_CONFIG_PATH') or '')).encode())
+    return digest.hexdigest()
+
+
+class QueryIndex:
+    """ The paths of a project's libraries for every target and universal binary that's been satisfied.
+
+    The index lets the path queries be answered without rendering or parsing
+    the needs file. It's only valid for the needs file it was written with and
+    the values of the defines and environment variables that rendering it
+    read, and its answers are ordered the same way Needy's are.
+    """
+
+    def __init__(self, path, key, contents=None):
+        self.__path = path
+        self.__key = key
+        self.__contents = contents or OrderedDict([
+            ('version', FORMAT_VERSION),
+            ('key', key),
+            ('dependencies', {'defines': {}, 'environment': {}}),
+            ('aliases', OrderedDict()),
+            ('targets', OrderedDict()),
+            ('universal-binaries', OrderedDict()),
+        ])
+
+    @classmethod
+    def open(cls, needs_file, needs_directory, defines=None):
+        ''' returns the index for the given needs, which is empty if there's no valid one on disk '''
+        path = index_path(needs_directory)
+        key = index_key(needs_file)
+        contents = read_json_file(path)
+        if (not isinstance(contents, dict) or contents.get('version') != FORMAT_VERSION or contents.get('key') != key or
+                not dependencies_are_unchanged(contents['dependencies'], parse_defines(defines))):
+            contents = None
+        return cls(path, key, contents)
+
+    @classmethod
+    def for_directory(cls, path, parameters):
+        ''' returns the index for the project at the given path if one exists or None '''
+        needs_file = find_needs_file(path)
+        needs_directory = os.path.join(path, 'needs')
+        if needs_file is None or not os.path.isfile(index_path(needs_directory)):
+            return None
+        return cls.open(needs_file, needs_directory, getattr(parameters, 'define', None))
+
+    def save(self):
+        write_file_atomically(self.__path, json.dumps(self.__contents, indent=4, separators=(',', ': ')))
+
+    def add_dependencies(self, dependencies):
+        ''' records defines and environment variables that the index's contents depend on, as returned by Needy.render_dependencies '''
+        for kind in ['defines', 'environment']:
+            self.__contents['dependencies'][kind].update(dependencies[kind])
+
+    def add_target(self, identifier, libraries, alias=None):
+        ''' libraries is a list of (name, dependencies, build directory) tuples in the order they're defined in '''
+        self.__contents['targets'][identifier] = [[name, list(dependencies), build_directory] for name, dependencies, build_directory in libraries]
+        if alias and alias != identifier:
+            self.__contents['aliases'][alias] = identifier
+
+    def add_universal_binary(self, name, target_identifiers, build_directories):
+        ''' build_directories is a dict of library names to the universal binary's build directories for them '''
+        self.__contents['universal-binaries'][name] = OrderedDict([('targets', list(target_identifiers)), ('build-directories', build_directories)])
+
+    def libraries(self, target_or_universal_binary, filters=None):
+        ''' returns (name, build directory) tuples in the order Needy.libraries returns them or None if the index doesn't cover the query '''
+        if target_or_universal_binary in self.__contents['universal-binaries']:
+            universal_binary = self.__contents['universal-binaries'][target_or_universal_binary]
+            ret = OrderedDict()
+            for identifier in universal_binary['targets']:
+                names = self.__library_names(identifier, filters)
+                if names is None:
+                    return None
+                for name in names:
+                    if name not in ret:
+                        ret[name] = universal_binary['build-directories'].get(name)
+            return None if None in ret.values() else list(ret.items())
+
+        libraries = self.__target_libraries(target_or_universal_binary)
+        names = self.__library_names(target_or_universal_binary, filters)
+        if names is None:
+            return None
+        return [(name, libraries[name][1]) for name in names]
+
+    def include_paths(self, target_or_universal_binary, filters=None):
+        return self.__paths(target_or_universal_binary, filters, 'include')
+
+    def library_paths(self, target_or_universal_binary, filters=None):
+        return self.__paths(target_or_universal_binary, filters, 'lib')
+
+    def pkg_config_paths(self, target_or_universal_binary, filters=None):
+        return self.__paths(target_or_universal_binary, filters, os.path.join('lib', 'pkgconfig'))
+
+    def build_directory(self, library, target_or_universal_binary):
+        if target_or_universal_binary in self.__contents['universal-binaries']:
+            return self.__contents['universal-binaries'][target_or_universal_binary]['build-directories'].get(library)
+        libraries = self.__target_libraries(target_or_universal_binary)
+        return libraries[library][1] if libraries and library in libraries else None
+
+    def __paths(self, target_or_universal_binary, filters, subdirectory):
+        libraries = self.libraries(target_or_universal_binary, filters)
+        return None if libraries is None else [os.path.join(build_directory, subdirectory) for _, build_directory in libraries]
+
+    def __target_libraries(self, identifier):
+        identifier = self.__contents['aliases'].get(identifier, identifier)
+        if identifier not in self.__contents['targets']:
+            return None
+        return OrderedDict((name, (dependencies, build_directory)) for name, dependencies, build_directory in self.__contents['targets'][identifier])
+
+    def __library_names(self, identifier, filters):
+        libraries = self.__target_libraries(identifier)
+        if libraries is None:
+            return None
+        graph = {name: dependencies for name, (dependencies, _) in libraries.items()}
+        names = dependency_closure(graph, [name for name in libraries if not filters or any(fnmatch.fnmatchcase(name, f) for f in filters)])
+        return build_order(dict((name, graph[name]) for name in names), libraries.keys())
+
+
+class NameIndex:
+    """ The names of a project's libraries and universal binaries for shell completion.
+
+    Unlike the query index, this is only invalidated when the needs file
+    changes, so it can be stale if the names depend on the environment. That's
+    an acceptable trade for completion, which has to be fast.
+    """
+
+    def __init__(self, path, needs_file_signature, contents=None):
+        self.__path = path
+        self.__contents = contents or OrderedDict([
+            ('version', FORMAT_VERSION),
+            ('needs-file', needs_file_signature),
+            ('universal-binaries', []),
+            ('libraries', OrderedDict()),
+        ])
+
+    @classmethod
+    def open(cls, needs_file, needs_directory):
+        ''' returns the index for the given needs, which is empty if there's no up-to-date one on disk '''
+        path = name_index_path(needs_directory)
+        signature = cls.__signature(needs_file)
+        return cls(path, signature, cls.__read(path, signature))
+
+    @classmethod
+    def for_directory(cls, path):
+        ''' returns the index for the project at the given path if an up-to-date one exists or None '''
+        needs_file = find_needs_file(path)
+        if needs_file is None:
+            return None
+        location = name_index_path(os.path.join(path, 'needs'))
+        signature = cls.__signature(needs_file)
+        contents = cls.__read(location, signature)
+        return None if contents is None else cls(location, signature, contents)
+
+    def save(self):
+        write_file_atomically(self.__path, json.dumps(self.__contents, indent=4, separators=(',', ': ')))
+
+    def universal_binary_names(self):
+        return self.__contents['universal-binaries']
+
+    def set_universal_binary_names(self, names):
+        self.__contents['universal-binaries'] = list(names)
+
+    def library_names(self, target_or_universal_binary):
+        ''' returns the names of the libraries for the target or universal binary or None if they aren't known '''
+        return self.__contents['libraries'].get(target_or_universal_binary)
+
+    def set_library_names(self, target_or_universal_binary, names):
+        self.__contents['libraries'][target_or_universal_binary] = list(names)
+
+    @staticmethod
+    def __read(path, signature):
+        contents = read_json_file(path)
+        if not isinstance(contents, dict) or contents.get('version') != FORMAT_VERSION or contents.get('needs-file') != signature:
+            return None
+        return contents
+
+    @staticmethod
+    def __signature(needs_file):
+        status = os.stat(needs_file)
+        return [needs_file, status.st_mtime, status.st_size]
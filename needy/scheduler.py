@@ -0,0 +1,223 @@
+import os
+import pickle
+import select
+import sys
+
+from collections import OrderedDict
+
+from .progress import REFRESH_INTERVAL
+
+
+def can_isolate_tasks():
+    ''' returns True if tasks can be run concurrently in isolated child processes '''
+    return hasattr(os, 'fork')
+
+
+class Scheduler:
+    """ Runs tasks as soon as all of their dependencies have finished.
+
+    Each task is a callable that receives the number of jobs it may use. In
+    parallel mode, the job budget is split between the running tasks, and each
+    task runs in a forked child process so that a crashing or misbehaving
+    build can't take the others down with it. Otherwise, tasks
+    are run one at a time in this process with the full budget.
+
+    If a jobserver is given, every running task beyond the first also holds
+    one of its tokens, so the tasks themselves count against the pool that
+    make draws from. Each task still gets its share of the budget for tools
+    that don't understand the jobserver.
+
+    The output of child processes is passed on a line at a time so that lines
+    from different tasks never run together. If a BuildProgress is given, it's
+    shown beneath that output while tasks run.
+    """
+
+    def __init__(self, jobs=1, parallel=False, jobserver=None, progress=None):
+        self.__jobs = max(1, jobs)
+        self.__parallel = parallel
+        self.__jobserver = jobserver
+        self.__progress = progress if parallel else None
+        self.__tokens = set()
+        self.__tasks = OrderedDict()
+        self.__children = {}
+        self.__outputs = {}
+        self.__failed_task = None
+
+    def add(self, name, function, dependencies=[], log_path=None):
+        ''' adds a task. the last line of the log at log_path, if given, is shown as the task's progress '''
+        self.__tasks[name] = (function, set(dependencies))
+        if self.__progress and log_path:
+            self.__progress.watch(name, log_path)
+
+    def failed_task(self):
+        ''' returns the name of the task whose exception run raised or None '''
+        return self.__failed_task
+
+    def run(self):
+        ''' runs every task. if one fails, no new tasks are started and its exception is raised once running tasks finish '''
+        try:
+            self.__run()
+        finally:
+            for fd in list(self.__outputs):
+                self.__close_output(fd)
+            if self.__progress:
+                self.__progress.close()
+
+    def __run(self):
+        remaining = OrderedDict((name, dependencies & set(self.__tasks)) for name, (_, dependencies) in self.__tasks.items())
+        dependents = {name: [] for name in self.__tasks}
+        for name, dependencies in remaining.items():
+            for dependency in dependencies:
+                dependents[dependency].append(name)
+
+        ready = [name for name, dependencies in remaining.items() if not dependencies]
+        running = {}
+        error = None
+
+        while ready or running:
+            while ready and error is None and self.__can_start(running):
+                jobs = self.__jobs if not self.__parallel else max(1, (self.__jobs - sum(running.values())) // len(ready))
+                name = ready.pop(0)
+                function, _ = self.__tasks[name]
+                if not self.__parallel:
+                    try:
+                        function(jobs)
+                    except BaseException:
+                        self.__failed_task = name
+                        raise
+                    self.__finish(name, remaining, dependents, ready)
+                    continue
+                running[name] = jobs
+                if self.__jobserver and len(running) > 1:
+                    self.__tokens.add(name)
+                self.__start(name, function, jobs)
+
+            if not running:
+                break
+
+            # tokens only matter while there's a task waiting for one and budget left to give it
+            can_use_token = ready and error is None and sum(running.values()) < self.__jobs
+            name, exception = self.__wait(self.__jobserver if can_use_token else None)
+            if name is None:
+                continue
+            del running[name]
+            if self.__progress:
+                self.__progress.finish(name)
+            if name in self.__tokens:
+                self.__tokens.remove(name)
+                self.__jobserver.release()
+            if exception is not None and error is None:
+                error = exception
+                self.__failed_task = name
+            elif error is None:
+                self.__finish(name, remaining, dependents, ready)
+
+        if error is not None:
+            raise error
+
+        if remaining:
+            raise ValueError('circular dependency detected')
+
+    def __can_start(self, running):
+        if sum(running.values()) >= self.__jobs:
+            return False
+        return not self.__jobserver or not running or self.__jobserver.acquire(blocking=False)
+
+    @staticmethod
+    def __finish(name, remaining, dependents, ready):
+        del remaining[name]
+        for dependent in dependents[name]:
+            remaining[dependent].discard(name)
+            if not remaining[dependent]:
+                ready.append(dependent)
+
+    def __start(self, name, function, jobs):
+        read_fd, write_fd = os.pipe()
+        output_read_fd, output_write_fd = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.close(output_read_fd)
+            for fd in self.__outputs:
+                os.close(fd)
+            os.dup2(output_write_fd, 1)
+            os.dup2(output_write_fd, 2)
+            os.close(output_write_fd)
+            result = None
+            try:
+                function(jobs)
+            except BaseException as e:
+                result = e
+            try:
+                data = pickle.dumps(result)
+            except Exception:
+                data = pickle.dumps(RuntimeError(str(result)))
+            with os.fdopen(write_fd, 'wb') as f:
+                f.write(data)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(0 if result is None else 1)
+        os.close(write_fd)
+        os.close(output_write_fd)
+        self.__children[read_fd] = (name, pid, [], output_read_fd)
+        self.__outputs[output_read_fd] = b''
+        if self.__progress:
+            self.__progress.start(name)
+
+    def __wait(self, jobserver=None):
+        ''' waits for any running task to finish and returns its name and exception, if any. returns None for the name if a jobserver token may be available '''
+        while True:
+            fds = list(self.__children.keys()) + list(self.__outputs.keys())
+            readable, _, _ = select.select(fds + [jobserver.fds()[0]] if jobserver else fds, [], [], REFRESH_INTERVAL if self.__progress else None)
+            if not readable:
+                self.__progress.refresh()
+                continue
+            if jobserver and jobserver.fds()[0] in readable:
+                return None, None
+            for fd in [fd for fd in readable if fd in self.__outputs]:
+                self.__read_output(fd)
+            for fd in [fd for fd in readable if fd in self.__children]:
+                name, pid, chunks, output_fd = self.__children[fd]
+                data = os.read(fd, 65536)
+                if data:
+                    chunks.append(data)
+                    continue
+                os.close(fd)
+                del self.__children[fd]
+                os.waitpid(pid, 0)
+                # the child is gone, so everything it wrote is already in the pipe
+                while output_fd in self.__outputs and select.select([output_fd], [], [], 0)[0]:
+                    self.__read_output(output_fd)
+                if output_fd in self.__outputs:
+                    self.__close_output(output_fd)
+                if not chunks:
+                    return name, RuntimeError('{} terminated unexpectedly'.format(name))
+                return name, pickle.loads(b''.join(chunks))
+
+    def __read_output(self, fd):
+        data = os.read(fd, 65536)
+        if not data:
+            self.__close_output(fd)
+            return
+        lines = self.__outputs[fd] + data
+        end = lines.rfind(b'\n') + 1
+        self.__outputs[fd] = lines[end:]
+        self.__write(lines[:end])
+
+    def __close_output(self, fd):
+        os.close(fd)
+        remainder = self.__outputs.pop(fd)
+        if remainder:
+            self.__write(remainder + b'\n')
+
+    def __write(self, data):
+        if not data:
+            return
+        text = data.decode('utf-8', 'replace')
+        if self.__progress:
+            self.__progress.write(text)
+        else:
+            sys.stdout.write(text)
+            sys.stdout.flush()
@@ -0,0 +1,275 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import select
+import socket
+
+from .cd import cd, current_directory
+from .filesystem import user_cache_directory
+from .needs_parser import NEEDS_FILE_NAMES
+from .override_environment import OverrideEnvironment
+
+SERVED_COMMANDS = ['builddir', 'cflags', 'ldflags', 'pkg-config-path']
+CLIENT_TIMEOUT = 10
+MAX_CONTEXTS = 16
+MAX_ENVIRONMENT_REQUESTS = 4
+
+# the environment variables that every answer depends on, besides the ones the needs read
+ENVIRONMENT = ['PKG_CONFIG_PATH']
+
+
+def socket_directory():
+    ''' returns the directory that the servers' sockets are created in, which only the current user can access '''
+    runtime_directory = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_directory and os.path.isabs(runtime_directory):
+        return os.path.join(runtime_directory, 'needy')
+    return os.path.join(user_cache_directory(), 'servers')
+
+
+def socket_path(path):
+    ''' returns the path of the socket the server for the project at the given path listens on '''
+    digest = hashlib.sha1(os.path.realpath(path).encode()).hexdigest()[:16]
+    return os.path.join(socket_directory(), '{}.sock'.format(digest))
+
+
+def is_private(path):
+    ''' returns True if the file is owned by the current user and nobody else can access it '''
+    try:
+        status = os.stat(path)
+    except OSError:
+        return False
+    return status.st_uid == os.getuid() and not status.st_mode & 0o077
+
+
+def query(args, path=None):
+    """ returns the output of the command if a server answered it, or None if the command should be run normally
+
+    Only the environment variables that the answer depends on are sent. The
+    server says which ones those are, since it's the one that reads the needs.
+    """
+    if len(args) < 2 or args[1] not in SERVED_COMMANDS or not hasattr(socket, 'AF_UNIX'):
+        return None
+
+    path = path or current_directory()
+    if not any(os.path.isfile(os.path.join(path, name)) for name in NEEDS_FILE_NAMES):
+        return None
+
+    # anyone else's socket could collect the environment and answer with arbitrary flags
+    address = socket_path(path)
+    if not os.path.exists(address) or not is_private(os.path.dirname(address)) or os.stat(address).st_uid != os.getuid():
+        return None
+
+    names = set(ENVIRONMENT)
+    for _ in range(MAX_ENVIRONMENT_REQUESTS):
+        request = {'args': list(args), 'path': path, 'environment': dict((name, os.environ.get(name)) for name in names)}
+        response = __request(address, request)
+        if response is None:
+            return None
+        if not response.get('environment'):
+            return response.get('output')
+        names.update(response['environment'])
+    return None
+
+
+def __request(address, request):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.settimeout(CLIENT_TIMEOUT)
+        connection.connect(address)
+        connection.sendall(json.dumps(request).encode() + b'\n')
+        return json.loads(__receive(connection).decode())
+    except (socket.error, socket.timeout, ValueError):
+        return None
+    finally:
+        connection.close()
+
+
+def __receive(connection):
+    chunks = []
+    while True:
+        data = connection.recv(65536)
+        if not data:
+            break
+        chunks.append(data)
+    return b''.join(chunks)
+
+
+class Server:
+    """ Answers queries for a project from memory.
+
+    The server keeps a Needy instance for every combination of parameters and
+    relevant environment variables it has been asked about, so the needs file is only rendered and
+    parsed, and platforms only probed, when something they depend on changes.
+    Any request it can't answer confidently is answered with no output, which
+    tells the client to run the command itself.
+    """
+
+    def __init__(self, path, parser, commands):
+        self.__path = path
+        self.__parser = parser
+        self.__commands = commands
+        self.__contexts = {}
+
+    def socket_path(self):
+        return socket_path(self.__path)
+
+    def serve(self, idle_timeout=None):
+        address = self.socket_path()
+        listener = self.__listen(address)
+        logging.info('Serving {} on {}'.format(self.__path, address))
+        try:
+            while True:
+                readable, _, _ = select.select([listener], [], [], idle_timeout)
+                if not readable:
+                    logging.info('Idle timeout reached')
+                    break
+                connection, _ = listener.accept()
+                try:
+                    self.__handle(connection)
+                except socket.error as e:
+                    logging.debug('Unable to respond to request: {}'.format(e))
+                finally:
+                    connection.close()
+        finally:
+            listener.close()
+            if os.path.exists(address):
+                os.remove(address)
+
+    def respond(self, request):
+        """ returns the response for the given request
+
+        If the answer depends on environment variables the client didn't send,
+        the response lists them instead so that the client can ask again.
+        """
+        try:
+            output, missing_environment = self.__output(request)
+            if missing_environment:
+                return {'output': None, 'environment': missing_environment}
+            return {'output': output}
+        except (Exception, SystemExit) as e:
+            logging.debug('Deferring request {} to the client: {}'.format(request.get('args'), e))
+            return {'output': None}
+
+    @staticmethod
+    def __listen(address):
+        directory = os.path.dirname(address)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        if not is_private(directory):
+            raise RuntimeError('{} must only be accessible by its owner.'.format(directory))
+
+        if os.path.exists(address):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(address)
+                raise RuntimeError('A server is already running for this project.')
+            except socket.error as e:
+                if e.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+                    raise
+                os.remove(address)
+            finally:
+                probe.close()
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(address)
+        os.chmod(address, 0o600)
+        listener.listen(64)
+        return listener
+
+    def __handle(self, connection):
+        connection.settimeout(CLIENT_TIMEOUT)
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = connection.recv(65536)
+            if not chunk:
+                return
+            data += chunk
+        connection.sendall(json.dumps(self.respond(json.loads(data.decode()))).encode())
+
+    def __output(self, request):
+        args = request['args']
+        path = request['path']
+        environment = request['environment']
+
+        if args[1] not in SERVED_COMMANDS or os.path.realpath(path) != os.path.realpath(self.__path):
+            raise RuntimeError('unsupported request')
+
+        arguments = self.__parser.parse_args(args[1:])
+
+        # the request is answered in the client's environment since the needs file can refer to it
+        with cd(path):
+            with OverrideEnvironment(environment):
+                context = self.__context(path, arguments, environment)
+                key = tuple(args[1:])
+                try:
+                    if key not in context['outputs']:
+                        context['outputs'][key] = self.__commands[arguments.main_command].query(context['needy'], arguments)
+                except (Exception, SystemExit):
+                    # the error may only be an error in the server's environment
+                    missing_environment = self.__missing_environment(context, environment)
+                    if missing_environment:
+                        return None, missing_environment
+                    raise
+                return context['outputs'][key], self.__missing_environment(context, environment)
+
+    @staticmethod
+    def __missing_environment(context, environment):
+        return sorted(set(context['needy'].render_dependencies()['environment']) - set(environment))
+
+    def __context(self, path, arguments, environment):
+        # these are imported here so that clients don't pay for them
+        from . import pkgconfig
+        from .needy import Needy
+        from .local_configuration import LocalConfiguration
+        from .needy_configuration import NeedyConfiguration
+
+        # everything but the query itself can affect the answers
+        parameters = sorted((key, value) for key, value in vars(arguments).items() if key not in ['main_command', 'library', 'target', 'universal_binary', 'C', 'verbose', 'quiet'])
+        key = json.dumps([path, parameters, sorted(environment.items())])
+
+        fingerprint = self.__fingerprint(path, environment)
+        context = self.__contexts.get(key)
+        if context and context['fingerprint'] == fingerprint:
+            return context
+
+        # pkg-config's listings may be stale too
+        pkgconfig._packages.clear()
+
+        needs_directory = Needy.resolve_needs_directory(path)
+        with LocalConfiguration(os.path.join(needs_directory, 'config.json'), blocking=False, writable=False) as local_configuration:
+            if local_configuration is None:
+                raise RuntimeError('the local configuration is locked by another needy instance')
+            needy = Needy(path, arguments, local_configuration=local_configuration, needy_configuration=NeedyConfiguration(path))
+
+        if len(self.__contexts) >= MAX_CONTEXTS:
+            self.__contexts.clear()
+        context = {'fingerprint': fingerprint, 'needy': needy, 'outputs': {}}
+        self.__contexts[key] = context
+        return context
+
+    @staticmethod
+    def __fingerprint(path, environment):
+        ''' returns a value that changes whenever anything a query's output depends on might have changed '''
+        from . import pkgconfig
+        from .needy_configuration import NeedyConfiguration
+
+        # these are small, and hashing their contents avoids false invalidations when they're rewritten unchanged
+        files = [os.path.join(path, name) for name in NEEDS_FILE_NAMES]
+        files.append(os.path.join(path, 'needs', 'config.json'))
+        files.extend(NeedyConfiguration.candidate_paths(path))
+
+        digest = hashlib.sha1()
+        for file in files:
+            digest.update(file.encode())
+            try:
+                with open(file, 'rb') as f:
+                    digest.update(hashlib.sha1(f.read()).digest())
+            except (IOError, OSError):
+                digest.update(b'-')
+
+        # overridden libraries are detected via the packages in these directories
+        digest.update(json.dumps(pkgconfig.path_fingerprint(environment.get('PKG_CONFIG_PATH') or '')).encode())
+
+        return digest.hexdigest()
@@ -1,6 +1,7 @@
 import os
 import shutil
 
+from ..filesystem import fast_copy_tree
 from ..source import Source
 
 
@@ -19,4 +20,4 @@ class Directory(Source):
             shutil.rmtree(self.directory)
         elif os.path.exists(self.directory):
             os.remove(self.directory)
-        shutil.copytree(self.source_directory, self.directory, symlinks=True, ignore=shutil.ignore_patterns('.*'))
+        fast_copy_tree(self.source_directory, self.directory, symlinks=True, ignore=shutil.ignore_patterns('.*'))
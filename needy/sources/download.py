@@ -18,6 +18,7 @@ try:
 except ImportError:
     import urllib2
 
+from ..filesystem import lock_file
 from ..source import Source
 
 
@@ -49,8 +50,13 @@ class Download(Source):
         if not os.path.exists(self.cache_directory):
             os.makedirs(self.cache_directory)
 
-        if not os.path.isfile(self.local_download_path):
-            self.get(self.url, self.checksum, self.local_download_path)
+        # working copies for several targets may be cleaned concurrently, but only one should download
+        fd = lock_file(self.local_download_path + '.lock')
+        try:
+            if not os.path.isfile(self.local_download_path):
+                self.get(self.url, self.checksum, self.local_download_path)
+        finally:
+            os.close(fd)
 
     @classmethod
     def get(cls, url, checksum, destination):
@@ -150,7 +156,7 @@ class Download(Source):
             file.extractall(self.destination)
 
     def __trim_lone_dirs(self):
-        temporary_directory = os.path.join(self.cache_directory, 'temp_')
+        temporary_directory = self.destination.rstrip(os.sep) + '.temp_'
 
         while True:
             destination_contents = os.listdir(self.destination)
@@ -1,11 +1,10 @@
 import os
 import logging
-import distutils.spawn
 import subprocess
 
 from ..source import Source
-from ..cd import cd
-from ..process import command, command_output
+from ..execution_context import ExecutionContext
+from ..process import command, command_output, find_executable
 
 
 class GitRepository(Source):
@@ -20,11 +19,10 @@ class GitRepository(Source):
         return 'git'
 
     def status_text(self):
-        with cd(self.directory):
-            rev_list = subprocess.check_output(['git', 'rev-list', '--left-right', '{}...'.format(self.commit)]).decode().splitlines()
-            ahead = len([1 for rev in rev_list if rev[0] == '>'])
-            behind = len([1 for rev in rev_list if rev[0] == '<'])
-            diff = subprocess.check_output(['git', 'diff-index', 'HEAD']).decode().splitlines()
+        rev_list = subprocess.check_output(['git', 'rev-list', '--left-right', '{}...'.format(self.commit)], cwd=self.directory).decode().splitlines()
+        ahead = len([1 for rev in rev_list if rev[0] == '>'])
+        behind = len([1 for rev in rev_list if rev[0] == '<'])
+        diff = subprocess.check_output(['git', 'diff-index', 'HEAD'], cwd=self.directory).decode().splitlines()
 
         ret = []
         if ahead:
@@ -42,11 +40,10 @@ class GitRepository(Source):
         self.__repair_source()
         self.__fetch()
 
-        with cd(self.directory):
-            command(['git', 'clean', '-xffd'], logging.DEBUG)
-            command(['git', 'reset', 'HEAD', '--hard'], logging.DEBUG)
-            command(['git', 'checkout', '--force', self.commit], logging.DEBUG)
-            command(['git', 'submodule', 'update', '--init', '--recursive'], logging.DEBUG)
+        command(['git', 'clean', '-xffd'], logging.DEBUG, context=self.__context())
+        command(['git', 'reset', 'HEAD', '--hard'], logging.DEBUG, context=self.__context())
+        command(['git', 'checkout', '--force', self.commit], logging.DEBUG, context=self.__context())
+        command(['git', 'submodule', 'update', '--init', '--recursive'], logging.DEBUG, context=self.__context())
 
     def synchronize(self):
         GitRepository.__assert_git_availability()
@@ -54,10 +51,9 @@ class GitRepository(Source):
         if not os.path.exists(os.path.join(self.directory, '.git')):
             self.__fetch(verbosity=logging.INFO)
 
-        with cd(self.directory):
-            command(['git', 'fetch'])
-            command(['git', 'checkout', self.commit])
-            command(['git', 'submodule', 'update', '--init', '--recursive'])
+        command(['git', 'fetch'], context=self.__context())
+        command(['git', 'checkout', self.commit], context=self.__context())
+        command(['git', 'submodule', 'update', '--init', '--recursive'], context=self.__context())
 
     def __repair_source(self):
         if not os.path.exists(os.path.join(self.directory, '.git')):
@@ -70,40 +66,38 @@ class GitRepository(Source):
 
     def __current_remote(self, remote):
         if os.path.exists(self.directory):
-            with cd(self.directory):
-                try:
-                    return command_output(['git', 'config', '--get', 'remote.{}.url'.format(remote)], logging.DEBUG).strip()
-                except subprocess.CalledProcessError:
-                    pass
-
-    def __replace_remote(self, remote, git_url, verbosity=logging.DEBUG):
-        with cd(self.directory):
             try:
-                command(['git', 'remote', 'remove', 'origin'], verbosity)
+                return command_output(['git', 'config', '--get', 'remote.{}.url'.format(remote)], logging.DEBUG, context=self.__context()).strip()
             except subprocess.CalledProcessError:
                 pass
-            command(['git', 'remote', 'add', 'origin', self.repository], verbosity)
+
+    def __replace_remote(self, remote, git_url, verbosity=logging.DEBUG):
+        try:
+            command(['git', 'remote', 'remove', 'origin'], verbosity, context=self.__context())
+        except subprocess.CalledProcessError:
+            pass
+        command(['git', 'remote', 'add', 'origin', self.repository], verbosity, context=self.__context())
 
     def __fetch(self, verbosity=logging.DEBUG):
-        with cd(self.directory):
-            try:
-                command(['git', 'fetch'], verbosity)
-            except subprocess.CalledProcessError:
-                # we should be okay with this to enable offline builds
-                logging.warn('git fetch failed for {}'.format(self.directory))
-                pass
+        try:
+            command(['git', 'fetch'], verbosity, context=self.__context())
+        except subprocess.CalledProcessError:
+            # we should be okay with this to enable offline builds
+            logging.warn('git fetch failed for {}'.format(self.directory))
+            pass
 
     def __clone(self, verbosity=logging.DEBUG):
         if not os.path.exists(os.path.dirname(self.directory)):
             os.makedirs(os.path.dirname(self.directory))
 
-        with cd(os.path.dirname(self.directory)):
-            command(['git', 'clone', self.repository, os.path.basename(self.directory)], verbosity)
+        command(['git', 'clone', self.repository, os.path.basename(self.directory)], verbosity, context=ExecutionContext(os.path.dirname(self.directory)))
+
+        command(['git', 'submodule', 'update', '--init', '--recursive'], verbosity, context=self.__context())
 
-        with cd(self.directory):
-            command(['git', 'submodule', 'update', '--init', '--recursive'], verbosity)
+    def __context(self):
+        return ExecutionContext(self.directory)
 
     @classmethod
     def __assert_git_availability(cls):
-        if not distutils.spawn.find_executable('git'):
+        if not find_executable('git'):
             raise RuntimeError('No git binary is present')
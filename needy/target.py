@@ -6,5 +6,14 @@ class Target:
         if architecture is None:
             self.architecture = platform.default_architecture()
 
+    def __eq__(self, other):
+        return isinstance(other, Target) and str(self) == str(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(str(self))
+
     def __str__(self):
         return '{}:{}'.format(self.platform.identifier(), self.architecture)
@@ -6,6 +6,8 @@ import shutil
 import subprocess
 import tempfile
 
+from .filesystem import fast_copy
+
 
 class UniversalBinary:
     def __init__(self, name, libraries, needy):
@@ -22,6 +24,10 @@ class UniversalBinary:
     def build_directory(self):
         return os.path.join(self.__libraries[0].directory(), 'build', 'universal', self.name())
 
+    def locked(self):
+        ''' returns a context manager that excludes other needy instances from writing the build directory '''
+        return self.__libraries[0].directory_lock(self.build_directory())
+
     def include_path(self):
         return os.path.join(self.build_directory(), 'include')
 
@@ -108,7 +114,8 @@ class UniversalBinary:
                     continue
                 elif not os.path.islink(builds[0][1]) and len(self.libraries()) == 1:
                     print('Copying %s' % path)
-                    shutil.copy(builds[0][1], output_path)
+                    # the build directories are only ever replaced as a whole, so the libraries' files can be shared
+                    fast_copy(builds[0][1], output_path, hardlink=True)
                 elif extension in ['.h', '.hpp', '.hxx', '.ipp', '.c', '.cc', '.cpp']:
                     header_contents = '#if __APPLE__\n#include "TargetConditionals.h"\n#endif\n'
                     for library, header in builds:
@@ -120,7 +127,7 @@ class UniversalBinary:
                         if not os.path.exists(header_directory):
                             os.makedirs(header_directory)
                         header_path = os.path.join(header_directory, os.path.basename(header))
-                        shutil.copyfile(header, header_path)
+                        fast_copy(header, header_path, hardlink=True)
                         header_contents += '#if {}\n#include "{}"\n#endif\n'.format(macro, os.path.relpath(header_path, os.path.dirname(output_path)))
                     if header_contents:
                         print('Creating universal header %s' % path)
@@ -8,14 +8,18 @@ from needy.needy import Needy
 from needy.platforms import host_platform
 from needy.target import Target
 from needy.filesystem import force_rmtree
+from needy.override_environment import OverrideEnvironment
 
 
 class TestCase(unittest.TestCase):
     def setUp(self):
         self.__path = tempfile.mkdtemp()
+        self.__environment = OverrideEnvironment({'NEEDY_CACHE_DIRECTORY': os.path.join(self.__path, '.cache')})
+        self.__environment.__enter__()
         return self
 
     def tearDown(self):
+        self.__environment.__exit__(None, None, None)
         force_rmtree(self.__path)
 
     def path(self):
@@ -4,6 +4,10 @@ import sys
 
 from .functional_test import TestCase
 
+from needy.needy import Needy
+from needy.platforms import host_platform
+from needy.target import Target
+
 
 class LibraryTest(TestCase):
     def test_build_environment(self):
@@ -69,3 +73,20 @@ class LibraryTest(TestCase):
         self.assertEqual(len(os.listdir(include_dir)), 0)
         self.assertEqual(len(os.listdir(lib_dir)), 0)
         self.assertFalse(os.path.exists(os.path.join(lib_dir, 'pkgconfig')))
+
+    def test_configuration_hash_includes_transitive_dependencies(self):
+        def configuration_hashes(bottom_build_steps):
+            libraries = {'lib0': {'directory': 'empty', 'project': {'build-steps': bottom_build_steps}}}
+            for i in range(1, 500):
+                libraries['lib{}'.format(i)] = {'directory': 'empty', 'dependencies': 'lib{}'.format(i - 1)}
+            with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+                needs_file.write(json.dumps({'libraries': libraries}))
+            needy = Needy(self.path())
+            target = Target(host_platform()())
+            return needy.library_configuration_hash(target, 'lib499'), needy.library(target, 'lib498').configuration_hash()
+
+        top, second = configuration_hashes(['true'])
+        self.assertEqual(configuration_hashes(['true']), (top, second))
+        changed_top, changed_second = configuration_hashes(['false'])
+        self.assertNotEqual(changed_top, top)
+        self.assertNotEqual(changed_second, second)
@@ -1,13 +1,23 @@
+import argparse
 import distutils.spawn
 import json
 import os
+import shutil
+import subprocess
 import sys
 import textwrap
+import time
 
 from .functional_test import TestCase
 
+import needy
+
+from needy.local_configuration import LocalConfiguration
+from needy.needy import ConfiguredNeedy, Needy
 from needy.override_environment import OverrideEnvironment
 from needy.platforms import host_platform
+from needy.query_index import NameIndex, QueryIndex
+from needy.target import Target
 
 
 class NeedyTest(TestCase):
@@ -141,6 +151,234 @@ class NeedyTest(TestCase):
             ))
         self.assertEqual(self.execute(['satisfy', '-u', 'ub']), 0)
 
+    def test_plan(self):
+        empty_directory = os.path.join(self.path(), 'empty')
+        os.makedirs(empty_directory)
+        with open(os.path.join(self.path(), '.needyconfig'), 'w') as needyconfig:
+            needyconfig.write(json.dumps({'build-caches': os.path.join(self.path(), 'build-cache')}))
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'a': {
+                        'directory': empty_directory,
+                        'dependencies': ['b', 'c'],
+                        'project': {'build-steps': 'echo foo > {build_directory}/bar'}
+                    },
+                    'b': {
+                        'directory': empty_directory,
+                        'project': {'build-steps': 'echo foo > {build_directory}/bar'}
+                    },
+                    'c': {
+                        'directory': empty_directory,
+                        'project': {'build-steps': 'echo foo > {build_directory}/bar'}
+                    }
+                }
+            }))
+
+        def plan():
+            with ConfiguredNeedy(self.path(), argparse.Namespace(force_build=False)) as needy:
+                return needy.plan(needy.target('host'))
+
+        p = plan()
+        self.assertEqual([library['status'] for library in p['libraries'].values()], ['needs-building'] * 3)
+        self.assertEqual(sorted(p['libraries']['a']['dependencies']), ['b', 'c'])
+        self.assertEqual(len(p['critical-path']), 2)
+        self.assertEqual(p['critical-path'][-1], 'a')
+        self.assertFalse(os.path.exists(self.build_directory('a')))
+
+        self.assertEqual(self.satisfy(), 0)
+        p = plan()
+        self.assertEqual([library['status'] for library in p['libraries'].values()], ['up-to-date'] * 3)
+        self.assertEqual(p['critical-path'], [])
+        with open(os.path.join(self.build_directory('a'), 'needy.duration'), 'r') as f:
+            duration = json.loads(f.read())['seconds']
+        with ConfiguredNeedy(self.path(), argparse.Namespace(force_build=False)) as needy:
+            self.assertEqual(needy.library(needy.target('host'), 'a').build_duration(), duration)
+
+        shutil.rmtree(self.build_directory('b'))
+        p = plan()
+        self.assertEqual(p['libraries']['b']['status'], 'restorable')
+        self.assertEqual(p['libraries']['a']['status'], 'up-to-date')
+
+        self.assertEqual(self.execute(['satisfy', '--plan']), 0)
+
+    def test_query_index(self):
+        empty_directory = os.path.join(self.path(), 'empty')
+        os.makedirs(empty_directory)
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': dict((name, {
+                    'directory': empty_directory,
+                    'dependencies': dependencies,
+                    'project': {'build-steps': 'echo foo > {build_directory}/bar'}
+                }) for name, dependencies in [('a', ['c']), ('b', []), ('c', ['b'])]),
+                'universal-binaries': {
+                    'ub': {
+                        'generic': ['x86_64', 'i386']
+                    }
+                }
+            }))
+
+        parameters = argparse.Namespace(define=None)
+        self.assertIsNone(QueryIndex.for_directory(self.path(), parameters))
+        self.assertEqual(self.satisfy(), 0)
+        self.assertEqual(self.execute(['satisfy', '-u', 'ub', 'a']), 0)
+
+        index = QueryIndex.for_directory(self.path(), parameters)
+        needy = Needy(self.path())
+        target = Target(host_platform()())
+        for filters in [None, ['a'], ['b'], ['c', 'b']]:
+            self.assertEqual(index.include_paths('host', filters), needy.include_paths(target, filters))
+            self.assertEqual(index.library_paths(str(target), filters), needy.library_paths(target, filters))
+            self.assertEqual(index.pkg_config_paths('ub', filters), needy.pkg_config_paths('ub', filters))
+        self.assertEqual(index.build_directory('a', 'host'), needy.build_directory('a', target))
+        self.assertEqual(index.build_directory('a', 'ub'), needy.build_directory('a', 'ub'))
+
+        name_index = NameIndex.for_directory(self.path())
+        self.assertEqual(name_index.library_names('host'), list(needy.libraries(target).keys()))
+        self.assertEqual(name_index.library_names('ub'), ['b', 'c', 'a'])
+        self.assertEqual(name_index.universal_binary_names(), ['ub'])
+
+        with open(os.path.join(self.path(), 'needs.json'), 'a') as needs_file:
+            needs_file.write('\n')
+        self.assertIsNone(QueryIndex.for_directory(self.path(), parameters).include_paths('host'))
+        self.assertIsNone(NameIndex.for_directory(self.path()))
+
+    if sys.platform != 'win32':
+        def test_locking(self):
+            empty_directory = os.path.join(self.path(), 'empty')
+            os.makedirs(empty_directory)
+            with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+                needs_file.write(json.dumps({
+                    'libraries': {
+                        'a': {'directory': empty_directory, 'project': {'build-steps': 'echo foo > {build_directory}/bar'}},
+                    }
+                }))
+
+            # commands that only read the local configuration don't exclude each other
+            with LocalConfiguration(os.path.join(self.needs_directory(), 'config.json'), writable=False):
+                self.assertEqual(self.satisfy(), 0)
+            self.assertEqual(self.execute(['clean', 'a']), 0)
+
+            # but builds wait for other instances that are writing the same directories
+            environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(needy.__file__)))
+            with ConfiguredNeedy(self.path(), argparse.Namespace(force_build=False)) as n:
+                with n.library(n.target('host'), 'a').locked():
+                    process = subprocess.Popen([sys.executable, '-m', 'needy', 'satisfy'], cwd=self.path(), env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                    time.sleep(1)
+                    self.assertIsNone(process.poll())
+                    self.assertFalse(os.path.exists(os.path.join(self.build_directory('a'), 'bar')))
+            output = process.communicate()[0].decode()
+            self.assertEqual(process.returncode, 0, output)
+            self.assertIn('Waiting for other needy instances to finish with', output)
+            self.assertTrue(os.path.exists(os.path.join(self.build_directory('a'), 'bar')))
+
+        def test_coalesced_satisfies(self):
+            empty_directory = os.path.join(self.path(), 'empty')
+            os.makedirs(empty_directory)
+            log = os.path.join(self.path(), 'log')
+            with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+                needs_file.write(json.dumps({
+                    'libraries': dict((name, {
+                        'directory': empty_directory,
+                        'dependencies': ['common'] if name != 'common' else [],
+                        'project': {'build-steps': ['sleep 0.5', 'echo {} >> {}'.format(name, log)]},
+                    }) for name in ['common', 'a', 'b', 'c'])
+                }))
+
+            # like the satisfies b2 launches for each library
+            environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(needy.__file__)))
+            processes = [subprocess.Popen([sys.executable, '-m', 'needy', 'satisfy', name], cwd=self.path(), env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) for name in ['a', 'b', 'c']]
+            for process in processes:
+                output = process.communicate()[0].decode()
+                self.assertEqual(process.returncode, 0, output)
+
+            with open(log, 'r') as f:
+                self.assertEqual(sorted(f.read().split()), ['a', 'b', 'c', 'common'])
+            self.assertEqual(os.listdir(os.path.join(self.needs_directory(), 'satisfy', 'requests')), [])
+
+        def test_concurrent_satisfy(self):
+            empty_directory = os.path.join(self.path(), 'empty')
+            os.makedirs(empty_directory)
+            with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+                needs_file.write(json.dumps({
+                    'libraries': {
+                        'a': {
+                            'directory': empty_directory,
+                            'dependencies': ['b', 'c'],
+                            'project': {
+                                'build-steps': [
+                                    'test -f {{ build_directory(\'b\')|json_escape }}/bar',
+                                    'test -f {{ build_directory(\'c\')|json_escape }}/bar',
+                                    'echo {build_concurrency} > {build_directory}/bar'
+                                ]
+                            }
+                        },
+                        'b': {
+                            'directory': empty_directory,
+                            'project': {
+                                'build-steps': 'echo {build_concurrency} > {build_directory}/bar'
+                            }
+                        },
+                        'c': {
+                            'directory': empty_directory,
+                            'project': {
+                                'build-steps': 'echo {build_concurrency} > {build_directory}/bar'
+                            }
+                        }
+                    }
+                }))
+            self.assertEqual(self.execute(['satisfy', '-j', '4']), 0)
+            shares = {}
+            for name in ['a', 'b', 'c']:
+                with open(os.path.join(self.build_directory(name), 'bar'), 'r') as f:
+                    shares[name] = int(f.read())
+            # b and c run at the same time, so they have to split the budget
+            self.assertGreaterEqual(min(shares.values()), 1)
+            self.assertLessEqual(shares['b'] + shares['c'], 4)
+            self.assertLessEqual(shares['a'], 4)
+
+        def test_concurrent_universal_binary(self):
+            empty_directory = os.path.join(self.path(), 'empty')
+            os.makedirs(empty_directory)
+            with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+                needs_file.write(json.dumps({
+                    'libraries': {
+                        'a': {
+                            'directory': empty_directory,
+                            'dependencies': 'b',
+                            'project': {
+                                'build-steps': [
+                                    'echo {architecture} > arch',
+                                    'sleep 0.2',
+                                    'grep {architecture} arch',
+                                    'echo foo > {build_directory}/bar'
+                                ]
+                            }
+                        },
+                        'b': {
+                            'directory': empty_directory,
+                            'project': {
+                                'build-steps': 'echo foo > {build_directory}/bar'
+                            }
+                        }
+                    },
+                    'universal-binaries': {
+                        'ub': {
+                            'generic': ['x86_64', 'i386']
+                        }
+                    }
+                }))
+            self.assertEqual(self.execute(['satisfy', '-u', 'ub', '-j', '4']), 0)
+            for name in ['a', 'b']:
+                self.assertTrue(os.path.exists(os.path.join(self.build_directory(name, 'ub'), 'needy.status')))
+
+            # the per-target working copies are cleaned along with the source
+            working_copies = os.path.join(self.needs_directory(), 'a', 'sources')
+            self.assertTrue(os.path.isdir(working_copies))
+            self.assertEqual(self.execute(['clean', 'a']), 0)
+            self.assertFalse(os.path.exists(working_copies))
+
     if distutils.spawn.find_executable('pkg-config'):
         def test_pkgconfig_dependency_injection(self):
             empty_directory = os.path.join(self.path(), 'empty')
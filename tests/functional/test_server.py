@@ -0,0 +1,85 @@
+import json
+import os
+import socket
+import threading
+import time
+import unittest
+
+import needy.server
+
+from .functional_test import TestCase
+
+from needy.__main__ import create_parser
+from needy.cd import cd
+from needy.commands import available_commands
+from needy.override_environment import OverrideEnvironment
+from needy.server import Server
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'the server requires unix sockets')
+class ServerTest(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        self.__environment = OverrideEnvironment({'XDG_RUNTIME_DIR': None, 'FOO': None})
+        self.__environment.__enter__()
+
+    def tearDown(self):
+        self.__environment.__exit__(None, None, None)
+        TestCase.tearDown(self)
+
+    def write_needs(self, libraries):
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({'libraries': dict((name, {'directory': 'empty'}) for name in libraries)}))
+
+    def start_server(self):
+        commands = available_commands()
+        server = Server(self.path(), create_parser(commands), commands)
+        thread = threading.Thread(target=server.serve, kwargs={'idle_timeout': 1})
+        thread.start()
+        self.addCleanup(thread.join)
+        while not os.path.exists(server.socket_path()):
+            time.sleep(0.01)
+
+    def query(self, args):
+        with cd(self.path()):
+            return needy.server.query(['needy'] + args, self.path())
+
+    def test_answers_and_invalidates(self):
+        self.write_needs(['a', 'b'])
+        self.assertIsNone(self.query(['cflags']))
+
+        self.start_server()
+
+        cflags = self.query(['cflags'])
+        self.assertEqual(sorted(cflags.split()), sorted(['-I' + os.path.join(self.build_directory(name), 'include') for name in ['a', 'b']]))
+        self.assertEqual(self.query(['builddir', 'a']), self.build_directory('a'))
+        self.assertEqual(self.query(['cflags']), cflags)
+
+        self.write_needs(['a'])
+        self.assertEqual(self.query(['cflags']), '-I' + os.path.join(self.build_directory('a'), 'include'))
+
+        # errors are left for the client to report
+        self.assertIsNone(self.query(['cflags', '-t', 'nonexistent']))
+        self.assertIsNone(self.query(['satisfy']))
+
+    def test_answers_depend_on_the_environment_the_needs_read(self):
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write('{"libraries": {"{{ env.FOO }}": {"directory": "empty"}}}')
+
+        self.start_server()
+
+        with OverrideEnvironment({'FOO': 'a'}):
+            self.assertEqual(self.query(['builddir', 'a']), self.build_directory('a'))
+            self.assertIsNone(self.query(['builddir', 'b']))
+        with OverrideEnvironment({'FOO': 'b'}):
+            self.assertEqual(self.query(['builddir', 'b']), self.build_directory('b'))
+            self.assertIsNone(self.query(['builddir', 'a']))
+
+    def test_ignores_sockets_others_can_access(self):
+        self.write_needs(['a'])
+        self.start_server()
+        self.assertIsNotNone(self.query(['builddir', 'a']))
+
+        directory = os.path.dirname(needy.server.socket_path(self.path()))
+        os.chmod(directory, 0o755)
+        self.assertIsNone(self.query(['builddir', 'a']))
@@ -0,0 +1,68 @@
+import os
+import unittest
+
+import needy.caches.codec
+
+from needy.caches.codec import Codec
+from needy.caches.directory import DirectoryCache
+from needy.filesystem import TempDir
+
+
+class CodecTest(unittest.TestCase):
+    def test_round_trip(self):
+        with TempDir() as d:
+            os.makedirs(os.path.join(d, 'source', 'include'))
+            with open(os.path.join(d, 'source', 'include', 'header.h'), 'w') as f:
+                f.write('#define A 1\n' * 100)
+
+            for name in Codec.NAMES:
+                codec = Codec(name, threads=2)
+                archive = os.path.join(d, '{}.archive'.format(name))
+                with open(archive, 'wb') as f:
+                    codec.archive(os.path.join(d, 'source'), f)
+                with open(archive, 'rb') as f:
+                    self.assertEqual(Codec.detect(f.read(8)), codec.name())
+
+                destination = os.path.join(d, name)
+                with open(archive, 'rb') as f:
+                    Codec.extract(f, destination)
+                with open(os.path.join(destination, 'include', 'header.h')) as f:
+                    self.assertEqual(f.read(), '#define A 1\n' * 100)
+
+    def test_from_dict(self):
+        self.assertEqual(Codec.from_dict({'path': 'cache'}).name(), 'gzip')
+        self.assertEqual(Codec.from_dict({'path': 'cache', 'compression': 'none'}).name(), 'none')
+        self.assertEqual(Codec.from_dict({'path': 'cache', 'compression': {'codec': 'xz', 'level': 1}}).name(), 'xz')
+        with self.assertRaises(ValueError):
+            Codec.from_dict({'path': 'cache', 'compression': 'rar'})
+
+    def test_caches_read_any_codec(self):
+        with TempDir() as d:
+            os.makedirs(os.path.join(d, 'source'))
+            with open(os.path.join(d, 'source', 'file'), 'w') as f:
+                f.write('contents')
+
+            DirectoryCache(os.path.join(d, 'cache'), codec=Codec('xz')).store_directory('key', os.path.join(d, 'source'))
+            self.assertTrue(DirectoryCache(os.path.join(d, 'cache'), codec=Codec('none')).restore_directory('key', os.path.join(d, 'restored')))
+            with open(os.path.join(d, 'restored', 'file')) as f:
+                self.assertEqual(f.read(), 'contents')
+
+    def test_without_xz(self):
+        with TempDir() as d:
+            os.makedirs(os.path.join(d, 'source'))
+            with open(os.path.join(d, 'source', 'file'), 'w') as f:
+                f.write('contents')
+            archive = os.path.join(d, 'archive')
+            with open(archive, 'wb') as f:
+                Codec('xz').archive(os.path.join(d, 'source'), f)
+
+            # as on python 2 without the xz command
+            lzma, find_executable = needy.caches.codec.lzma, needy.caches.codec.find_executable
+            needy.caches.codec.lzma, needy.caches.codec.find_executable = None, lambda name: None
+            try:
+                self.assertEqual(Codec('xz').name(), 'gzip')
+                with open(archive, 'rb') as f:
+                    with self.assertRaises(RuntimeError):
+                        Codec.extract(f, os.path.join(d, 'destination'))
+            finally:
+                needy.caches.codec.lzma, needy.caches.codec.find_executable = lzma, find_executable
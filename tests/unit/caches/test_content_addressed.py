@@ -0,0 +1,72 @@
+import os
+import stat
+import sys
+import unittest
+
+from needy.caches.content_addressed import ContentAddressedCache
+from needy.caches.directory import DirectoryCache
+from needy.filesystem import TempDir
+
+
+def object_names(path):
+    return [name for root, _, names in os.walk(path) for name in names if not name.startswith('.')]
+
+
+class RemoteCache(DirectoryCache):
+    ''' a directory cache that hides its files, like a remote cache would '''
+    def local_path(self, key):
+        return None
+
+
+class ContentAddressedCacheTest(unittest.TestCase):
+    def create_build(self, directory, version):
+        os.makedirs(os.path.join(directory, 'include', 'empty'))
+        os.makedirs(os.path.join(directory, 'bin'))
+        with open(os.path.join(directory, 'include', 'header.h'), 'w') as f:
+            f.write('#define A 1\n')
+        with open(os.path.join(directory, 'bin', 'tool'), 'w') as f:
+            f.write('version {}\n'.format(version))
+        os.chmod(os.path.join(directory, 'bin', 'tool'), 0o755)
+        if sys.platform != 'win32':
+            os.symlink('header.h', os.path.join(directory, 'include', 'link.h'))
+
+    def check_restore(self, cache, key, directory, version):
+        self.assertTrue(cache.restore_directory(key, directory))
+        with open(os.path.join(directory, 'include', 'header.h')) as f:
+            self.assertEqual(f.read(), '#define A 1\n')
+        with open(os.path.join(directory, 'bin', 'tool')) as f:
+            self.assertEqual(f.read(), 'version {}\n'.format(version))
+        self.assertTrue(os.path.isdir(os.path.join(directory, 'include', 'empty')))
+        self.assertTrue(os.stat(os.path.join(directory, 'bin', 'tool')).st_mode & stat.S_IXUSR)
+        if sys.platform != 'win32':
+            self.assertEqual(os.readlink(os.path.join(directory, 'include', 'link.h')), 'header.h')
+
+    def test_directory_cache(self):
+        with TempDir() as d:
+            cache = ContentAddressedCache(DirectoryCache(os.path.join(d, 'cache')))
+            for version in [1, 2]:
+                self.create_build(os.path.join(d, 'build{}'.format(version)), version)
+                self.assertTrue(cache.store_directory('key{}'.format(version), os.path.join(d, 'build{}'.format(version))))
+
+            # two manifests, two tools, and one header
+            self.assertEqual(len(object_names(os.path.join(d, 'cache'))), 5)
+            self.assertFalse(cache.exists('key3'))
+            self.assertFalse(cache.restore_directory('key3', os.path.join(d, 'restored')))
+
+            self.assertTrue(cache.exists('key1'))
+            self.check_restore(cache, 'key1', os.path.join(d, 'restored'), 1)
+            if sys.platform != 'win32':
+                header = os.stat(os.path.join(d, 'restored', 'include', 'header.h'))
+                self.assertEqual(header.st_nlink, 2)
+                self.assertFalse(header.st_mode & stat.S_IWUSR)
+
+    def test_remote_cache(self):
+        with TempDir() as d:
+            local_blobs = DirectoryCache(os.path.join(d, 'blobs'))
+            cache = ContentAddressedCache(RemoteCache(os.path.join(d, 'cache')), local_blobs=local_blobs)
+            self.create_build(os.path.join(d, 'build'), 1)
+            self.assertTrue(cache.store_directory('key', os.path.join(d, 'build')))
+
+            self.check_restore(cache, 'key', os.path.join(d, 'restored'), 1)
+            self.assertEqual(len(object_names(os.path.join(d, 'blobs'))), 2)
+            self.check_restore(cache, 'key', os.path.join(d, 'restored-again'), 1)
@@ -1,32 +1,95 @@
+import hashlib
+import os
 import time
-
-from pyfakefs import fake_filesystem_unittest
+import unittest
 
 from needy.caches.directory import DirectoryCache
+from needy.filesystem import TempDir
+
 
+def object_names(path):
+    return sorted(name for root, _, names in os.walk(path) for name in names if not name.startswith('.'))
 
-class DirectoryTest(fake_filesystem_unittest.TestCase):
-    def setUp(self):
-        self.setUpPyfakefs()
 
+class DirectoryTest(unittest.TestCase):
     def test_directory_cache(self):
-        cache = DirectoryCache('cache')
-        self.assertEquals(cache.type(), 'directory')
-        self.assertEquals(cache.description(), 'cache')
+        with TempDir() as d:
+            cache = DirectoryCache(os.path.join(d, 'cache'))
+            self.assertEqual(cache.type(), 'directory')
+            self.assertEqual(cache.description(), os.path.join(d, 'cache'))
+
+            self.assertFalse(cache.get('key', os.path.join(d, 'obj')))
+
+            with open(os.path.join(d, 'a'), 'w') as f:
+                f.write('AAA')
+            self.assertTrue(cache.set('a', os.path.join(d, 'a')))
+            self.assertTrue(cache.get('a', os.path.join(d, 'obj')))
+            with open(os.path.join(d, 'obj'), 'r') as f:
+                self.assertEqual(f.read(), 'AAA')
+
+            name = hashlib.sha256(b'a').hexdigest()
+            self.assertEqual(cache.local_path('a'), os.path.join(d, 'cache', name[:2], name))
+            self.assertEqual(cache.size(), 3)
+
+    def test_max_size(self):
+        with TempDir() as d:
+            cache = DirectoryCache.from_dict({'path': os.path.join(d, 'cache'), 'max-size': '2K'})
+            with open(os.path.join(d, 'object'), 'wb') as f:
+                f.write(b'x' * 1000)
+
+            cache.set('a', os.path.join(d, 'object'))
+            cache.set('b', os.path.join(d, 'object'))
+            # using a makes b the least recently used
+            self.assertTrue(cache.get('a', os.path.join(d, 'obj')))
+            cache.set('c', os.path.join(d, 'object'))
+
+            self.assertTrue(cache.exists('a'))
+            self.assertFalse(cache.exists('b'))
+            self.assertTrue(cache.exists('c'))
+            self.assertEqual(cache.size(), 2000)
+
+            with self.assertRaises(ValueError):
+                DirectoryCache.from_dict({'path': os.path.join(d, 'cache'), 'max-size': 'lots'})
+
+    def test_prune(self):
+        with TempDir() as d:
+            with open(os.path.join(d, 'object'), 'w') as f:
+                f.write('contents')
+            DirectoryCache(os.path.join(d, 'cache')).set('a', os.path.join(d, 'object'))
+
+            cache = DirectoryCache(os.path.join(d, 'cache'), object_lifetime=0)
+            self.assertTrue(cache.exists('a'))
+            time.sleep(0.01)
+            cache.prune()
+            self.assertFalse(cache.exists('a'))
+            self.assertEqual(cache.size(), 0)
 
-        self.assertFalse(cache.get('key', 'obj'))
+    def test_unsharded_objects_are_indexed(self):
+        with TempDir() as d:
+            os.makedirs(os.path.join(d, 'cache'))
+            name = hashlib.sha256(b'a').hexdigest()
+            with open(os.path.join(d, 'cache', name), 'w') as f:
+                f.write('AAA')
 
-        self.fs.CreateFile('a', contents='AAA')
-        self.assertTrue(cache.set('a', 'a'))
-        self.assertTrue(cache.get('a', 'obj'))
-        with open('obj', 'r') as f:
-            self.assertEquals(f.read(), 'AAA')
+            cache = DirectoryCache(os.path.join(d, 'cache'))
+            self.assertEqual(cache.size(), 3)
+            self.assertTrue(cache.get('a', os.path.join(d, 'obj')))
+            self.assertEqual(object_names(os.path.join(d, 'cache')), [name])
 
-        cache.prune()
-        self.assertTrue(cache.get('a', 'obj'))
+    def test_streaming(self):
+        with TempDir() as d:
+            cache = DirectoryCache(os.path.join(d, 'cache'))
+            with cache.open_reader('key') as f:
+                self.assertIsNone(f)
 
-        distant_past = time.time() - 60 * 60 * 24 * 30
-        self.fs.GetObject(cache._object_path('a')).st_atime = distant_past
+            with self.assertRaises(RuntimeError):
+                with cache.open_writer('key') as f:
+                    f.write(b'partial')
+                    raise RuntimeError('interrupted')
+            self.assertFalse(cache.exists('key'))
+            self.assertEqual(object_names(os.path.join(d, 'cache')), [])
 
-        cache.prune()
-        self.assertFalse(cache.get('a', 'obj'))
+            with cache.open_writer('key') as f:
+                f.write(b'contents')
+            with cache.open_reader('key') as f:
+                self.assertEqual(f.read(), b'contents')
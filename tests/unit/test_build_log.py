@@ -0,0 +1,36 @@
+import io
+import logging
+import os
+import sys
+import unittest
+
+from needy.build_log import BuildLog
+from needy.filesystem import TempDir
+
+
+class BuildLogTest(unittest.TestCase):
+    def test_tail(self):
+        with TempDir() as d:
+            path = os.path.join(d, 'logs', 'build.log')
+            with BuildLog(path, echo=False, max_lines=2) as log:
+                log.write(b'one\ntwo\nthr')
+                log.write(b'ee\nfo')
+                self.assertEqual(log.tail(), ['two', 'three', 'fo'])
+                self.assertTrue(log.hid_output())
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'one\ntwo\nthree\nfo')
+            self.assertEqual(BuildLog.last_line(path), 'fo')
+            self.assertIsNone(BuildLog.last_line(os.path.join(d, 'missing.log')))
+
+    def test_echo(self):
+        with TempDir() as d:
+            stdout = sys.stdout
+            sys.stdout = io.StringIO()
+            try:
+                with BuildLog(os.path.join(d, 'build.log')) as log:
+                    log.write(b'output\n', logging.WARNING)
+                output = sys.stdout.getvalue()
+            finally:
+                sys.stdout = stdout
+            self.assertEqual(output, 'output\n')
+            self.assertFalse(log.hid_output())
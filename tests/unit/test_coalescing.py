@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+import unittest
+
+from needy.coalescing import SatisfyCoalescer
+from needy.filesystem import TempDir
+
+
+class SatisfyCoalescerTest(unittest.TestCase):
+    def wait_for_requests(self, directory, count):
+        requests = os.path.join(directory, 'requests')
+        while not os.path.isdir(requests) or len(os.listdir(requests)) < count:
+            time.sleep(0.01)
+
+    def run_coalesced(self, fail_batch=False):
+        ''' runs a leader and two followers that register while the leader is building, returning each one's calls '''
+        calls = {'leader': [], 'b': [], 'c': []}
+        leading = threading.Event()
+        registered = threading.Event()
+
+        with TempDir() as d:
+            def lead(filters):
+                calls['leader'].append(sorted(filters))
+                if len(calls['leader']) == 1:
+                    leading.set()
+                    registered.wait()
+                elif fail_batch:
+                    raise RuntimeError('unable to build')
+
+            threads = [threading.Thread(target=SatisfyCoalescer(d, 'key').satisfy, args=(['a'], lead))]
+            threads[0].start()
+            leading.wait()
+
+            for name in ['b', 'c']:
+                threads.append(threading.Thread(target=SatisfyCoalescer(d, 'key').satisfy, args=([name], calls[name].append)))
+                threads[-1].start()
+            self.wait_for_requests(d, 2)
+            registered.set()
+
+            for thread in threads:
+                thread.join()
+            self.assertEqual(os.listdir(os.path.join(d, 'requests')), [])
+            self.assertEqual(os.listdir(os.path.join(d, 'results')), [])
+        return calls
+
+    def test_requests_are_satisfied_together(self):
+        calls = self.run_coalesced()
+        self.assertEqual(calls, {'leader': [['a'], ['b', 'c']], 'b': [], 'c': []})
+
+    def test_failed_requests_are_retried(self):
+        calls = self.run_coalesced(fail_batch=True)
+        self.assertEqual(calls, {'leader': [['a'], ['b', 'c']], 'b': [['b']], 'c': [['c']]})
+
+    def test_unmatched_requests_are_left_alone(self):
+        with TempDir() as d:
+            calls = []
+            satisfied = threading.Event()
+            leading = threading.Event()
+
+            def lead(filters):
+                leading.set()
+                satisfied.wait()
+                calls.append(filters)
+
+            leader = threading.Thread(target=SatisfyCoalescer(d, 'key').satisfy, args=(None, lead))
+            leader.start()
+            leading.wait()
+            follower = threading.Thread(target=SatisfyCoalescer(d, 'other').satisfy, args=(['b'], calls.append))
+            follower.start()
+            self.wait_for_requests(d, 1)
+            satisfied.set()
+            leader.join()
+            follower.join()
+            self.assertEqual(calls, [None, ['b']])
@@ -9,7 +9,7 @@ import hashlib
 
 from pyfakefs import fake_filesystem_unittest
 
-from needy.filesystem import lock_file, clean_file, clean_directory, TempDir, dict_file, copy_if_changed, file_hash
+from needy.filesystem import lock_file, clean_file, clean_directory, TempDir, dict_file, copy_if_changed, file_hash, add_to_json_cache, read_json_file, fast_copy, fast_copy_tree, COPY_STRATEGIES
 
 
 def try_file_lock(path):
@@ -26,6 +26,57 @@ class FilesystemTest(unittest.TestCase):
             self.assertFalse(self.try_access_from_other_process(path))
             os.close(fd)
 
+    def test_fast_copy(self):
+        with TempDir() as d:
+            source = os.path.join(d, 'source')
+            with open(source, 'wb') as f:
+                f.write(b'contents' * 100000)
+            os.chmod(source, 0o755)
+
+            for strategy in COPY_STRATEGIES:
+                destination = os.path.join(d, strategy)
+                used = fast_copy(source, destination, hardlink=True, strategies=[strategy, 'buffered'])
+                self.assertIn(used, [strategy, 'buffered'])
+                with open(destination, 'rb') as f:
+                    self.assertEqual(f.read(), b'contents' * 100000)
+                self.assertEqual(os.stat(destination).st_mode & 0o777, 0o755)
+
+            # files are never shared unless it's allowed
+            self.assertNotEqual(fast_copy(source, os.path.join(d, 'hardlink'), strategies=['hardlink', 'buffered']), 'hardlink')
+            self.assertEqual(os.stat(source).st_nlink, 1)
+
+    def test_fast_copy_tree(self):
+        with TempDir() as d:
+            os.makedirs(os.path.join(d, 'source', 'include'))
+            os.makedirs(os.path.join(d, 'source', '.git'))
+            with open(os.path.join(d, 'source', 'include', 'header.h'), 'w') as f:
+                f.write('#define A 1\n')
+            os.makedirs(os.path.join(d, 'destination', 'include'))
+            with open(os.path.join(d, 'destination', 'include', 'other.h'), 'w') as f:
+                f.write('#define B 1\n')
+            if sys.platform != 'win32':
+                os.symlink('header.h', os.path.join(d, 'source', 'include', 'link.h'))
+
+            # generated files must stay newer than the files they're generated from, whatever order they're copied in
+            with open(os.path.join(d, 'source', 'configure.ac'), 'w') as f:
+                f.write('AC_INIT\n')
+            with open(os.path.join(d, 'source', 'configure'), 'w') as f:
+                f.write('#!/bin/sh\n')
+            os.utime(os.path.join(d, 'source', 'configure.ac'), (1000000000, 1000000000))
+            os.utime(os.path.join(d, 'source', 'configure'), (1000000100, 1000000100))
+
+            fast_copy_tree(os.path.join(d, 'source'), os.path.join(d, 'destination'), symlinks=True, ignore=shutil.ignore_patterns('.*'))
+
+            self.assertEqual(os.path.getmtime(os.path.join(d, 'destination', 'configure.ac')), 1000000000)
+            self.assertEqual(os.path.getmtime(os.path.join(d, 'destination', 'configure')), 1000000100)
+
+            self.assertFalse(os.path.exists(os.path.join(d, 'destination', '.git')))
+            self.assertTrue(os.path.exists(os.path.join(d, 'destination', 'include', 'other.h')))
+            with open(os.path.join(d, 'destination', 'include', 'header.h')) as f:
+                self.assertEqual(f.read(), '#define A 1\n')
+            if sys.platform != 'win32':
+                self.assertEqual(os.readlink(os.path.join(d, 'destination', 'include', 'link.h')), 'header.h')
+
     @staticmethod
     def try_access_from_other_process(path):
         process = multiprocessing.Process(target=try_file_lock, args=(path,))
@@ -98,6 +149,14 @@ class FakeFilesystemTest(fake_filesystem_unittest.TestCase):
         with open(os.path.join('tmp', 'file')) as f:
             self.assertEqual(f.read(), '{"bar": "test"}')
 
+    def test_add_to_json_cache(self):
+        path = os.path.join('tmp', 'cache.json')
+        for key in ['z', 'a', 'm']:
+            add_to_json_cache(path, key, 0, 3)
+        add_to_json_cache(path, 'z', 1, 3)
+        add_to_json_cache(path, 'b', 2, 3)
+        self.assertEqual(read_json_file(path), {'m': 0, 'z': 1, 'b': 2})
+
     def test_file_hash(self):
         self.fs.CreateFile(os.path.join('file'), contents='foo')
         foo_hash = b'2c26b46b68ffc68ff99b453c1d30413413422d706483bfa0f98a5e886266e7ae'
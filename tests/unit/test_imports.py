@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# seconds the cheap commands may spend importing needy, which is several times what they need
+IMPORT_TIME_BUDGET = 0.15
+
+# building the parser for one of the path queries
+QUERY_COMMAND = 'from needy.__main__ import create_parser; from needy.commands import available_commands; create_parser(available_commands(["cflags"]))'
+
+
+class ImportTest(unittest.TestCase):
+    def run_python(self, args):
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return subprocess.check_output([sys.executable] + args, env=env, stderr=subprocess.STDOUT).decode()
+
+    def test_query_imports(self):
+        modules = json.loads(self.run_python(['-c', 'import json, sys; {}; print(json.dumps(list(sys.modules)))'.format(QUERY_COMMAND)]).splitlines()[-1])
+        for module in ['jinja2', 'yaml', 'distutils', 'needy.needy', 'needy.library', 'needy.projects.make', 'needy.generators.jamfile', 'needy.commands.satisfy']:
+            self.assertNotIn(module, modules)
+
+    @unittest.skipIf(sys.version_info < (3, 7), '-X importtime requires python 3.7')
+    def test_import_time(self):
+        microseconds = 0
+        for line in self.run_python(['-X', 'importtime', '-c', QUERY_COMMAND]).splitlines():
+            if not line.startswith('import time:'):
+                continue
+            _, cumulative, name = line.split('|')
+            # nested imports are indented and already counted in their importer's cumulative time
+            if name.startswith(' needy') and cumulative.strip().isdigit():
+                microseconds += int(cumulative)
+        self.assertGreater(microseconds, 0)
+        self.assertLess(microseconds / 1000000.0, IMPORT_TIME_BUDGET)
@@ -0,0 +1,64 @@
+import distutils.spawn
+import os
+import sys
+import unittest
+
+import needy.process
+
+from needy.filesystem import TempDir
+from needy.jobserver import JobServer, active_jobserver, reserved_jobs
+
+
+@unittest.skipIf(sys.platform == 'win32', 'jobservers are only supported on posix systems')
+class JobServerTest(unittest.TestCase):
+    def test_tokens(self):
+        with JobServer(3) as jobserver:
+            self.assertTrue(jobserver.acquire(blocking=False))
+            self.assertTrue(jobserver.acquire(blocking=False))
+            self.assertFalse(jobserver.acquire(blocking=False))
+            jobserver.release()
+            self.assertTrue(jobserver.acquire(blocking=False))
+
+    def test_token_taken_before_acquire(self):
+        with JobServer(2) as jobserver:
+            token_available = jobserver.token_available
+
+            def token_taken_by_another_reader():
+                available = token_available()
+                # make reads from the same pipe, so it can take the token first
+                os.read(jobserver.fds()[0], 1)
+                return available
+
+            jobserver.token_available = token_taken_by_another_reader
+            self.assertFalse(jobserver.acquire(blocking=False))
+
+    def test_active_jobserver(self):
+        self.assertIsNone(active_jobserver())
+        with JobServer(2) as jobserver:
+            self.assertEqual(active_jobserver(), jobserver)
+        self.assertIsNone(active_jobserver())
+
+    def test_reserved_jobs(self):
+        with reserved_jobs(4) as jobs:
+            self.assertEqual(jobs, 4)
+
+        with JobServer(3) as jobserver:
+            with reserved_jobs(8) as jobs:
+                self.assertEqual(jobs, 3)
+                with reserved_jobs(8) as jobs:
+                    self.assertEqual(jobs, 1)
+            with reserved_jobs(2) as jobs:
+                self.assertEqual(jobs, 2)
+            self.assertTrue(jobserver.acquire(blocking=False))
+            self.assertTrue(jobserver.acquire(blocking=False))
+
+    if distutils.spawn.find_executable('make'):
+        def test_make_uses_jobserver(self):
+            with TempDir() as d:
+                makefile = os.path.join(d, 'Makefile')
+                with open(makefile, 'w') as f:
+                    f.write('all:\n\t@echo $(MAKEFLAGS)\n')
+                with JobServer(4) as jobserver:
+                    output = needy.process.command_output(['make', '-s', '-f', makefile])
+                    self.assertIn('jobserver', output)
+                    self.assertNotIn('jobserver unavailable', output)
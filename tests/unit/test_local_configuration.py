@@ -7,8 +7,8 @@ from needy.filesystem import TempDir
 from needy.local_configuration import LocalConfiguration
 
 
-def try_locking_local_config(path):
-    with LocalConfiguration(path, blocking=False) as config:
+def try_locking_local_config(path, writable=True):
+    with LocalConfiguration(path, blocking=False, writable=writable) as config:
         sys.exit(0 if config is not None else 1)
 
 
@@ -34,9 +34,22 @@ class LocalConfigurationTest(unittest.TestCase):
                 config.set_development_mode('test', False)
                 self.assertFalse(config.development_mode('test'))
 
+    def test_shared_locking(self):
+        with TempDir() as temp_dir:
+            config_file = os.path.join(temp_dir, 'config')
+            with LocalConfiguration(config_file) as config:
+                config.set_development_mode('test', True)
+            with LocalConfiguration(config_file, writable=False) as config:
+                self.assertTrue(config.development_mode('test'))
+                self.assertRaises(RuntimeError, config.set_development_mode, 'test', False)
+                self.assertTrue(LocalConfigurationTest.try_access_from_another_process(config_file, writable=False))
+                self.assertFalse(LocalConfigurationTest.try_access_from_another_process(config_file))
+            with LocalConfiguration(config_file, writable=False) as config:
+                self.assertTrue(config.development_mode('test'))
+
     @staticmethod
-    def try_access_from_another_process(path):
-        process = multiprocessing.Process(target=try_locking_local_config, args=(path,))
+    def try_access_from_another_process(path, writable=True):
+        process = multiprocessing.Process(target=try_locking_local_config, args=(path, writable))
         process.start()
         process.join()
         return process.exitcode == 0
@@ -0,0 +1,57 @@
+import json
+import os
+import textwrap
+import unittest
+
+from collections import OrderedDict
+
+import needy.needs_parser
+
+from needy.filesystem import TempDir
+from needy.needs_parser import parse
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+@unittest.skipIf(yaml is None, 'pyyaml is not installed')
+class NeedsParserTest(unittest.TestCase):
+    NEEDS = textwrap.dedent('''\
+        libraries:
+            b:
+                directory: b
+            a:
+                directory: a
+    ''')
+
+    def test_yaml_order(self):
+        needs = parse(self.NEEDS, '.yaml')
+        self.assertIsInstance(needs['libraries'], OrderedDict)
+        self.assertEqual(list(needs['libraries'].keys()), ['b', 'a'])
+
+    def test_yaml_cache(self):
+        with TempDir() as d:
+            needs = parse(self.NEEDS, '.yaml', d)
+            self.assertEqual(len(os.listdir(d)), 1)
+
+            path = os.path.join(d, os.listdir(d)[0])
+            with open(path, 'w') as f:
+                f.write(json.dumps({'libraries': {'cached': {}}}))
+            self.assertEqual(list(parse(self.NEEDS, '.yaml', d)['libraries'].keys()), ['cached'])
+
+            os.remove(path)
+            self.assertEqual(parse(self.NEEDS, '.yaml', d), needs)
+            self.assertEqual(list(parse(self.NEEDS, '.yaml', d)['libraries'].keys()), ['b', 'a'])
+
+    def test_yaml_cache_skips_values_json_changes(self):
+        with TempDir() as d:
+            self.assertEqual(parse('libraries:\n    1: {}\n', '.yaml', d), {'libraries': {1: {}}})
+            self.assertEqual(os.listdir(d), [])
+
+    def test_yaml_cache_is_pruned(self):
+        with TempDir() as d:
+            for i in range(needy.needs_parser.MAX_CACHED_NEEDS + 2):
+                parse('libraries:\n    lib{}: {{}}\n'.format(i), '.yaml', d)
+            self.assertEqual(len(os.listdir(d)), needy.needs_parser.MAX_CACHED_NEEDS)
@@ -0,0 +1,47 @@
+import os
+import unittest
+
+import needy.needs_template
+
+from needy.filesystem import TempDir
+from needy.needs_template import RecordingEnvironment, cache_render, cached_render, compiled_template, render
+from needy.override_environment import OverrideEnvironment
+
+
+class NeedsTemplateTest(unittest.TestCase):
+    def test_compiled_template(self):
+        with TempDir() as d:
+            with OverrideEnvironment({'NEEDY_CACHE_DIRECTORY': d}):
+                template = compiled_template('needs.json', '{{ foo }}')
+                self.assertEqual(template.render(foo='bar'), 'bar')
+                self.assertIs(compiled_template('needs.json', '{{ foo }}'), template)
+                self.assertIsNot(compiled_template('needs.json', '{{ foo }}!'), template)
+                self.assertTrue(os.listdir(needy.needs_template.bytecode_cache_directory()))
+
+    def test_recording_environment(self):
+        environment = RecordingEnvironment({'A': 'a', 'B': 'b'})
+        self.assertEqual(environment['A'], 'a')
+        self.assertFalse('C' in environment)
+        self.assertEqual(environment.get('D', 'd'), 'd')
+        self.assertEqual(environment.variables(), {'A': 'a', 'C': None, 'D': None})
+        self.assertEqual(sorted(environment.keys()), ['A', 'B'])
+        self.assertEqual(environment.variables(), {'A': 'a', 'B': 'b', 'C': None, 'D': None})
+
+    def test_render_dependencies(self):
+        with TempDir() as d:
+            with OverrideEnvironment({'NEEDY_CACHE_DIRECTORY': d, 'NEEDY_TEST_A': 'a', 'NEEDY_TEST_B': 'b'}):
+                rendered, dependencies = render('needs.json', '{{ env.NEEDY_TEST_A }}{{ foo }}{{ bar|default(1) }}{{ platform }}', {'platform': 'p'}, {'foo': 'f', 'baz': 'z', 'platform': 'x'})
+                self.assertEqual(rendered, 'af1p')
+                self.assertEqual(dependencies, {'defines': {'foo': 'f', 'bar': None}, 'environment': {'NEEDY_TEST_A': 'a'}})
+
+    def test_cached_render(self):
+        dependencies = {'defines': {'foo': 'f'}, 'environment': {'NEEDY_TEST_A': 'a', 'NEEDY_TEST_B': None}}
+        with TempDir() as d:
+            with OverrideEnvironment({'NEEDY_TEST_A': 'a', 'NEEDY_TEST_B': None, 'NEEDY_TEST_C': 'c'}):
+                self.assertIsNone(cached_render(d, 'key', {'foo': 'f'}))
+                cache_render(d, 'key', 'rendered', dependencies)
+                self.assertEqual(cached_render(d, 'key', {'foo': 'f', 'bar': 'b'}), ('rendered', dependencies))
+                self.assertIsNone(cached_render(d, 'key', {'foo': 'g'}))
+                self.assertIsNone(cached_render(d, 'other', {'foo': 'f'}))
+            with OverrideEnvironment({'NEEDY_TEST_A': 'a', 'NEEDY_TEST_B': 'b'}):
+                self.assertIsNone(cached_render(d, 'key', {'foo': 'f'}))
@@ -1,11 +1,16 @@
 import json
 import os
+import random
 import textwrap
+import time
+
+from collections import OrderedDict
 
 from pyfakefs import fake_filesystem_unittest
 
 from needy.needy import Needy
 from needy.needy_configuration import NeedyConfiguration
+from needy.platforms import PLATFORMS, available_platforms
 
 
 class NeedyTest(fake_filesystem_unittest.TestCase):
@@ -42,6 +47,74 @@ class NeedyTest(fake_filesystem_unittest.TestCase):
         self.assertEqual(libraries[0][0], 'dependency')
         self.assertEqual(libraries[1][0], 'dependant')
 
+    def test_libraries_to_build_order_is_stable(self):
+        self.fs.CreateFile('needs.json', contents=json.dumps(OrderedDict([
+            ('libraries', OrderedDict([
+                ('d', {'dependencies': ['b', 'c']}),
+                ('c', {'dependencies': 'a'}),
+                ('b', {'dependencies': 'a'}),
+                ('a', {}),
+                ('e', {}),
+            ]))
+        ])))
+        needy = Needy(needy_configuration=NeedyConfiguration(None))
+        names = [name for name, library in needy.libraries_to_build(needy.target('host'))]
+        self.assertEqual(names, ['a', 'c', 'b', 'd', 'e'])
+
+    def test_libraries_to_build_cycle(self):
+        self.fs.CreateFile('needs.json', contents=json.dumps({
+            'libraries': {
+                'a': {'dependencies': 'b'},
+                'b': {'dependencies': 'c'},
+                'c': {'dependencies': 'b'},
+            }
+        }))
+        needy = Needy(needy_configuration=NeedyConfiguration(None))
+        with self.assertRaises(ValueError) as context:
+            needy.libraries_to_build(needy.target('host'))
+        self.assertIn('b -> c -> b', str(context.exception))
+
+    def test_libraries_to_build_undefined_dependency(self):
+        self.fs.CreateFile('needs.json', contents=json.dumps({
+            'libraries': {
+                'a': {'dependencies': 'b'},
+            }
+        }))
+        needy = Needy(needy_configuration=NeedyConfiguration(None))
+        with self.assertRaises(ValueError):
+            needy.libraries_to_build(needy.target('host'))
+
+    def test_libraries_to_build_benchmark(self):
+        count = 2000
+        generator = random.Random(0)
+        libraries = OrderedDict()
+        for i in range(count):
+            dependencies = generator.sample(range(i), min(i, 5))
+            libraries['lib{}'.format(i)] = {'dependencies': ['lib{}'.format(d) for d in dependencies]}
+        self.fs.CreateFile('needs.json', contents=json.dumps({'libraries': libraries}))
+        needy = Needy(needy_configuration=NeedyConfiguration(None))
+        target = needy.target('host')
+        needy.needs_configuration(target)
+
+        start = time.time()
+        built = [name for name, library in needy.libraries_to_build(target)]
+        duration = time.time() - start
+
+        self.assertEqual(len(built), count)
+        positions = {name: index for index, name in enumerate(built)}
+        for name, configuration in libraries.items():
+            for dependency in configuration['dependencies']:
+                self.assertLess(positions[dependency], positions[name])
+        self.assertLess(duration, 5.0)
+
+    def test_platform(self):
+        self.fs.CreateFile('needs.json')
+        needy = Needy(needy_configuration=NeedyConfiguration(None))
+        self.assertEqual(needy.platform('generic').identifier(), 'generic')
+        for identifier in set(PLATFORMS) - set(available_platforms()) | set(['nonexistent']):
+            with self.assertRaises(ValueError):
+                needy.platform(identifier)
+
     def test_render(self):
         self.fs.CreateFile('needs.json', contents=textwrap.dedent('''\
             libraries:
@@ -55,3 +128,14 @@ class NeedyTest(fake_filesystem_unittest.TestCase):
                 mylib:
                     directory: bar
         ''').strip())
+
+    def test_render_build_directory_for_other_target(self):
+        self.fs.CreateFile('needs.json', contents=json.dumps({
+            'libraries': {
+                'a': {'build-directory-suffix': '{{ architecture }}'},
+                'b': {'directory': '{{ build_directory(\'a\', \'host:other\')|json_escape }}'},
+            }
+        }))
+        needy = Needy(needy_configuration=NeedyConfiguration(None))
+        configuration = needy.needs_configuration(needy.target('host'))
+        self.assertEqual(configuration['libraries']['b']['directory'], os.path.join(needy.needs_directory(), 'a', 'build', needy.platform('host').identifier(), 'other', 'other'))
@@ -2,8 +2,10 @@ import unittest
 import json
 import os
 
+import needy.needy_configuration
+
 from needy.needy_configuration import NeedyConfiguration
-from needy.filesystem import TempDir
+from needy.filesystem import TempDir, lock_file
 
 
 class NeedyConfigurationTest(unittest.TestCase):
@@ -59,3 +61,47 @@ class NeedyConfigurationTest(unittest.TestCase):
 
             c = NeedyConfiguration(os.path.dirname(leaf))
             self.assertEqual(len(c.build_caches()), 1)
+
+    def test_parsed_configs_are_reused_until_modified(self):
+        with TempDir() as d:
+            root = os.path.join(d, '.needyconfig')
+            leaf = os.path.join(d, 'dir', '.needyconfig')
+            os.makedirs(os.path.dirname(leaf))
+            with open(root, 'w') as f:
+                f.write(json.dumps({'build-caches': ['bar']}))
+            with open(leaf, 'w') as f:
+                f.write(json.dumps({'build-caches': ['foo']}))
+
+            # merging mustn't modify the cached configs
+            for _ in range(2):
+                self.assertEqual(len(NeedyConfiguration(os.path.dirname(leaf)).build_caches()), 2)
+
+            with open(leaf, 'w') as f:
+                f.write(json.dumps({'build-caches': ['foo', 'foobar']}))
+            os.utime(leaf, (0, 0))
+            self.assertEqual(len(NeedyConfiguration(os.path.dirname(leaf)).build_caches()), 3)
+
+    def test_reads_wait_for_writers(self):
+        with TempDir() as d:
+            path = os.path.join(d, '.needyconfig')
+            with open(path, 'w') as f:
+                f.write(json.dumps({'build-caches': ['foo']}))
+
+            # other readers don't get in the way
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                self.assertTrue(needy.needy_configuration.lock_fd(fd, shared=True))
+                self.assertEqual(len(NeedyConfiguration(d).build_caches()), 1)
+            finally:
+                os.close(fd)
+
+            fd = lock_file(path)
+            timeout = needy.needy_configuration.LOCK_TIMEOUT
+            needy.needy_configuration.LOCK_TIMEOUT = 1
+            try:
+                os.utime(path, (0, 0))
+                with self.assertRaises(RuntimeError):
+                    NeedyConfiguration(d)
+            finally:
+                needy.needy_configuration.LOCK_TIMEOUT = timeout
+                os.close(fd)
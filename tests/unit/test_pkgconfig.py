@@ -0,0 +1,70 @@
+import distutils.spawn
+import json
+import os
+import unittest
+
+import needy.pkgconfig
+
+from needy.filesystem import TempDir
+from needy.override_environment import OverrideEnvironment
+
+
+@unittest.skipIf(not distutils.spawn.find_executable('pkg-config'), 'pkg-config is not installed')
+class PkgConfigTest(unittest.TestCase):
+    def setUp(self):
+        needy.pkgconfig._packages.clear()
+
+    def tearDown(self):
+        needy.pkgconfig._packages.clear()
+
+    @staticmethod
+    def create_package(directory, name):
+        with open(os.path.join(directory, name + '.pc'), 'w') as f:
+            f.write('Name: {0}\nVersion: 0\nDescription: {0}\n'.format(name))
+
+    def test_packages(self):
+        with TempDir() as d:
+            pkgconfig_directory = os.path.join(d, 'pkgconfig')
+            os.makedirs(pkgconfig_directory)
+            self.create_package(pkgconfig_directory, 'foo')
+            with OverrideEnvironment({'PKG_CONFIG_PATH': pkgconfig_directory, 'NEEDY_CACHE_DIRECTORY': os.path.join(d, 'cache')}):
+                self.assertTrue(needy.pkgconfig.package_is_present('foo'))
+                self.assertFalse(needy.pkgconfig.package_is_present('bar'))
+
+    def test_empty_path(self):
+        with TempDir() as d:
+            with OverrideEnvironment({'PKG_CONFIG_PATH': None, 'NEEDY_CACHE_DIRECTORY': os.path.join(d, 'cache')}):
+                self.assertEqual(needy.pkgconfig.packages(), frozenset())
+                self.assertFalse(os.path.exists(needy.pkgconfig.cache_path()))
+
+    def test_disk_cache(self):
+        with TempDir() as d:
+            pkgconfig_directory = os.path.join(d, 'pkgconfig')
+            os.makedirs(pkgconfig_directory)
+            self.create_package(pkgconfig_directory, 'foo')
+            with OverrideEnvironment({'NEEDY_CACHE_DIRECTORY': os.path.join(d, 'cache')}):
+                self.assertEqual(needy.pkgconfig.packages(pkgconfig_directory), frozenset(['foo']))
+
+                # unchanged directories are answered from the disk cache
+                with open(needy.pkgconfig.cache_path(), 'r') as f:
+                    cache = json.loads(f.read())
+                cache[pkgconfig_directory]['packages'] = ['cached']
+                with open(needy.pkgconfig.cache_path(), 'w') as f:
+                    f.write(json.dumps(cache))
+                needy.pkgconfig._packages.clear()
+                self.assertEqual(needy.pkgconfig.packages(pkgconfig_directory), frozenset(['cached']))
+
+                # adding a package invalidates it
+                self.create_package(pkgconfig_directory, 'bar')
+                os.utime(pkgconfig_directory, (0, 0))
+                needy.pkgconfig._packages.clear()
+                self.assertEqual(needy.pkgconfig.packages(pkgconfig_directory), frozenset(['foo', 'bar']))
+
+    def test_path_fingerprint(self):
+        with TempDir() as d:
+            missing = os.path.join(d, 'missing')
+            self.assertEqual(needy.pkgconfig.path_fingerprint(os.pathsep.join(['', d, missing])), [[d, os.stat(d).st_mtime], [missing, None]])
+            fingerprint = needy.pkgconfig.path_fingerprint(d)
+            self.create_package(d, 'foo')
+            os.utime(d, (0, 0))
+            self.assertNotEqual(needy.pkgconfig.path_fingerprint(d), fingerprint)
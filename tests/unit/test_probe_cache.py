@@ -0,0 +1,52 @@
+import os
+import unittest
+
+import needy.probe_cache
+
+from needy.filesystem import TempDir
+from needy.override_environment import OverrideEnvironment
+from needy.probe_cache import cached_probe, file_signature
+
+
+class ProbeCacheTest(unittest.TestCase):
+    def test_cached_probe(self):
+        probes = []
+
+        def probe():
+            probes.append(None)
+            return ['output']
+
+        with TempDir() as d:
+            with OverrideEnvironment({'NEEDY_CACHE_DIRECTORY': d}):
+                self.assertEqual(cached_probe(['probe', 1], probe), ['output'])
+                self.assertEqual(cached_probe(['probe', 1], probe), ['output'])
+                self.assertEqual(len(probes), 1)
+                self.assertTrue(os.path.isfile(needy.probe_cache.cache_path()))
+
+                self.assertEqual(cached_probe(['probe', 2], probe), ['output'])
+                self.assertEqual(len(probes), 2)
+
+    def test_failed_probes_are_retried(self):
+        probes = []
+
+        def probe():
+            probes.append(None)
+            return None
+
+        with TempDir() as d:
+            with OverrideEnvironment({'NEEDY_CACHE_DIRECTORY': d}):
+                self.assertIsNone(cached_probe('probe', probe))
+                self.assertIsNone(cached_probe('probe', probe))
+                self.assertEqual(len(probes), 2)
+
+    def test_file_signature(self):
+        with TempDir() as d:
+            path = os.path.join(d, 'compiler')
+            self.assertIsNone(file_signature(path))
+            with open(path, 'w') as f:
+                f.write('a')
+            signature = file_signature(path)
+            self.assertEqual(file_signature(path), signature)
+            with open(path, 'w') as f:
+                f.write('ab')
+            self.assertNotEqual(file_signature(path), signature)
@@ -5,6 +5,9 @@ import unittest
 
 import needy.process
 
+from needy.execution_context import ExecutionContext
+from needy.filesystem import TempDir
+
 
 class ProcessTest(unittest.TestCase):
 
@@ -26,3 +29,17 @@ class ProcessTest(unittest.TestCase):
     def test_command_sequence_failure(self):
         with self.assertRaises(subprocess.CalledProcessError) as a:
             needy.process.command_sequence(['notacommand123123', 'alsonotacommand321'])
+
+    def test_context(self):
+        with TempDir() as d:
+            os.environ['NEEDY_UNSET'] = '1'
+            try:
+                context = ExecutionContext(d).with_overrides({'NEEDY_SET': 'bar', 'NEEDY_UNSET': None})
+            finally:
+                del os.environ['NEEDY_UNSET']
+            script = 'import os; print(os.getcwd()); print(os.environ.get("NEEDY_SET")); print(os.environ.get("PWD")); print("NEEDY_UNSET" in os.environ)'
+            cwd = os.getcwd()
+            output = needy.process.command_output([sys.executable, '-c', script], context=context).splitlines()
+            self.assertEqual(output, [os.path.realpath(d), 'bar', d, 'False'])
+            self.assertEqual(os.getcwd(), cwd)
+            self.assertNotIn('NEEDY_SET', os.environ)
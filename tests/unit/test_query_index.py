@@ -0,0 +1,87 @@
+import json
+import os
+
+from pyfakefs import fake_filesystem_unittest
+
+from needy.override_environment import OverrideEnvironment
+from needy.query_index import NameIndex, QueryIndex, index_path
+
+
+class QueryIndexTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.CreateFile('/project/needs.json', contents='{}')
+
+    def index(self):
+        index = QueryIndex.open('/project/needs.json', '/project/needs')
+        index.add_target('linux:x86_64', [
+            ('a', ['c'], '/a/linux'),
+            ('b', [], '/b/linux'),
+            ('c', ['b'], '/c/linux'),
+        ], alias='host')
+        index.add_target('ios:armv7', [
+            ('a', [], '/a/ios'),
+            ('b', [], '/b/ios'),
+        ])
+        index.add_universal_binary('ub', ['linux:x86_64', 'ios:armv7'], {'a': '/a/ub', 'b': '/b/ub', 'c': '/c/ub'})
+        return index
+
+    def test_libraries(self):
+        index = self.index()
+        self.assertEqual(index.libraries('linux:x86_64'), [('b', '/b/linux'), ('c', '/c/linux'), ('a', '/a/linux')])
+        self.assertEqual(index.libraries('host', ['a']), [('b', '/b/linux'), ('c', '/c/linux'), ('a', '/a/linux')])
+        self.assertEqual(index.libraries('host', ['b*']), [('b', '/b/linux')])
+        self.assertEqual(index.libraries('ub', ['a']), [('b', '/b/ub'), ('c', '/c/ub'), ('a', '/a/ub')])
+        self.assertIsNone(index.libraries('android:armv7'))
+
+    def test_paths(self):
+        index = self.index()
+        self.assertEqual(index.include_paths('ios:armv7'), ['/a/ios/include', '/b/ios/include'])
+        self.assertEqual(index.library_paths('ios:armv7', ['b']), ['/b/ios/lib'])
+        self.assertEqual(index.pkg_config_paths('ios:armv7', ['b']), [os.path.join('/b/ios/lib', 'pkgconfig')])
+        self.assertEqual(index.build_directory('c', 'host'), '/c/linux')
+        self.assertEqual(index.build_directory('c', 'ub'), '/c/ub')
+        self.assertIsNone(index.build_directory('c', 'ios:armv7'))
+
+    def test_invalidation(self):
+        self.index().save()
+        self.assertTrue(os.path.isfile(index_path('/project/needs')))
+
+        self.assertIsNotNone(QueryIndex.open('/project/needs.json', '/project/needs').libraries('host'))
+        self.assertIsNotNone(QueryIndex.open('/project/needs.json', '/project/needs', [['foo=bar']]).libraries('host'))
+
+        index = self.index()
+        index.add_dependencies({'defines': {'foo': None}, 'environment': {'NEEDY_TEST_VARIABLE': 'bar'}})
+        index.save()
+        with OverrideEnvironment({'NEEDY_TEST_VARIABLE': 'bar', 'UNRELATED_VARIABLE': 'baz'}):
+            self.assertIsNotNone(QueryIndex.open('/project/needs.json', '/project/needs', [['unrelated']]).libraries('host'))
+            self.assertIsNone(QueryIndex.open('/project/needs.json', '/project/needs', [['foo=bar']]).libraries('host'))
+        self.assertIsNone(QueryIndex.open('/project/needs.json', '/project/needs').libraries('host'))
+
+        with open('/project/needs.json', 'w') as f:
+            f.write(json.dumps({'libraries': {}}))
+        self.assertIsNone(QueryIndex.open('/project/needs.json', '/project/needs').libraries('host'))
+
+
+class NameIndexTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.CreateFile('/project/needs.json', contents='{}')
+
+    def test_names(self):
+        self.assertIsNone(NameIndex.for_directory('/project'))
+
+        index = NameIndex.open('/project/needs.json', '/project/needs')
+        index.set_universal_binary_names(['ub'])
+        index.set_library_names('host', ['a', 'b'])
+        index.save()
+
+        index = NameIndex.for_directory('/project')
+        self.assertEqual(index.universal_binary_names(), ['ub'])
+        self.assertEqual(index.library_names('host'), ['a', 'b'])
+        self.assertIsNone(index.library_names('ios'))
+
+        with open('/project/needs.json', 'w') as f:
+            f.write(json.dumps({'libraries': {}}))
+        self.assertIsNone(NameIndex.for_directory('/project'))
+        self.assertIsNone(NameIndex.open('/project/needs.json', '/project/needs').library_names('host'))
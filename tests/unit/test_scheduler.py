@@ -0,0 +1,119 @@
+import io
+import os
+import sys
+import time
+import unittest
+
+from needy.filesystem import TempDir
+from needy.jobserver import JobServer
+from needy.scheduler import Scheduler, can_isolate_tasks
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_serial_order(self):
+        order = []
+        scheduler = Scheduler(4)
+        scheduler.add('a', lambda jobs: order.append('a'), ['b'])
+        scheduler.add('b', lambda jobs: order.append('b'), ['c'])
+        scheduler.add('c', lambda jobs: order.append('c'))
+        scheduler.run()
+        self.assertEqual(order, ['c', 'b', 'a'])
+
+    def test_serial_jobs(self):
+        jobs = []
+        scheduler = Scheduler(4)
+        scheduler.add('a', lambda j: jobs.append(j))
+        scheduler.add('b', lambda j: jobs.append(j))
+        scheduler.run()
+        self.assertEqual(jobs, [4, 4])
+
+    def test_serial_failure(self):
+        order = []
+
+        def fail(jobs):
+            raise RuntimeError('failure')
+
+        scheduler = Scheduler()
+        scheduler.add('a', lambda jobs: order.append('a'), ['b'])
+        scheduler.add('b', fail)
+        with self.assertRaises(RuntimeError):
+            scheduler.run()
+        self.assertEqual(order, [])
+        self.assertEqual(scheduler.failed_task(), 'b')
+
+    def test_circular_dependency(self):
+        scheduler = Scheduler()
+        scheduler.add('a', lambda jobs: None, ['b'])
+        scheduler.add('b', lambda jobs: None, ['a'])
+        with self.assertRaises(ValueError):
+            scheduler.run()
+
+    if can_isolate_tasks():
+        def test_parallel(self):
+            with TempDir() as d:
+                def task(name, dependencies, jobs):
+                    for dependency in dependencies:
+                        if not os.path.exists(os.path.join(d, dependency)):
+                            raise RuntimeError('{} ran before {}'.format(name, dependency))
+                    with open(os.path.join(d, name), 'w') as f:
+                        f.write(str(jobs))
+
+                scheduler = Scheduler(4, parallel=True)
+                graph = {'a': ['b', 'c'], 'b': ['d'], 'c': ['d'], 'd': [], 'e': []}
+                for name, dependencies in graph.items():
+                    scheduler.add(name, lambda jobs, name=name, dependencies=dependencies: task(name, dependencies, jobs), dependencies)
+                scheduler.run()
+
+                for name in graph:
+                    with open(os.path.join(d, name)) as f:
+                        self.assertTrue(1 <= int(f.read()) <= 4)
+
+        def test_parallel_failure(self):
+            with TempDir() as d:
+                def fail(jobs):
+                    raise RuntimeError('failure')
+
+                scheduler = Scheduler(4, parallel=True)
+                scheduler.add('a', lambda jobs: open(os.path.join(d, 'a'), 'w').close(), ['b'])
+                scheduler.add('b', fail)
+                with self.assertRaises(RuntimeError):
+                    scheduler.run()
+                self.assertFalse(os.path.exists(os.path.join(d, 'a')))
+                self.assertEqual(scheduler.failed_task(), 'b')
+
+        def test_parallel_jobserver_shares(self):
+            with TempDir() as d:
+                def task(name, jobs):
+                    with open(os.path.join(d, name), 'w') as f:
+                        f.write(str(jobs))
+                    time.sleep(0.2)
+
+                with JobServer(4) as jobserver:
+                    scheduler = Scheduler(4, parallel=True, jobserver=jobserver)
+                    for name in ['a', 'b', 'c']:
+                        scheduler.add(name, lambda jobs, name=name: task(name, jobs))
+                    scheduler.run()
+
+                shares = []
+                for name in ['a', 'b', 'c']:
+                    with open(os.path.join(d, name)) as f:
+                        shares.append(int(f.read()))
+                self.assertLessEqual(sum(shares), 4)
+
+        def test_parallel_output_lines(self):
+            def task(name, jobs):
+                for word in [name, ' is', ' done\n']:
+                    os.write(1, word.encode())
+                    time.sleep(0.05)
+
+            scheduler = Scheduler(4, parallel=True)
+            for name in ['a', 'b']:
+                scheduler.add(name, lambda jobs, name=name: task(name, jobs))
+            stdout = sys.stdout
+            sys.stdout = io.StringIO()
+            try:
+                scheduler.run()
+                output = sys.stdout.getvalue()
+            finally:
+                sys.stdout = stdout
+            self.assertEqual(sorted(output.splitlines()), ['a is done', 'b is done'])